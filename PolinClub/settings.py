@@ -56,6 +56,30 @@ STORAGES = {
 MEDIA_URL = f'{AWS_S3_ENDPOINT_URL}/{AWS_STORAGE_BUCKET_NAME}/'
 MEDIA_ROOT = ''  # Не используется при S3
 
+# Как браузер получает медиа из статей:
+# 'proxy' — через Django (/s3-media/), 'presigned' — напрямую из S3,
+# 'cdn' — через CDN с HMAC-подписью
+MEDIA_DELIVERY = os.getenv('MEDIA_DELIVERY', 'proxy')
+MEDIA_URL_EXPIRES = 60 * 60           # срок жизни подписанной ссылки
+MEDIA_URL_REFRESH_MARGIN = 5 * 60     # перевыпуск ссылки за 5 минут до истечения
+MEDIA_CDN_BASE_URL = os.getenv('MEDIA_CDN_BASE_URL', '')
+MEDIA_CDN_SIGNING_KEY = os.getenv('MEDIA_CDN_SIGNING_KEY', '')
+# База presigned GET ссылок; пусто — прямой адрес S3 (см. blog/signing.py)
+MEDIA_PRESIGNED_BASE_URL = os.getenv('MEDIA_PRESIGNED_BASE_URL', '')
+
+# Публичные адреса: медиа через Django и прокси загрузок в S3 (без Cloudflare)
+MEDIA_PROXY_URL = os.getenv('MEDIA_PROXY_URL', 'https://traff-lab.ru/s3-media/')
+S3_UPLOAD_PROXY_URL = os.getenv('S3_UPLOAD_PROXY_URL', 'https://upload.traff-lab.ru/s3-upload/')
+
+# Дедупликация загрузок: хэш, присланный редактором, регистрируется только
+# после пересчёта по объекту в S3 (потоковое чтение). Файлы крупнее этого
+# размера не пересчитываются и в дедупликации не участвуют
+UPLOAD_DIGEST_VERIFY_MAX_SIZE = 64 * 1024 * 1024
+
+# Имена загрузок: 'timestamp' — <имя>_<время>.<ext>,
+# 'content' — по хэшу содержимого с шардированием (uploads/images/ab/cd/<хэш>.png)
+UPLOAD_KEY_SCHEME = os.getenv('UPLOAD_KEY_SCHEME', 'timestamp')
+
 # =========================
 # STATIC FILES
 # =========================
@@ -65,6 +89,10 @@ STATIC_DIR = os.path.join(BASE_DIR, 'static')
 STATICFILES_DIRS = [STATIC_DIR]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Бандл редактора хранится в репозитории (static/editor/vendor/, frontend/build.mjs).
+# '1' — без бандла грузить модули редактора с esm.sh; только для локальной разработки
+EDITOR_CDN_FALLBACK = os.getenv('EDITOR_CDN_FALLBACK', '0') == '1'
+
 
 # =========================
 # FILE UPLOAD SETTINGS
@@ -84,6 +112,11 @@ LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = reverse_lazy('profile')
 LOGOUT_REDIRECT_URL = '/accounts/login/'
 
+# Сессия читается из кэша, БД — только при промахе и на запись
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+# Сколько живёт снимок пользователя с группами (blog/auth.py)
+AUTH_SNAPSHOT_TIMEOUT = 5 * 60
+
 # =========================
 # SECURITY (для production)
 # =========================
@@ -131,15 +164,33 @@ INSTALLED_APPS = [
 # =========================
 
 MIDDLEWARE = [
+    # request_id для логов (первым, чтобы его видели все остальные)
+    'blog.log.RequestIdMiddleware',
+    'blog.metrics.MetricsMiddleware',
+    'blog.instrumentation.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # AuthenticationMiddleware с пользователем из снимка в кэше (blog/auth.py)
+    'blog.auth.CachedAuthenticationMiddleware',
+    # Отслеживает записи и закрепляет автора правки за default (blog/db_router.py)
+    'blog.db_router.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Замеры времени запросов (Server-Timing + лог blog.perf).
+# Выключено — middleware снимается при старте и ничего не стоит.
+PERF_INSTRUMENTATION = os.getenv('PERF_INSTRUMENTATION', '0') == '1'
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', '1.0'))
+PERF_SLOW_REQUEST_MS = int(os.getenv('PERF_SLOW_REQUEST_MS', '500'))
+
+# Метрики Prometheus на /metrics (Bearer METRICS_TOKEN или is_staff).
+# PROMETHEUS_MULTIPROC_DIR для нескольких воркеров gunicorn задан в Dockerfile.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 ROOT_URLCONF = 'PolinClub.urls'
 
 # =========================
@@ -148,7 +199,11 @@ ROOT_URLCONF = 'PolinClub.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Замер рендера шаблонов — только при PERF_INSTRUMENTATION
+        'BACKEND': (
+            'blog.instrumentation.InstrumentedDjangoTemplates' if PERF_INSTRUMENTATION
+            else 'django.template.backends.django.DjangoTemplates'
+        ),
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -167,12 +222,102 @@ WSGI_APPLICATION = 'PolinClub.wsgi.application'
 # DATABASE
 # =========================
 
+# Файл SQLite. В docker compose — в именованном томе (/app/data), иначе
+# пересоздание контейнера стирало бы базу вместе с его слоем
+DATABASE_NAME = os.getenv('DATABASE_NAME') or BASE_DIR / 'db.sqlite3'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': DATABASE_NAME,
+    },
+    # Реплика только для чтения (blog/db_router.py). Без DATABASE_REPLICA_NAME —
+    # второе соединение к той же базе; в тестах — отдельная база
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DATABASE_REPLICA_NAME') or DATABASE_NAME,
+    },
+}
+
+DATABASE_ROUTERS = ['blog.db_router.PrimaryReplicaRouter']
+# Алиас, из которого читают помеченные view; пусто — всё из default
+READ_REPLICA_ALIAS = 'replica' if os.getenv('DATABASE_REPLICA_NAME') else ''
+# Сколько секунд после своей правки пользователь читает из default
+READ_YOUR_WRITES_SECONDS = 5
+
+# =========================
+# CACHE
+# =========================
+
+# Для нескольких воркеров gunicorn нужен общий кэш (Redis, сервис redis
+# в docker-compose.yml), иначе у каждого процесса своя копия LocMem —
+# gunicorn.conf.py в этом случае не запустится
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Сколько живёт запись индекса "S3-ключ → категории" для /s3-media/
+MEDIA_SCOPE_CACHE_TIMEOUT = 60 * 60
+
+# Кэш разобранного контента статьи (ключ — хэш ревизии)
+POST_RENDER_CACHE_TIMEOUT = 24 * 60 * 60
+# ...и рендера, в котором ещё нет размеров части картинок (width/height)
+POST_RENDER_INCOMPLETE_TIMEOUT = 60
+
+# Лимиты запросов (blog/ratelimit.py): {область: {'user'|'ip': (токенов в секунду, запас)}}.
+# Перемотка видео — это десятки Range-запросов подряд, поэтому у media запас большой
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMITS = {
+    'media': {'user': (10, 120), 'ip': (20, 240)},
+    'presign': {'user': (0.5, 30), 'ip': (1, 60)},
 }
+# Адреса, от которых принимается X-Real-IP (nginx в сети docker compose).
+# Порт gunicorn наружу не публикуется, так что в этих сетях только свои контейнеры
+RATE_LIMIT_TRUSTED_PROXIES = os.getenv(
+    'RATE_LIMIT_TRUSTED_PROXIES', '127.0.0.1/32,::1/128,172.16.0.0/12,10.0.0.0/8,192.168.0.0/16'
+).split(',')
+# Одновременных потоков /s3-media/ на пользователя (0 — без ограничения)
+MEDIA_MAX_STREAMS_PER_USER = int(os.getenv('MEDIA_MAX_STREAMS_PER_USER', '6'))
+
+# /readyz: предел на каждую проверку (БД, кэш, S3), секунды
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', '2'))
+# Недоступный S3 виден в /readyz, но готовность снимает только при '1'
+READYZ_REQUIRE_S3 = os.getenv('READYZ_REQUIRE_S3', '0') == '1'
+# Сколько последних статей рендерится в кэш при прогреве воркера
+WARMUP_POSTS = int(os.getenv('WARMUP_POSTS', '20'))
+
+# Список гайдов: статей раздела за одну подгрузку и срок кэша порции
+COURSE_PAGE_SIZE = 50
+COURSE_FRAGMENT_CACHE_TIMEOUT = 10 * 60
+
+# Входит в ETag страниц блога: сменить при выкладке, меняющей шаблоны,
+# чтобы браузеры не получили 304 на старую вёрстку
+HTTP_CACHE_VERSION = os.getenv('HTTP_CACHE_VERSION', '1')
+
+# Сжатие Post.content в БД: 'zstd' (Python 3.14+), 'zlib' или пусто — без сжатия.
+# Без сжатия колонка — обычный TEXT с обычным поиском, со сжатием — BLOB.
+# После смены настройки колонку и записи приводит manage.py recompress_content
+POST_CONTENT_COMPRESSION = os.getenv('POST_CONTENT_COMPRESSION') or None
+POST_CONTENT_COMPRESSION_MIN_SIZE = 1024
+
+# =========================
+# REVISIONS
+# =========================
+
+POST_REVISION_SNAPSHOT_EVERY = 10   # каждая 10-я ревизия — полный снимок
+POST_REVISION_KEEP = 50             # по умолчанию для manage.py prune_revisions
 
 # =========================
 # PASSWORD VALIDATION
@@ -203,38 +348,63 @@ USE_I18N = True
 USE_TZ = True
 
 # =========================
-# LOGGING (для отладки S3)
+# LOGGING
 # =========================
+#
+# JSON в stderr через очередь: запись и форматирование — в отдельном
+# потоке (blog/log.py). В каждой записи request_id запроса.
+# Логи S3-клиентов проходят выборочно: (доля записей, не больше N в секунду),
+# WARNING и выше — всегда.
+
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # 'json' | 'text'
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+S3_LOG_LEVEL = os.getenv('S3_LOG_LEVEL', 'INFO')
+S3_LOG_SAMPLING = (float(os.getenv('S3_LOG_SAMPLE_RATE', '0.1')), 5)
 
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {
+            '()': 'blog.log.RequestIdFilter',
+        },
+        'sampling': {
+            '()': 'blog.log.SamplingFilter',
+            'rules': {
+                'boto3': S3_LOG_SAMPLING,
+                'botocore': S3_LOG_SAMPLING,
+                's3transfer': S3_LOG_SAMPLING,
+            },
+        },
+    },
     'handlers': {
+        # '()', а не 'class': для наследников QueueHandler dictConfig
+        # подменяет конструктор (см. QueueingStreamHandler)
         'console': {
-            'class': 'logging.StreamHandler',
+            '()': 'blog.log.QueueingStreamHandler',
+            'json_format': LOG_FORMAT == 'json',
+            'filters': ['sampling', 'request_id'],
         },
     },
     'root': {
         'handlers': ['console'],
-        'level': 'INFO',
+        'level': LOG_LEVEL,
     },
     'loggers': {
         'django': {
             'handlers': ['console'],
-            'level': 'INFO',
+            'level': LOG_LEVEL,
             'propagate': False,
         },
+        # Без своих handlers — пишут через root, без дублей
         'boto3': {
-            'handlers': ['console'],
-            'level': 'INFO',
+            'level': S3_LOG_LEVEL,
         },
         'botocore': {
-            'handlers': ['console'],
-            'level': 'INFO',
+            'level': S3_LOG_LEVEL,
         },
         's3transfer': {
-            'handlers': ['console'],
-            'level': 'INFO',
+            'level': S3_LOG_LEVEL,
         },
     },
 }
@@ -5,6 +5,9 @@ from django.conf.urls.static import static
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 
+from blog.health import healthz, readyz
+from blog.metrics import metrics_view
+
 # Заглушка для Chrome DevTools
 @require_http_methods(["GET"])
 def devtools_stub(request):
@@ -15,6 +18,13 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('blog.urls')),
     path('accounts/', include('django.contrib.auth.urls')),
+
+    # Метрики Prometheus (защищены токеном)
+    path('metrics', metrics_view, name='metrics'),
+
+    # Проверки для docker healthcheck / балансировщика
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
     
     # Заглушка для Chrome DevTools (убирает 404 из логов)
     path('.well-known/appspecific/com.chrome.devtools.json', devtools_stub),
@@ -0,0 +1,152 @@
+import re
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .instrumentation import count_cache
+
+
+# =========================
+# ДОСТУП ПОЛЬЗОВАТЕЛЯ К КАТЕГОРИЯМ
+# =========================
+
+# Группа пользователя → slug категории, которую она видит
+GROUP_CATEGORY_SLUGS = {
+    'farm': 'farm',
+    'buyer': 'buyer',
+}
+
+# Метка для файлов из статей без категории (доступны всем авторизованным)
+PUBLIC_SCOPE = '*'
+
+
+def user_group_names(user):
+    """Имена групп: из снимка пользователя (blog/auth.py) или запросом"""
+    names = getattr(user, 'group_names', None)
+    if names is None:
+        names = frozenset(user.groups.values_list('name', flat=True))
+    return names
+
+
+def allowed_category_slugs(user):
+    """Возвращает slug'и категорий, доступных пользователю (None — доступно всё)"""
+    if user.is_superuser:
+        return None
+
+    slugs = set()
+    for name in user_group_names(user):
+        slug = GROUP_CATEGORY_SLUGS.get(name.lower())
+        if slug:
+            slugs.add(slug)
+    return slugs
+
+
+# =========================
+# ИНДЕКС S3-КЛЮЧ → КАТЕГОРИИ
+# =========================
+#
+# Для каждого файла из uploads/ храним в кэше набор slug'ов категорий,
+# в статьях которых он встречается. Проверка доступа к /s3-media/ —
+# один cache.get, без запросов к БД на каждый Range-запрос видео.
+#
+# Записи обновляются точечно при сохранении/удалении постов (blog/signals.py).
+# Изменения разделов и категорий сбрасывают весь индекс через смену поколения.
+
+MEDIA_KEY_RE = re.compile(r'/s3-media/(uploads/[^"\'\s?#<>]+)')
+
+SCOPE_CACHE_PREFIX = 'media-scope'
+GENERATION_CACHE_KEY = 'media-scope:generation'
+
+
+def _scope_timeout():
+    return getattr(settings, 'MEDIA_SCOPE_CACHE_TIMEOUT', 60 * 60)
+
+
+def extract_media_keys(html):
+    """Находит S3-ключи файлов, на которые ссылается HTML контента"""
+    if not html:
+        return set()
+    return {unquote(key) for key in MEDIA_KEY_RE.findall(html)}
+
+
+def media_keys_column(content):
+    """Значение Post.media_keys: ключи через перевод строки, с ним же по краям"""
+    keys = extract_media_keys(content)
+    if not keys:
+        return ''
+    return '\n' + '\n'.join(sorted(keys)) + '\n'
+
+
+def parse_media_keys_column(value):
+    return {key for key in (value or '').split('\n') if key}
+
+
+def _generation():
+    generation = cache.get(GENERATION_CACHE_KEY)
+    if generation is None:
+        generation = 1
+        cache.add(GENERATION_CACHE_KEY, generation, None)
+    return generation
+
+
+def _cache_key(key, generation):
+    return f'{SCOPE_CACHE_PREFIX}:{generation}:{key}'
+
+
+def _compute_scopes(key):
+    """Собирает категории всех постов, ссылающихся на файл (запрос к БД)"""
+    from .models import Post
+
+    # Ищем по денормализованному списку ключей, а не по (сжатому) контенту
+    rows = Post.objects.filter(
+        media_keys__contains=f'\n{key}\n'
+    ).values_list('section__category__slug', 'faq_for__section__category__slug')
+
+    scopes = set()
+    for section_slug, parent_slug in rows:
+        scopes.add(section_slug or parent_slug or PUBLIC_SCOPE)
+    return frozenset(scopes)
+
+
+def get_key_scopes(key):
+    """Категории файла: из кэша, при промахе — из БД с записью в кэш"""
+    cache_key = _cache_key(key, _generation())
+    scopes = cache.get(cache_key)
+    if scopes is None:
+        count_cache(misses=1)
+        scopes = _compute_scopes(key)
+        cache.set(cache_key, scopes, _scope_timeout())
+    else:
+        count_cache(hits=1)
+    return scopes
+
+
+def refresh_media_keys(keys):
+    """Пересчитывает записи индекса для переданных ключей"""
+    if not keys:
+        return
+    generation = _generation()
+    cache.set_many(
+        {_cache_key(key, generation): _compute_scopes(key) for key in keys},
+        _scope_timeout(),
+    )
+
+
+def invalidate_media_index():
+    """Сбрасывает весь индекс (старое поколение просто истечёт по таймауту)"""
+    try:
+        cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(GENERATION_CACHE_KEY, 2, None)
+
+
+def user_can_access_media(user, key):
+    """Проверяет, может ли пользователь получить файл из S3 по ключу"""
+    if user.is_superuser or user.is_staff:
+        return True
+
+    scopes = get_key_scopes(key)
+    if PUBLIC_SCOPE in scopes:
+        return True
+    return bool(scopes & allowed_category_slugs(user))
@@ -1,8 +1,20 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django import forms
+from django.db.models import BooleanField, ExpressionWrapper, F, Q
+from django.db.models.functions import Length
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
+from django.utils.html import format_html
 
 from unfold.admin import ModelAdmin
-from .models import Post, Category, Section
+from unfold.contrib.filters.admin import AutocompleteSelectFilter
+from unfold.decorators import action
+from unfold.views import ChangeList
+from .assets import editor_media_js
+from .models import Post, Category, Section, PostRevision
+from .revisions import revision_diff
+from .transfer import import_lines, iter_export
 from django.contrib.admin import SimpleListFilter
 
 
@@ -28,6 +40,22 @@ class PostTypeFilter(SimpleListFilter):
         return queryset
 
 
+# =========================
+# CHANGELIST
+# =========================
+
+class PostChangeList(ChangeList):
+    """Список постов без тяжёлого поля content"""
+
+    def get_queryset(self, request, exclude_parameters=None):
+        return super().get_queryset(request, exclude_parameters).defer('content')
+
+
+def is_autocomplete_request(request):
+    match = request.resolver_match
+    return match is not None and match.url_name == 'autocomplete'
+
+
 # =========================
 # FORM
 # =========================
@@ -46,6 +74,11 @@ class PostAdminForm(forms.ModelForm):
         }
 
 
+class ImportJsonlForm(forms.Form):
+    file = forms.FileField(label='Файл JSONL')
+    batch_size = forms.IntegerField(label='Размер пачки', initial=500, min_value=1, max_value=10000)
+
+
 # =========================
 # POST
 # =========================
@@ -55,9 +88,7 @@ class PostAdmin(ModelAdmin):
     form = PostAdminForm
 
     class Media:
-        js = (
-            "editor/editor-init.js",
-        )
+        js = editor_media_js()
         css = {
             "all": ("editor/editor.css",)
         }
@@ -76,9 +107,17 @@ class PostAdmin(ModelAdmin):
         'date',
         'author',
         'section__category',
-        'section',
-        'faq_for',
+        # Автокомплит: в сайдбар не грузится список всех разделов и постов
+        ('section', AutocompleteSelectFilter),
+        ('faq_for', AutocompleteSelectFilter),
     )
+    list_filter_submit = True
+
+    # Вместо <select> со всеми постами — поиск по /admin/autocomplete/ с пагинацией
+    autocomplete_fields = ('section', 'faq_for')
+
+    # section.__str__ обращается к category — подтягиваем одним JOIN
+    list_select_related = ('section__category',)
 
     search_fields = ('title', 'author')
     ordering = ('-date',)
@@ -96,20 +135,66 @@ class PostAdmin(ModelAdmin):
             'fields': ('content',),
         }),
         ('FAQ', {
-            'fields': ('faq_for',),
+            'fields': ('faq_for', 'faq_order'),
         }),
     )
 
     save_on_top = True
     list_per_page = 20
 
-    @admin.display(description='Тип')
+    actions = ('export_jsonl',)
+    actions_list = ('import_jsonl',)
+
+    @admin.action(description='Экспорт в JSONL')
+    def export_jsonl(self, request, queryset):
+        posts = Post.objects.filter(pk__in=queryset.values('pk'))
+        response = StreamingHttpResponse(iter_export(posts), content_type='application/x-ndjson; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="guides.jsonl"'
+        return response
+
+    @action(description='Импорт JSONL', url_path='import-jsonl', permissions=['add'])
+    def import_jsonl(self, request):
+        form = ImportJsonlForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            try:
+                stats = import_lines(form.cleaned_data['file'], batch_size=form.cleaned_data['batch_size'])
+            except ValueError as e:
+                messages.error(request, f'Ошибка импорта: {e}')
+            else:
+                messages.success(request, f'Создано: {stats["created"]}, обновлено: {stats["updated"]}')
+                return redirect(reverse('admin:blog_post_changelist'))
+
+        return render(request, 'admin/blog/post/import_jsonl.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Импорт гайдов из JSONL',
+            'opts': self.model._meta,
+            'form': form,
+        })
+
+    def get_changelist(self, request, **kwargs):
+        return PostChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        if is_autocomplete_request(request):
+            # В выпадающем списке нужен только заголовок; FAQ может ссылаться лишь на статью
+            queryset = queryset.only('id', 'title')
+            if request.GET.get('field_name') == 'faq_for':
+                queryset = queryset.filter(faq_for__isnull=True)
+        return super().get_search_results(request, queryset, search_term)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            is_faq=ExpressionWrapper(Q(faq_for__isnull=False), output_field=BooleanField()),
+            category_name=F('section__category__name'),
+        )
+
+    @admin.display(description='Тип', ordering='is_faq')
     def get_type(self, obj):
-        return 'FAQ' if obj.faq_for else 'Статья'
+        return 'FAQ' if obj.is_faq else 'Статья'
 
-    @admin.display(description='Категория')
+    @admin.display(description='Категория', ordering='category_name')
     def get_category(self, obj):
-        return obj.section.category if obj.section else '—'
+        return obj.category_name or '—'
 
 
 # =========================
@@ -130,5 +215,49 @@ class CategoryAdmin(ModelAdmin):
 class SectionAdmin(ModelAdmin):
     list_display = ('name', 'category', 'slug')
     list_filter = ('category',)
-    search_fields = ('name',)
+    search_fields = ('name', 'category__name')
+    ordering = ('category__name', 'name')
     prepopulated_fields = {"slug": ("name",)}
+
+    def get_queryset(self, request):
+        # Section.__str__ использует category — и в списке, и в автокомплите
+        return super().get_queryset(request).select_related('category')
+
+
+# =========================
+# REVISION
+# =========================
+
+@admin.register(PostRevision)
+class PostRevisionAdmin(ModelAdmin):
+    list_display = ('post', 'number', 'created_at', 'is_snapshot', 'get_size')
+    list_filter = (('post', AutocompleteSelectFilter), 'is_snapshot')
+    list_filter_submit = True
+    list_select_related = ('post',)
+    fields = ('post', 'number', 'created_at', 'is_snapshot', 'content_hash', 'get_size', 'get_diff')
+    readonly_fields = fields
+
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request)
+            .select_related('post')
+            .defer('post__content')
+            .annotate(size=Length('data'))
+        )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Размер, байт', ordering='size')
+    def get_size(self, obj):
+        return obj.size
+
+    @admin.display(description='Изменения')
+    def get_diff(self, obj):
+        return format_html(
+            '<pre style="white-space:pre-wrap; max-height:600px; overflow:auto;">{}</pre>',
+            revision_diff(obj),
+        )
@@ -2,3 +2,9 @@ from django.apps import AppConfig
 
 class BlogConfig(AppConfig):
     name = 'blog'
+
+    def ready(self):
+        from . import assets, signals  # noqa: F401
+        from .media_urls import check_delivery_settings
+
+        check_delivery_settings()
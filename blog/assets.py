@@ -0,0 +1,90 @@
+import json
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+
+# =========================
+# БАНДЛ РЕДАКТОРА
+# =========================
+#
+# Зависимости TipTap собираются в static/editor/vendor/ (frontend/build.mjs
+# по frontend/package-lock.json) и хранятся в репозитории — так бандл есть
+# при любом развёртывании, включая Passenger. Имя файла содержит хэш
+# содержимого и берётся из manifest.json.
+#
+# Без бандла редактор не грузит модули из сети: textarea остаётся обычным
+# полем HTML. Загрузка с esm.sh — только при EDITOR_CDN_FALLBACK (разработка).
+
+EDITOR_VENDOR_DIR = 'editor/vendor'
+
+
+@lru_cache(maxsize=None)
+def editor_bundle():
+    """Путь бандла относительно static/ или None, если он не собран"""
+    manifest_path = os.path.join(settings.STATIC_DIR, EDITOR_VENDOR_DIR, 'manifest.json')
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    return f'{EDITOR_VENDOR_DIR}/{manifest["editor-deps.js"]}'
+
+
+class ModulePreload:
+    """
+    Элемент Media.js: <link rel="modulepreload"> вместо <script>.
+    Браузер начинает грузить бандл вместе со страницей, а editor-init.js
+    находит ссылку по data-editor-bundle и импортирует модуль по ней.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __eq__(self, other):
+        return isinstance(other, ModulePreload) and self.path == other.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __html__(self):
+        return format_html('<link rel="modulepreload" href="{}" data-editor-bundle>', static(self.path))
+
+
+class CdnFallbackFlag:
+    """Элемент Media.js: разрешает editor-init.js грузить модули с esm.sh"""
+
+    def __eq__(self, other):
+        return isinstance(other, CdnFallbackFlag)
+
+    def __hash__(self):
+        return hash(CdnFallbackFlag)
+
+    def __html__(self):
+        return '<meta name="editor-cdn-fallback" content="1">'
+
+
+def editor_media_js():
+    bundle = editor_bundle()
+    if bundle:
+        head = (ModulePreload(bundle),)
+    elif getattr(settings, 'EDITOR_CDN_FALLBACK', False):
+        head = (CdnFallbackFlag(),)
+    else:
+        head = ()
+    return (*head, 'editor/editor-init.js')
+
+
+@register(Tags.staticfiles)
+def check_editor_bundle(app_configs, **kwargs):
+    if editor_bundle() or getattr(settings, 'EDITOR_CDN_FALLBACK', False):
+        return []
+    return [Warning(
+        'Бандл редактора не собран: в админке будет обычное поле HTML вместо редактора',
+        hint='cd frontend && npm ci && npm run build, затем закоммитить static/editor/vendor/',
+        id='blog.W001',
+    )]
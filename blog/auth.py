@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .instrumentation import count_cache
+
+
+# =========================
+# СНИМОК ПОЛЬЗОВАТЕЛЯ
+# =========================
+#
+# AuthenticationMiddleware на каждый запрос читает пользователя из БД,
+# а проверки доступа — ещё и его группы. Здесь пользователь собирается
+# из снимка в кэше: все поля строки auth_user плюс имена групп.
+# Сессии — cached_db (SESSION_ENGINE), так что авторизованный запрос
+# к статье не делает ни одного запроса к БД ради авторизации.
+#
+# Снимок живёт AUTH_SNAPSHOT_TIMEOUT секунд и удаляется сигналами
+# (blog/signals.py) при сохранении пользователя, смене групп и выходе.
+# Хэш сессии сверяется со снимком; при несовпадении (смена пароля,
+# SECRET_KEY_FALLBACKS) работает обычная проверка Django.
+
+SNAPSHOT_CACHE_PREFIX = 'user-snapshot'
+
+
+def _snapshot_timeout():
+    return getattr(settings, 'AUTH_SNAPSHOT_TIMEOUT', 5 * 60)
+
+
+def _cache_key(user_id):
+    return f'{SNAPSHOT_CACHE_PREFIX}:{user_id}'
+
+
+def remember_user(user):
+    """Кладёт в кэш поля пользователя и имена его групп, возвращает имена"""
+    group_names = frozenset(user.groups.values_list('name', flat=True))
+    fields = {field.attname: getattr(user, field.attname) for field in user._meta.concrete_fields}
+    cache.set(_cache_key(user.pk), (fields, group_names), _snapshot_timeout())
+    return group_names
+
+
+def load_user(user_id):
+    """Пользователь из снимка (с group_names) или None"""
+    snapshot = cache.get(_cache_key(user_id))
+    if snapshot is None:
+        count_cache(misses=1)
+        return None
+    count_cache(hits=1)
+    fields, group_names = snapshot
+    user = auth.get_user_model().from_db(None, list(fields), list(fields.values()))
+    user.group_names = group_names
+    return user
+
+
+def forget_users(user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+def _user_from_snapshot(request):
+    session = request.session
+    try:
+        user_id = auth.get_user_model()._meta.pk.to_python(session[auth.SESSION_KEY])
+        session_hash = session[auth.HASH_SESSION_KEY]
+        backend = session[auth.BACKEND_SESSION_KEY]
+    except (KeyError, ValidationError):
+        return None
+    if backend not in settings.AUTHENTICATION_BACKENDS:
+        return None
+
+    user = load_user(user_id)
+    if user is None or not constant_time_compare(session_hash, user.get_session_auth_hash()):
+        return None
+    user.backend = backend
+    return user
+
+
+def get_user(request):
+    if not hasattr(request, '_cached_user'):
+        user = _user_from_snapshot(request)
+        if user is None:
+            user = auth.get_user(request)
+            if user.is_authenticated:
+                user.group_names = remember_user(user)
+        request._cached_user = user
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware, берущий request.user из снимка в кэше"""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
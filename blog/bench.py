@@ -0,0 +1,424 @@
+"""
+Бенчмарк горячих путей блога.
+
+Запуск: python manage.py bench (см. blog/management/commands/bench.py).
+Работает на отдельной тестовой БД и локальной заглушке S3, поэтому
+не трогает ни рабочую базу, ни бакет.
+"""
+import json
+import random
+import re
+import statistics
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from .access import media_keys_column
+from .models import Category, Post, Section
+from .revisions import content_hash
+
+
+# =========================
+# LOCAL S3 STAND-IN
+# =========================
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    """
+    Минимальный S3 GetObject: любой ключ существует, тело детерминировано.
+    Поддерживает Range, чтобы гонять видео-сценарий /s3-media/.
+    """
+
+    object_size = 2 * 1024 * 1024
+    bucket = 'bench'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _key(self):
+        path = self.path.split('?', 1)[0].lstrip('/')
+        if path.startswith(self.bucket + '/'):
+            path = path[len(self.bucket) + 1:]
+        return path
+
+    def do_GET(self):
+        key = self._key()
+        size = self.object_size
+        content_type = 'video/mp4' if key.endswith('.mp4') else 'image/png'
+        start, end = 0, size - 1
+
+        range_header = self.headers.get('Range')
+        match = re.match(r'bytes=(\d+)-(\d*)', range_header or '')
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), size - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+
+        length = end - start + 1
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+        block = b'\0' * 65536
+        while length > 0:
+            chunk = block[:min(length, len(block))]
+            self.wfile.write(chunk)
+            length -= len(chunk)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(self.object_size))
+        self.end_headers()
+
+    def do_DELETE(self):
+        self.send_response(204)
+        self.end_headers()
+
+
+class FakeS3Server:
+    def __init__(self, bucket):
+        FakeS3Handler.bucket = bucket
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeS3Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def endpoint_url(self):
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@contextmanager
+def test_database():
+    """Временная тестовая БД на время замеров"""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+# =========================
+# SEED
+# =========================
+
+WORDS = (
+    'аккаунт настройка прокси профиль браузер кампания бюджет креатив модерация '
+    'ставка аудитория пиксель домен оффер трафик лендинг проверка доступ ошибка '
+    'шаг нажмите откройте выберите вкладку затем после перед если чтобы можно '
+    'нужно важно обратите внимание пример скриншот видео таблица ссылка кнопка '
+    'account proxy cookie token api dashboard campaign ads manager business'
+).split()
+
+
+def make_content(index, size_kb, rng):
+    """HTML гайда ~size_kb КБ: заголовки, абзацы, картинки и видео из /s3-media/"""
+    parts = []
+    target = size_kb * 1024
+    length = 0
+    block = 0
+    while length < target:
+        heading = 'h2' if block % 3 == 0 else 'h3'
+        parts.append(f'<{heading}>Шаг {block + 1}</{heading}>')
+        words = [rng.choice(WORDS) for _ in range(rng.randint(40, 120))]
+        parts.append('<p>' + ' '.join(words).capitalize() + f'. Шаг {block + 1}, вариант {rng.randint(1, 10 ** 6)}.</p>')
+        if block % 4 == 1:
+            parts.append(f'<p><img src="https://traff-lab.ru/s3-media/uploads/images/bench_{index}_{block}.png"></p>')
+        if block % 8 == 1:
+            parts.append(f'<video src="https://traff-lab.ru/s3-media/uploads/videos/bench_{index}.mp4" controls></video>')
+        length = sum(len(part.encode()) for part in parts)
+        block += 1
+    return ''.join(parts)
+
+
+def _post(content, **fields):
+    """Пост для bulk_create: сигналы не сработают, служебные поля заполняем сами"""
+    return Post(
+        author='bench',
+        content=content,
+        content_hash=content_hash(content),
+        media_keys=media_keys_column(content),
+        **fields,
+    )
+
+
+def seed(categories=2, sections=5, posts=10, faqs=3, size_kb=40, seed_value=42):
+    """Заполняет БД; первые две категории — farm и buyer (как на проде)"""
+    rng = random.Random(seed_value)
+    slugs = ['farm', 'buyer'] + [f'cat-{i}' for i in range(2, categories)]
+
+    category_objs = Category.objects.bulk_create([
+        Category(name=slug.title(), slug=slug) for slug in slugs[:categories]
+    ])
+    section_objs = Section.objects.bulk_create([
+        Section(name=f'Раздел {i}', slug=f'section-{i}', category=category)
+        for category in category_objs
+        for i in range(sections)
+    ])
+
+    today = date.today()
+    articles = Post.objects.bulk_create([
+        _post(
+            title=f'Гайд {section.pk}-{i}',
+            date=today,
+            section=section,
+            content=make_content(section.pk * 1000 + i, size_kb, rng),
+        )
+        for section in section_objs
+        for i in range(posts)
+    ])
+    Post.objects.bulk_create([
+        _post(
+            title=f'FAQ {article.pk}-{i}',
+            date=today,
+            faq_for=article,
+            content=make_content(article.pk * 100 + i, max(size_kb // 8, 1), rng),
+        )
+        for article in articles
+        for i in range(faqs)
+    ])
+
+    user = User.objects.create_user('bench', password='bench')
+    user.groups.add(Group.objects.get_or_create(name='farm')[0])
+    return user
+
+
+# =========================
+# MEASURE
+# =========================
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def _consume(response):
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+        response.close()
+    return response
+
+
+def measure(client, make_request, iterations, memory_iterations, warmup=3):
+    """Латентность (мс), запросы к БД и пиковая память (КБ) на запрос"""
+    for _ in range(warmup):
+        _consume(make_request(client))
+
+    latencies = []
+    queries = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = _consume(make_request(client))
+            latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f'Неожиданный статус {response.status_code}')
+        queries.append(len(captured))
+
+    memory = []
+    for _ in range(memory_iterations):
+        tracemalloc.start()
+        _consume(make_request(client))
+        memory.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p90_ms': round(percentile(latencies, 90), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries': round(statistics.fmean(queries), 2),
+        'peak_kb': round(statistics.fmean(memory), 1) if memory else None,
+    }
+
+
+def scenarios(user):
+    """Имя сценария → функция, выполняющая один запрос"""
+    article = Post.objects.filter(section__category__slug='farm', faq_for__isnull=True).order_by('pk').first()
+    video = f'uploads/videos/bench_{article.section_id * 1000}.mp4'
+    presign_body = json.dumps({'filename': 'Скриншот экрана.png', 'content_type': 'image/png', 'file_size': 1024})
+
+    return {
+        'post_list': lambda client: client.get('/blog/'),
+        'section_page': lambda client: client.get(f'/blog/sections/{article.section_id}/posts/'),
+        'post_detail': lambda client: client.get(f'/blog/{article.pk}/'),
+        'presign': lambda client: client.post(
+            '/get-presigned-url/', presign_body, content_type='application/json',
+        ),
+        'media_range': lambda client: client.get(
+            f'/s3-media/{video}', HTTP_RANGE='bytes=0-1048575',
+        ),
+    }
+
+
+# Лимитер остаётся в замере, но бюджеты не кончаются
+BENCH_RATE_LIMITS = {
+    'media': {'user': (1e6, 1e6), 'ip': (1e6, 1e6)},
+    'presign': {'user': (1e6, 1e6), 'ip': (1e6, 1e6)},
+}
+
+
+def run(user, iterations=50, memory_iterations=5, only=None):
+    client = Client()
+    client.force_login(user)
+    # Загрузки доступны только сотрудникам; медиа при этом меряем под обычным
+    # пользователем, чтобы не обходить проверку доступа
+    editor = User.objects.get_or_create(username='bench-editor', defaults={'is_staff': True})[0]
+    editor_client = Client()
+    editor_client.force_login(editor)
+    results = {}
+    with override_settings(RATE_LIMITS=BENCH_RATE_LIMITS):
+        for name, make_request in scenarios(user).items():
+            if only and name not in only:
+                continue
+            scenario_client = editor_client if name == 'presign' else client
+            results[name] = measure(scenario_client, make_request, iterations, memory_iterations)
+    return results
+
+
+# =========================
+# CONTENT STORAGE
+# =========================
+
+def _database_bytes():
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('VACUUM')
+        cursor.execute('PRAGMA page_count')
+        page_count = cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        return page_count * cursor.fetchone()[0]
+
+
+def measure_content_storage(method, iterations=200, seed_value=42):
+    """
+    Перезаписывает контент всех постов в формате method и замеряет:
+    объём колонки и файла БД, латентность чтения и пиковую память на пост.
+    """
+    with override_settings(POST_CONTENT_COMPRESSION=method):
+        posts = list(Post.objects.only('id', 'content'))
+        Post.objects.bulk_update(posts, ['content'], batch_size=200)
+
+    ids = [post.pk for post in posts]
+    rng = random.Random(seed_value)
+    sample = [rng.choice(ids) for _ in range(iterations)]
+
+    latencies = []
+    for pk in sample:
+        start = time.perf_counter()
+        Post.objects.only('content').get(pk=pk).content
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    memory = []
+    for pk in sample[:20]:
+        tracemalloc.start()
+        Post.objects.only('content').get(pk=pk).content
+        memory.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+
+    return {
+        'column_kb': round(Post.objects.aggregate(size=Sum(Length('content')))['size'] / 1024, 1),
+        'database_kb': round((_database_bytes() or 0) / 1024, 1) or None,
+        'read_p50_ms': round(percentile(latencies, 50), 3),
+        'read_p90_ms': round(percentile(latencies, 90), 3),
+        'peak_kb': round(statistics.fmean(memory), 1),
+    }
+
+
+# =========================
+# URL SIGNING
+# =========================
+
+SIGNING_SETTINGS = {
+    'AWS_ACCESS_KEY_ID': 'bench',
+    'AWS_SECRET_ACCESS_KEY': 'bench',
+    'AWS_S3_ENDPOINT_URL': 'https://s3.bench.invalid',
+    'AWS_S3_REGION_NAME': 'ru1',
+    'AWS_STORAGE_BUCKET_NAME': 'bench',
+}
+
+
+def _time_per_call(func, iterations):
+    func(0)
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return round((time.perf_counter() - start) / iterations * 1e6, 2)
+
+
+def measure_signing(iterations=2000):
+    """
+    Микросекунды на одну подпись: botocore против blog/signing.py.
+    Сеть не нужна — обе стороны только считают подпись.
+    """
+    from .s3 import get_s3_client
+    from .signing import presign_get, presign_post, signing_key
+
+    # botocore дописывает в Conditions bucket и key — ему передаётся копия
+    conditions = [['content-length-range', 1, 1024], {'Content-Type': 'image/png'}]
+    with override_settings(**SIGNING_SETTINGS):
+        get_s3_client.cache_clear()
+        signing_key.cache_clear()
+        try:
+            client = get_s3_client()
+            return {
+                'botocore_get': _time_per_call(lambda i: client.generate_presigned_url(
+                    'get_object', Params={'Bucket': 'bench', 'Key': f'uploads/images/{i}.png'}, ExpiresIn=3600,
+                ), iterations),
+                'local_get': _time_per_call(lambda i: presign_get(f'uploads/images/{i}.png', 3600), iterations),
+                'botocore_post': _time_per_call(lambda i: client.generate_presigned_post(
+                    'bench', f'uploads/images/{i}.png', Fields={'Content-Type': 'image/png'},
+                    Conditions=list(conditions), ExpiresIn=3600,
+                ), iterations),
+                'local_post': _time_per_call(lambda i: presign_post(
+                    f'uploads/images/{i}.png', {'Content-Type': 'image/png'}, conditions, 3600,
+                ), iterations),
+            }
+        finally:
+            get_s3_client.cache_clear()
+
+
+# =========================
+# BASELINE
+# =========================
+
+def compare(results, baseline, tolerance=0.2):
+    """Список регрессий относительно сохранённого baseline"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p90_ms'):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {previous[metric]} → {current[metric]}')
+        if current['queries'] > previous['queries']:
+            regressions.append(f'{name}: queries {previous["queries"]} → {current["queries"]}')
+        if current['peak_kb'] and previous.get('peak_kb') and current['peak_kb'] > previous['peak_kb'] * (1 + tolerance):
+            regressions.append(f'{name}: peak_kb {previous["peak_kb"]} → {current["peak_kb"]}')
+    return regressions
@@ -0,0 +1,81 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .access import allowed_category_slugs
+
+
+# =========================
+# УСЛОВНЫЕ ЗАПРОСЫ (ETag / Last-Modified)
+# =========================
+#
+# Валидаторы считаются без рендера страницы, из того, от чего она зависит:
+#   - версия дерева навигации (категории → разделы → посты, FAQ в сайдбаре),
+#     хранится в кэше и сдвигается сигналами при любых правках;
+#   - хэш ревизии контента статьи (Post.content_hash);
+#   - пользователь и его категории — шапка и дерево у каждого свои;
+#   - для подписанных ссылок на медиа — окно MEDIA_URL_REFRESH_MARGIN,
+#     чтобы браузер не получил 304 на страницу с истёкшими ссылками;
+#   - HTTP_CACHE_VERSION — сменить при выкладке, меняющей шаблоны.
+#
+# Ответы помечаются Cache-Control: private, no-cache и Vary: Cookie:
+# браузер (или nginx с ключом по сессии) хранит копию, но каждый раз
+# сверяет её с сервером и получает 304, если ничего не поменялось.
+
+NAV_VERSION_CACHE_KEY = 'nav-version'
+
+
+def nav_version():
+    """Время последнего изменения навигации (unix time), оно же её версия"""
+    version = cache.get(NAV_VERSION_CACHE_KEY)
+    if version is None:
+        # Кэш пуст (рестарт, вытеснение): считаем, что всё изменилось сейчас
+        cache.add(NAV_VERSION_CACHE_KEY, time.time(), None)
+        version = cache.get(NAV_VERSION_CACHE_KEY) or time.time()
+    return version
+
+
+def bump_nav_version():
+    cache.set(NAV_VERSION_CACHE_KEY, time.time(), None)
+
+
+def _media_epoch():
+    if getattr(settings, 'MEDIA_DELIVERY', 'proxy') == 'proxy':
+        return 0
+    return int(time.time() // getattr(settings, 'MEDIA_URL_REFRESH_MARGIN', 5 * 60))
+
+
+def _user_scope(user):
+    slugs = allowed_category_slugs(user)
+    return f'{user.pk}:{user.username}:' + ('*' if slugs is None else ','.join(sorted(slugs)))
+
+
+def make_etag(user, *parts):
+    parts = (
+        getattr(settings, 'HTTP_CACHE_VERSION', ''),
+        _user_scope(user),
+        _media_epoch(),
+        *parts,
+    )
+    digest = hashlib.md5(':'.join(map(str, parts)).encode('utf-8'), usedforsecurity=False)
+    return f'"{digest.hexdigest()}"'
+
+
+def conditional_response(request, etag, last_modified):
+    """304 с валидаторами, если копия клиента актуальна, иначе None"""
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
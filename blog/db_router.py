@@ -0,0 +1,107 @@
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+# =========================
+# РЕПЛИКА ДЛЯ ЧТЕНИЯ
+# =========================
+#
+# Запросы на чтение из view, помеченных @replica_reads (список и статья блога,
+# порции разделов, проверка доступа /s3-media/), идут в READ_REPLICA_ALIAS.
+# Всё остальное — админка, авторизация, сессии, любые записи — в default.
+#
+# Read-your-writes: если запрос пользователя что-то записал в БД,
+# ReplicaPinMiddleware кладёт в его сессию срок READ_YOUR_WRITES_SECONDS,
+# и до его истечения помеченные view этого пользователя читают из default —
+# он сразу видит свою правку, даже если реплика отстаёт.
+#
+# Без READ_REPLICA_ALIAS (или без такого алиаса в DATABASES) router
+# ничего не меняет.
+
+PIN_SESSION_KEY = '_db_primary_until'
+
+# Запись сессии (cached_db) не считается правкой пользователя
+IGNORED_WRITE_MODELS = {'sessions.session'}
+
+
+class _RequestState:
+    __slots__ = ('read_only', 'wrote')
+
+    def __init__(self):
+        self.read_only = False
+        self.wrote = False
+
+
+_state = ContextVar('db_routing', default=None)
+
+
+def replica_alias():
+    alias = getattr(settings, 'READ_REPLICA_ALIAS', '')
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def _pin_window():
+    return getattr(settings, 'READ_YOUR_WRITES_SECONDS', 5)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.read_only:
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.label_lower not in IGNORED_WRITE_MODELS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия default: объекты из обеих баз связывать можно
+        return True
+
+
+def _pinned(request):
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+
+def replica_reads(view):
+    """Чтения внутри view — из реплики, если пользователь недавно ничего не менял"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        if state is None or not replica_alias() or _pinned(request):
+            return view(request, *args, **kwargs)
+        state.read_only = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.read_only = False
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """
+    Отслеживает записи запроса и закрепляет пользователя за default.
+    Стоит после SessionMiddleware: метку в сессии сохраняет она.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = _RequestState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and replica_alias() and hasattr(request, 'session'):
+            request.session[PIN_SESSION_KEY] = time.time() + _pin_window()
+        return response
@@ -0,0 +1,183 @@
+import json
+import tempfile
+import zlib
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import FieldError
+from django.db import connections, models
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    zstd = None
+
+
+# =========================
+# COMPRESSED TEXT FIELD
+# =========================
+#
+# Поле включается настройкой POST_CONTENT_COMPRESSION ('zstd', 'zlib' или None).
+#
+# Без сжатия (по умолчанию) это обычный TEXT: значения хранятся как есть,
+# все lookup'ы (contains, icontains, exact…) работают как у TextField.
+#
+# Со сжатием колонка — BLOB: первый байт — формат, дальше данные.
+#   0x00 — UTF-8 без сжатия
+#   0x01 — zlib
+#   0x02 — zstd
+# Короткие тексты не сжимаются — выигрыша нет. По сжатому контенту нельзя
+# искать средствами БД: lookup'ы сравнивали бы текст со сжатыми байтами
+# и молча ничего не находили, поэтому разрешён только isnull. Для поиска
+# по файлам есть Post.media_keys.
+#
+# Читаются оба вида значений, так что смена настройки ничего не ломает
+# при чтении. Тип колонки и формат записей приводит к настройке
+# manage.py recompress_content (см. convert_column).
+
+FORMAT_RAW = 0
+FORMAT_ZLIB = 1
+FORMAT_ZSTD = 2
+
+
+def compress_text(value, method=None, min_size=0):
+    data = value.encode('utf-8')
+    if method == 'zstd' and zstd is not None and len(data) >= min_size:
+        return bytes([FORMAT_ZSTD]) + zstd.compress(data, level=3)
+    if method in ('zlib', 'zstd') and len(data) >= min_size:
+        return bytes([FORMAT_ZLIB]) + zlib.compress(data, 6)
+    return bytes([FORMAT_RAW]) + data
+
+
+def decompress_text(data):
+    data = bytes(data)
+    if not data:
+        return ''
+    header, payload = data[0], data[1:]
+    if header == FORMAT_RAW:
+        return payload.decode('utf-8')
+    if header == FORMAT_ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    if header == FORMAT_ZSTD:
+        if zstd is None:
+            raise ValueError('Контент сжат zstd, но модуль compression.zstd недоступен')
+        return zstd.decompress(payload).decode('utf-8')
+    raise ValueError(f'Неизвестный формат сжатого текста: {header}')
+
+
+def compression_method():
+    return getattr(settings, 'POST_CONTENT_COMPRESSION', None)
+
+
+class CompressedTextField(models.Field):
+    """Текст для Python/админки; при включённом сжатии — сжатый BLOB в БД"""
+
+    description = 'Сжатый текст'
+
+    # Со сжатием остальные lookup'ы сравнивали бы текст со сжатым BLOB
+    COMPRESSED_LOOKUPS = frozenset({'isnull'})
+
+    def get_internal_type(self):
+        return 'BinaryField' if compression_method() else 'TextField'
+
+    def get_lookup(self, lookup_name):
+        if compression_method() and lookup_name not in self.COMPRESSED_LOOKUPS:
+            raise FieldError(
+                f"{self.model.__name__}.{self.name}: lookup '{lookup_name}' не поддерживается — "
+                'контент хранится сжатым (POST_CONTENT_COMPRESSION, см. blog/fields.py)'
+            )
+        return super().get_lookup(lookup_name)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or isinstance(value, str):
+            return value
+        return decompress_text(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return decompress_text(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return None
+        method = compression_method()
+        if isinstance(value, str):
+            if not method:
+                return value
+            value = compress_text(value, method, getattr(settings, 'POST_CONTENT_COMPRESSION_MIN_SIZE', 1024))
+        return connection.Database.Binary(value)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{
+            'form_class': forms.CharField,
+            'widget': forms.Textarea,
+            **kwargs,
+        })
+
+
+# =========================
+# COLUMN CONVERSION
+# =========================
+
+def column_type(model, field_name, using='default'):
+    """Тип колонки в БД как внутренний тип Django ('TextField', 'BinaryField', …)"""
+    connection = connections[using]
+    column = model._meta.get_field(field_name).column
+    with connection.cursor() as cursor:
+        description = connection.introspection.get_table_description(cursor, model._meta.db_table)
+    for info in description:
+        if info.name == column:
+            return connection.introspection.get_field_type(info.type_code, info)
+    raise FieldError(f'{model._meta.db_table}.{column}: колонка не найдена')
+
+
+def convert_column(model, field_name, using='default', batch_size=200):
+    """
+    Приводит тип колонки CompressedTextField к текущей настройке сжатия.
+    Значения выгружаются во временный файл, колонка очищается и меняет тип,
+    затем значения записываются обратно — без приведения типов силами СУБД
+    (text ↔ bytea в Postgres исказило бы данные). Память не растёт с числом строк.
+    Возвращает True, если колонка была изменена.
+
+    На SQLite нельзя вызывать внутри transaction.atomic: schema editor
+    отключает проверку внешних ключей.
+    """
+    field = model._meta.get_field(field_name)
+    current = column_type(model, field_name, using)
+    if current == field.get_internal_type():
+        return False
+
+    old_field = (models.BinaryField if current == 'BinaryField' else models.TextField)(field.verbose_name)
+    old_field.set_attributes_from_name(field.name)
+    old_field.model = model
+    connection = connections[using]
+    queryset = model._default_manager.using(using)
+
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as dump:
+        for pk, value in queryset.values_list('pk', field_name).iterator(batch_size):
+            dump.write(json.dumps([pk, value], ensure_ascii=False) + '\n')
+
+        with connection.schema_editor() as schema_editor:
+            empty = old_field.get_db_prep_value(b'' if current == 'BinaryField' else '', connection)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {connection.ops.quote_name(model._meta.db_table)} '
+                    f'SET {connection.ops.quote_name(field.column)} = %s',
+                    [empty],
+                )
+            schema_editor.alter_field(model, old_field, field)
+
+            dump.seek(0)
+            batch = []
+            for line in dump:
+                pk, value = json.loads(line)
+                batch.append(model(pk=pk, **{field_name: value}))
+                if len(batch) >= batch_size:
+                    queryset.bulk_update(batch, [field_name])
+                    batch = []
+            queryset.bulk_update(batch, [field_name])
+    return True
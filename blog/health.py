@@ -0,0 +1,171 @@
+import logging
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import JsonResponse
+from django.template.loader import get_template
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+
+from .s3 import get_bucket_name, get_s3_client
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# HEALTH / READINESS
+# =========================
+#
+# /healthz — процесс жив и отвечает (без внешних зависимостей, чтобы
+#            падение БД или S3 не приводило к перезапуску контейнера).
+# /readyz  — БД и кэш отвечают за HEALTH_CHECK_TIMEOUT секунд и воркер
+#            прогрет (warm_up). Пока не готов — 503.
+#            S3 проверяется и попадает в ответ, но готовность не блокирует
+#            (READYZ_REQUIRE_S3=False): без S3 не открываются только медиа,
+#            а сбой хранилища не должен останавливать деплой.
+#
+# Прогрев выполняется в gunicorn до приёма запросов (post_worker_init
+# в gunicorn.conf.py), а под runserver — при первом /readyz.
+
+WARMUP_LOCK_KEY = 'warmup-lock'
+
+_warmed = threading.Event()
+_warm_lock = threading.Lock()
+
+
+def _check_timeout():
+    return getattr(settings, 'HEALTH_CHECK_TIMEOUT', 2)
+
+
+def check_database():
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    finally:
+        # Проверка идёт в отдельном потоке — его соединение не переиспользуется
+        connection.close()
+
+
+def check_cache():
+    token = secrets.token_hex(8)
+    cache.set('health-probe', token, 30)
+    if cache.get('health-probe') != token:
+        raise RuntimeError('кэш не вернул записанное значение')
+
+
+def check_s3():
+    get_s3_client().head_bucket(Bucket=get_bucket_name())
+
+
+CHECKS = {
+    'database': check_database,
+    'cache': check_cache,
+    's3': check_s3,
+}
+
+
+def _required_checks():
+    if getattr(settings, 'READYZ_REQUIRE_S3', False):
+        return set(CHECKS)
+    return set(CHECKS) - {'s3'}
+
+
+def run_checks():
+    """{имя: 'ok' | текст ошибки}; каждая проверка ограничена HEALTH_CHECK_TIMEOUT"""
+    executor = ThreadPoolExecutor(max_workers=len(CHECKS))
+    futures = {name: executor.submit(check) for name, check in CHECKS.items()}
+    deadline = time.monotonic() + _check_timeout()
+    results = {}
+    for name, future in futures.items():
+        try:
+            future.result(timeout=max(deadline - time.monotonic(), 0))
+            results[name] = 'ok'
+        except FutureTimeout:
+            results[name] = 'timeout'
+        except Exception as e:
+            results[name] = f'error: {e}'
+    # Зависшую проверку не ждём: поток доработает сам
+    executor.shutdown(wait=False)
+    return results
+
+
+# =========================
+# ПРОГРЕВ
+# =========================
+
+def prime_shared_caches():
+    """
+    Общий кэш (Redis): порции списков разделов и рендер WARMUP_POSTS
+    последних статей. Достаточно одного воркера на версию навигации.
+    """
+    from .conditional import nav_version
+    from .models import Post, Section
+    from .rendering import render_post_content, section_page
+
+    if not cache.add(f'{WARMUP_LOCK_KEY}:{nav_version()}', True, 10 * 60):
+        return
+    for section_id in Section.objects.values_list('pk', flat=True):
+        section_page(section_id)
+    posts = Post.objects.only('id', 'content', 'content_hash').order_by('-date', '-pk')
+    for post in posts[:getattr(settings, 'WARMUP_POSTS', 20)]:
+        render_post_content(post)
+
+
+def prime_process():
+    """Своё у каждого процесса: шаблоны и пул соединений S3 клиента"""
+    for name in ('blog/blog.html', 'blog/blog_detail.html', 'blog/section_posts.html'):
+        get_template(name)
+    # Как и в /readyz, недоступный S3 не держит прогрев дольше HEALTH_CHECK_TIMEOUT
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        executor.submit(check_s3).result(timeout=_check_timeout())
+    except Exception as e:
+        if 's3' in _required_checks():
+            raise
+        # Пул соединений наберётся на первых запросах к медиа
+        logger.warning('S3 недоступен при прогреве: %r', e)
+    finally:
+        executor.shutdown(wait=False)
+
+
+def warm_up():
+    """Прогревает воркер один раз; ошибки не мешают старту, но /readyz их покажет"""
+    with _warm_lock:
+        if _warmed.is_set():
+            return
+        start = time.perf_counter()
+        try:
+            prime_process()
+            prime_shared_caches()
+        except Exception:
+            logger.exception('Прогрев не удался')
+            return
+        _warmed.set()
+        logger.info('Прогрев завершён за %.2f c', time.perf_counter() - start)
+
+
+# =========================
+# VIEWS
+# =========================
+
+@never_cache
+@require_GET
+def healthz(request):
+    return JsonResponse({'status': 'ok'})
+
+
+@never_cache
+@require_GET
+def readyz(request):
+    checks = run_checks()
+    required = _required_checks()
+    if all(checks[name] == 'ok' for name in required) and not _warmed.is_set():
+        warm_up()
+    checks['warm_up'] = 'ok' if _warmed.is_set() else 'pending'
+    ready = all(checks[name] == 'ok' for name in required | {'warm_up'})
+    return JsonResponse({'status': 'ok' if ready else 'unavailable', 'checks': checks}, status=200 if ready else 503)
@@ -0,0 +1,220 @@
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger('blog.perf')
+
+_current = ContextVar('request_timings', default=None)
+
+
+# =========================
+# CONTEXT API
+# =========================
+
+class RequestTimings:
+    """Счётчики времени одного запроса"""
+
+    __slots__ = (
+        'start', 'db_count', 'db_time', 'cache_hits', 'cache_misses',
+        's3_count', 's3_time', 'template_time', 'spans', '_s3_started',
+    )
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.s3_count = 0
+        self.s3_time = 0.0
+        self.template_time = 0.0
+        self.spans = {}
+        self._s3_started = []
+
+    def add_span(self, name, duration):
+        self.spans[name] = self.spans.get(name, 0.0) + duration
+
+    def server_timing(self, total):
+        """Значение заголовка Server-Timing (длительности в мс)"""
+        metrics = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_count} queries"',
+            f'cache;desc="{self.cache_hits} hit / {self.cache_misses} miss"',
+            f's3;dur={self.s3_time * 1000:.1f};desc="{self.s3_count} calls"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+        ]
+        metrics += [f'{name};dur={duration * 1000:.1f}' for name, duration in self.spans.items()]
+        return ', '.join(metrics)
+
+    def as_dict(self, total):
+        return {
+            'total_ms': round(total * 1000, 1),
+            'db_queries': self.db_count,
+            'db_ms': round(self.db_time * 1000, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            's3_calls': self.s3_count,
+            's3_ms': round(self.s3_time * 1000, 1),
+            'template_ms': round(self.template_time * 1000, 1),
+            **{f'{name}_ms': round(duration * 1000, 1) for name, duration in self.spans.items()},
+        }
+
+
+def current_timings():
+    """Счётчики текущего запроса или None, если запрос не замеряется"""
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """Замеряет участок кода и добавляет его в Server-Timing"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_span(name, time.perf_counter() - start)
+
+
+def count_cache(hits=0, misses=0):
+    timings = _current.get()
+    if timings is not None:
+        timings.cache_hits += hits
+        timings.cache_misses += misses
+
+
+# =========================
+# HOOKS
+# =========================
+
+def _db_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if timings is not None:
+            timings.db_count += 1
+            timings.db_time += time.perf_counter() - start
+
+
+def _s3_before_call(**kwargs):
+    timings = _current.get()
+    if timings is not None:
+        timings._s3_started.append(time.perf_counter())
+
+
+def _s3_after_call(**kwargs):
+    timings = _current.get()
+    if timings is not None and timings._s3_started:
+        timings.s3_count += 1
+        timings.s3_time += time.perf_counter() - timings._s3_started.pop()
+
+
+def register_s3_hooks(client):
+    """Подключает замер вызовов S3 через события botocore"""
+    client.meta.events.register('before-call.s3', _s3_before_call)
+    client.meta.events.register('after-call.s3', _s3_after_call)
+
+
+class _InstrumentedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            timings.template_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, засекающий время рендера шаблонов верхнего уровня"""
+
+    def from_string(self, template_code):
+        return _InstrumentedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _InstrumentedTemplate(super().get_template(template_name))
+
+
+# =========================
+# MIDDLEWARE
+# =========================
+
+class PerformanceMiddleware:
+    """
+    Замеряет время запроса, БД, кэша, S3 и шаблонов.
+
+    PERF_INSTRUMENTATION = False — middleware отключается при старте.
+    PERF_SAMPLE_RATE — доля запросов с подробным замером и Server-Timing.
+    PERF_SLOW_REQUEST_MS — запросы дольше порога логируются как WARNING всегда.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PERF_SAMPLE_RATE', 1.0)
+        self.slow_threshold = getattr(settings, 'PERF_SLOW_REQUEST_MS', 500) / 1000
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self._call_unsampled(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_db_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total = time.perf_counter() - timings.start
+        response['Server-Timing'] = timings.server_timing(total)
+        self._log(request, response, total, timings.as_dict(total))
+        return response
+
+    def _call_unsampled(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        total = time.perf_counter() - start
+        if total >= self.slow_threshold:
+            self._log(request, response, total, {'total_ms': round(total * 1000, 1)})
+        return response
+
+    def _log(self, request, response, total, fields):
+        level = logging.WARNING if total >= self.slow_threshold else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **fields,
+        }
+        logger.log(
+            level,
+            'request %s',
+            ' '.join(f'{key}={value}' for key, value in fields.items()),
+            extra={'perf': fields},
+        )
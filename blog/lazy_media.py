@@ -0,0 +1,155 @@
+import logging
+import re
+import struct
+from urllib.parse import unquote, urlparse
+
+from django.core.cache import cache
+
+from .access import MEDIA_KEY_RE
+from .s3 import get_bucket_name, get_s3_client
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# ОТЛОЖЕННАЯ ЗАГРУЗКА МЕДИА В СТАТЬЕ
+# =========================
+#
+# Контент статьи переписывается при рендере (результат кэшируется по хэшу
+# ревизии, см. blog/rendering.py):
+#   <img>    — loading="lazy" (кроме первой), decoding="async", width/height
+#   <video>  — preload="none": до клика ни одного запроса к /s3-media/
+#   YouTube  — заглушка с превью вместо iframe, плеер грузится по клику
+#
+# Размеры картинок читаются из заголовка файла (первые HEADER_BYTES в S3)
+# при сохранении поста и лежат в кэше бессрочно: ключи загрузок не меняются.
+
+HEADER_BYTES = 64 * 1024
+SIZE_CACHE_PREFIX = 'media-size'
+UNKNOWN_SIZE = (0, 0)
+
+IMAGE_KEY_RE = re.compile(r'\.(jpe?g|png|gif|webp)$', re.IGNORECASE)
+YOUTUBE_ID_RE = re.compile(r'/embed/([\w-]{6,})')
+
+
+# =========================
+# РАЗМЕРЫ ИЗОБРАЖЕНИЙ
+# =========================
+
+def _jpeg_size(head):
+    i = 2
+    while i + 9 < len(head):
+        if head[i] != 0xFF:
+            i += 1
+            continue
+        marker = head[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = struct.unpack('>H', head[i + 2:i + 4])[0]
+        # SOF0..SOF15, кроме DHT/JPG/DAC
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', head[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def image_size(head):
+    """(ширина, высота) по первым байтам PNG/GIF/WebP/JPEG или None"""
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and len(head) >= 24:
+        return struct.unpack('>II', head[16:24])
+    if head[:6] in (b'GIF87a', b'GIF89a') and len(head) >= 10:
+        return struct.unpack('<HH', head[6:10])
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP' and len(head) >= 30:
+        chunk = head[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', head[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b'VP8L':
+            bits = int.from_bytes(head[21:25], 'little')
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X':
+            return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+    if head.startswith(b'\xff\xd8'):
+        return _jpeg_size(head)
+    return None
+
+
+def remember_image_size(key, head):
+    size = image_size(head)
+    if size:
+        cache.set(f'{SIZE_CACHE_PREFIX}:{key}', tuple(size), None)
+    return size
+
+
+def ensure_image_sizes(keys):
+    """Дочитывает из S3 размеры картинок, которых ещё нет в кэше"""
+    keys = [key for key in keys if IMAGE_KEY_RE.search(key)]
+    known = cache.get_many([f'{SIZE_CACHE_PREFIX}:{key}' for key in keys])
+    s3_client = get_s3_client()
+    for key in keys:
+        if f'{SIZE_CACHE_PREFIX}:{key}' in known:
+            continue
+        try:
+            s3_response = s3_client.get_object(Bucket=get_bucket_name(), Key=key, Range=f'bytes=0-{HEADER_BYTES - 1}')
+            head = s3_response['Body'].read()
+        except Exception as e:
+            logger.warning('Не удалось прочитать заголовок %s: %s', key, e)
+            continue
+        if not remember_image_size(key, head):
+            cache.set(f'{SIZE_CACHE_PREFIX}:{key}', UNKNOWN_SIZE, None)
+
+
+# =========================
+# ПЕРЕПИСЫВАНИЕ HTML
+# =========================
+
+def _media_key(url):
+    match = MEDIA_KEY_RE.search(url or '')
+    return unquote(match.group(1)) if match else None
+
+
+def _youtube_facade(soup, iframe):
+    src = iframe.get('src', '')
+    match = YOUTUBE_ID_RE.search(urlparse(src).path)
+    if not match:
+        return
+    video_id = match.group(1)
+
+    facade = soup.new_tag('button', attrs={
+        'type': 'button',
+        'class': 'yt-facade',
+        'data-src': src,
+        'aria-label': 'Смотреть видео',
+        'style': f'background-image: url(https://i.ytimg.com/vi/{video_id}/hqdefault.jpg)',
+    })
+    iframe.replace_with(facade)
+
+
+def rewrite_media(soup):
+    """
+    Ленивые картинки, видео без предзагрузки и заглушки YouTube.
+    Возвращает ключи картинок, размеров которых в кэше ещё нет.
+    """
+    images = soup.find_all('img')
+    keys = {_media_key(img.get('src')) for img in images} - {None}
+    sizes = cache.get_many([f'{SIZE_CACHE_PREFIX}:{key}' for key in keys])
+
+    for index, img in enumerate(images):
+        # Первая картинка обычно видна сразу — её не откладываем
+        if index > 0:
+            img['loading'] = 'lazy'
+        img['decoding'] = 'async'
+        size = sizes.get(f'{SIZE_CACHE_PREFIX}:{_media_key(img.get("src"))}')
+        if size and size != UNKNOWN_SIZE and not img.get('width') and not img.get('height'):
+            img['width'], img['height'] = str(size[0]), str(size[1])
+
+    for video in soup.find_all('video'):
+        video['preload'] = 'none'
+
+    for iframe in soup.find_all('iframe'):
+        if 'youtube' in iframe.get('src', ''):
+            _youtube_facade(soup, iframe)
+
+    return {key for key in keys if f'{SIZE_CACHE_PREFIX}:{key}' not in sizes}
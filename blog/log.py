@@ -0,0 +1,177 @@
+import atexit
+import copy
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+
+# =========================
+# ЛОГИ: JSON, ОЧЕРЕДЬ, REQUEST ID
+# =========================
+#
+# Поток запроса только кладёт запись в очередь (QueueingStreamHandler):
+# форматирование в JSON и запись в stderr делает поток QueueListener.
+# В потоке запроса остаются подстановка аргументов (логи пишутся
+# с %s, а не f-строками — для отфильтрованных записей она не выполняется)
+# и фильтры:
+#   RequestIdFilter — request_id текущего запроса (RequestIdMiddleware,
+#                     берёт X-Request-ID от nginx или генерирует свой);
+#   SamplingFilter  — доля и лимит записей в секунду для шумных логгеров
+#                     (boto3/botocore/s3transfer); WARNING и выше проходят всегда.
+
+_request_id = ContextVar('request_id', default=None)
+
+# Атрибуты LogRecord, которые не считаются дополнительными полями (extra=...)
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        # django.request пишет уже после middleware — id берём из самого запроса
+        record.request_id = _request_id.get() or getattr(getattr(record, 'request', None), 'request_id', None)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    rules = {'botocore': (доля, в секунду), ...} — по префиксу имени логгера.
+    Лимит считается в процессе: токены копятся со скоростью «в секунду».
+    """
+
+    def __init__(self, rules=None):
+        super().__init__()
+        self.rules = dict(rules or {})
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _rule(self, name):
+        for prefix, rule in self.rules.items():
+            if name == prefix or name.startswith(prefix + '.'):
+                return prefix, rule
+        return None, None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        prefix, rule = self._rule(record.name)
+        if rule is None:
+            return True
+
+        rate, per_second = rule
+        if random.random() >= rate:
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(prefix, (per_second, now))
+            tokens = min(per_second, tokens + (now - updated) * per_second)
+            if tokens < 1:
+                self._buckets[prefix] = (tokens, now)
+                return False
+            self._buckets[prefix] = (tokens - 1, now)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись: время, уровень, логгер, сообщение, request_id и extra-поля"""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class QueueingStreamHandler(QueueHandler):
+    """
+    QueueHandler со своим QueueListener и StreamHandler (stderr).
+    json_format=False — обычный текст, удобнее при локальной разработке.
+
+    В LOGGING подключается через '()'. Через 'class' dictConfig (Python 3.12+)
+    передаёт очередь первым аргументом и кладёт в handler.listener свой
+    пустой listener — поэтому queue первый параметр, а наш listener
+    хранится отдельно, в _writer.
+    """
+
+    def __init__(self, queue=None, json_format=True, stream=None):
+        super().__init__(queue if queue is not None else SimpleQueue())
+        target = logging.StreamHandler(stream or sys.stderr)
+        if json_format:
+            target.setFormatter(JsonFormatter())
+        else:
+            target.setFormatter(logging.Formatter(
+                '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s',
+                defaults={'request_id': '-'},
+            ))
+        self._writer = QueueListener(self.queue, target, respect_handler_level=True)
+        self._writer.start()
+        atexit.register(self._stop_listener)
+
+    def _stop_listener(self):
+        # Дописывает очередь; повторный stop() у QueueListener падает
+        if self._writer._thread is not None:
+            self._writer.stop()
+
+    def prepare(self, record):
+        """
+        Снимок записи для другого потока. В отличие от QueueHandler.prepare
+        не форматирует её целиком: подставляются только аргументы,
+        а traceback переводится в текст (кадры не держим в очереди).
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self):
+        self._stop_listener()
+        super().close()
+
+
+# =========================
+# MIDDLEWARE
+# =========================
+
+class RequestIdMiddleware:
+    """
+    request_id для всех логов запроса: X-Request-ID от nginx ($request_id)
+    или свой. Возвращается клиенту в заголовке X-Request-ID.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.META.get('HTTP_X_REQUEST_ID', '')[:64] or uuid.uuid4().hex
+        request.request_id = request_id
+        token = _request_id.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_id.reset(token)
+        response['X-Request-ID'] = request_id
+        return response
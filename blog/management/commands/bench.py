@@ -0,0 +1,83 @@
+import json
+import logging
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from blog import bench
+from blog.s3 import get_s3_client
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк горячих путей блога на тестовой БД и локальной заглушке S3'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=2)
+        parser.add_argument('--sections', type=int, default=5, help='Разделов в категории')
+        parser.add_argument('--posts', type=int, default=10, help='Статей в разделе')
+        parser.add_argument('--faqs', type=int, default=3, help='FAQ на статью')
+        parser.add_argument('--size-kb', type=int, default=40, help='Размер HTML статьи')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--memory-iterations', type=int, default=5)
+        parser.add_argument('--only', nargs='*', help='Сценарии: post_list post_detail presign media_range')
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+        parser.add_argument('--baseline', help='Сравнить с сохранённым JSON')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Допустимый рост латентности (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        with bench.test_database():
+            results = self._run(options)
+
+        self._report(results)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2, ensure_ascii=False))
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+        if options['baseline']:
+            baseline = json.loads(Path(options['baseline']).read_text())
+            regressions = bench.compare(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('Регрессии:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('Регрессий относительно baseline нет'))
+
+    def _run(self, options):
+        with bench.FakeS3Server('bench') as s3, override_settings(
+            AWS_ACCESS_KEY_ID='bench',
+            AWS_SECRET_ACCESS_KEY='bench',
+            AWS_S3_ENDPOINT_URL=s3.endpoint_url,
+            AWS_STORAGE_BUCKET_NAME='bench',
+            PERF_INSTRUMENTATION=False,
+        ):
+            get_s3_client.cache_clear()
+            cache.clear()
+            # INFO-логи views на каждый запрос искажают замеры
+            logging.disable(logging.INFO)
+            try:
+                user = bench.seed(
+                    categories=max(options['categories'], 1),
+                    sections=options['sections'],
+                    posts=options['posts'],
+                    faqs=options['faqs'],
+                    size_kb=options['size_kb'],
+                )
+                return bench.run(
+                    user,
+                    iterations=options['iterations'],
+                    memory_iterations=options['memory_iterations'],
+                    only=options['only'],
+                )
+            finally:
+                logging.disable(logging.NOTSET)
+                get_s3_client.cache_clear()
+
+    def _report(self, results):
+        header = f'{"сценарий":<14}{"p50":>10}{"p90":>10}{"p99":>10}{"mean":>10}{"queries":>10}{"peak KB":>10}'
+        self.stdout.write(header)
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:<14}{row["p50_ms"]:>10}{row["p90_ms"]:>10}{row["p99_ms"]:>10}'
+                f'{row["mean_ms"]:>10}{row["queries"]:>10}{row["peak_kb"]!s:>10}'
+            )
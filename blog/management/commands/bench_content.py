@@ -0,0 +1,35 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from blog import bench
+from blog.fields import zstd
+
+
+class Command(BaseCommand):
+    help = 'Сравнение хранения Post.content: без сжатия, zlib, zstd'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=200, help='Статей (в одном разделе)')
+        parser.add_argument('--size-kb', type=int, default=40, help='Размер HTML статьи')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        methods = [None, 'zlib'] + (['zstd'] if zstd is not None else [])
+        results = {}
+        with bench.test_database():
+            bench.seed(categories=1, sections=1, posts=options['posts'], faqs=0, size_kb=options['size_kb'])
+            for method in methods:
+                results[method or 'raw'] = bench.measure_content_storage(method, options['iterations'])
+
+        self.stdout.write(f'{"формат":<8}{"колонка KB":>12}{"БД KB":>12}{"p50 ms":>10}{"p90 ms":>10}{"peak KB":>10}')
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:<8}{row["column_kb"]:>12}{row["database_kb"]!s:>12}'
+                f'{row["read_p50_ms"]:>10}{row["read_p90_ms"]:>10}{row["peak_kb"]:>10}'
+            )
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2, ensure_ascii=False))
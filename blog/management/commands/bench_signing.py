@@ -0,0 +1,24 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from blog import bench
+
+
+class Command(BaseCommand):
+    help = 'Стоимость одной подписи S3 URL: botocore против blog/signing.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        results = bench.measure_signing(options['iterations'])
+
+        self.stdout.write(f'{"подпись":<16}{"мкс":>10}')
+        for name, micros in results.items():
+            self.stdout.write(f'{name:<16}{micros:>10}')
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2, ensure_ascii=False))
@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from blog.transfer import DEFAULT_BATCH_SIZE, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Экспорт категорий, разделов и постов (с FAQ) в JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-', help='Файл (по умолчанию stdout)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self._write(sys.stdout, options['batch_size'])
+            return
+
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            count = self._write(output, options['batch_size'])
+        self.stderr.write(self.style.SUCCESS(f'Экспортировано записей: {count}'))
+
+    def _write(self, output, batch_size):
+        count = 0
+        for line in iter_export(chunk_size=batch_size):
+            output.write(line)
+            count += 1
+        return count
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.transfer import DEFAULT_BATCH_SIZE, import_lines
+
+
+class Command(BaseCommand):
+    help = 'Импорт категорий, разделов и постов из JSON Lines (создаёт или обновляет)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл JSONL')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        with open(options['input'], encoding='utf-8') as lines:
+            try:
+                stats = import_lines(lines, batch_size=options['batch_size'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: {stats["created"]}, обновлено: {stats["updated"]}'
+        ))
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.models import PostRevision
+from blog.revisions import prune_revisions
+
+
+class Command(BaseCommand):
+    help = 'Удаляет старые ревизии постов, оставляя последние N'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=getattr(settings, 'POST_REVISION_KEEP', 50))
+
+    def handle(self, *args, **options):
+        post_ids = PostRevision.objects.values_list('post_id', flat=True).distinct()
+        deleted = sum(prune_revisions(post_id, options['keep']) for post_id in post_ids.iterator())
+        self.stdout.write(self.style.SUCCESS(f'Удалено ревизий: {deleted}'))
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.fields import convert_column
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Приводит колонку Post.content к POST_CONTENT_COMPRESSION и перезаписывает записи в этом формате'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        method = getattr(settings, 'POST_CONTENT_COMPRESSION', None) or 'без сжатия'
+
+        # Смена типа колонки (TEXT ↔ BLOB) сама перезаписывает все записи
+        if convert_column(Post, 'content', batch_size=batch_size):
+            total = Post.objects.count()
+            self.stdout.write(self.style.SUCCESS(f'Колонка content переведена, перезаписано постов: {total} ({method})'))
+            return
+
+        batch = []
+        total = 0
+        for post in Post.objects.only('id', 'content').iterator(chunk_size=batch_size):
+            batch.append(post)
+            if len(batch) >= batch_size:
+                total += Post.objects.bulk_update(batch, ['content'])
+                batch = []
+        total += Post.objects.bulk_update(batch, ['content'])
+
+        self.stdout.write(self.style.SUCCESS(f'Перезаписано постов: {total} ({method})'))
@@ -0,0 +1,118 @@
+import base64
+import hashlib
+import hmac
+import re
+import time
+from html import escape
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from .instrumentation import count_cache
+from .signing import presign_get
+
+
+# =========================
+# ПОДПИСАННЫЕ ССЫЛКИ НА МЕДИА
+# =========================
+#
+# Режимы MEDIA_DELIVERY:
+#   'proxy'     — как раньше, файлы отдаются Django через /s3-media/
+#   'presigned' — ссылки в статье заменяются на presigned GET URL S3
+#                 (подпись считает blog/signing.py)
+#   'cdn'       — ссылки заменяются на HMAC-подписанные URL CDN
+#
+# Доступ по-прежнему проверяется при открытии статьи: подписанные ссылки
+# получают только те, кто видит статью, и живут MEDIA_URL_EXPIRES секунд.
+# Готовые ссылки кэшируются по категории и выдаются, пока до истечения
+# срока больше MEDIA_URL_REFRESH_MARGIN секунд.
+
+MEDIA_URL_RE = re.compile(r'(?:https?://[^/"\'\s<>]+)?/s3-media/(uploads/[^"\'\s?#<>]+)')
+
+URL_CACHE_PREFIX = 'media-url'
+
+
+def _delivery_mode():
+    return getattr(settings, 'MEDIA_DELIVERY', 'proxy')
+
+
+def _expires_in():
+    return getattr(settings, 'MEDIA_URL_EXPIRES', 60 * 60)
+
+
+def _refresh_margin():
+    return getattr(settings, 'MEDIA_URL_REFRESH_MARGIN', 5 * 60)
+
+
+def check_delivery_settings():
+    """
+    Вызывается при старте (BlogConfig.ready). С пустым MEDIA_CDN_SIGNING_KEY
+    подпись HMAC может посчитать кто угодно — такой режим не запускаем.
+    """
+    mode = _delivery_mode()
+    if mode not in ('proxy', 'presigned', 'cdn'):
+        raise ImproperlyConfigured(f"MEDIA_DELIVERY: неизвестный режим {mode!r}")
+    if mode == 'cdn':
+        if not getattr(settings, 'MEDIA_CDN_SIGNING_KEY', ''):
+            raise ImproperlyConfigured("MEDIA_DELIVERY='cdn' требует MEDIA_CDN_SIGNING_KEY")
+        if not getattr(settings, 'MEDIA_CDN_BASE_URL', ''):
+            raise ImproperlyConfigured("MEDIA_DELIVERY='cdn' требует MEDIA_CDN_BASE_URL")
+
+
+def proxy_media_url(key):
+    """Ссылка /s3-media/ через Django — её редактор вставляет в статью"""
+    return getattr(settings, 'MEDIA_PROXY_URL', '/s3-media/') + key
+
+
+def sign_cdn_url(key, expires_in):
+    """URL CDN вида <base>/<key>?expires=<ts>&signature=<hmac-sha256>"""
+    signing_key = settings.MEDIA_CDN_SIGNING_KEY
+    if not signing_key:
+        raise ImproperlyConfigured('MEDIA_CDN_SIGNING_KEY не задан')
+    expires = int(time.time()) + expires_in
+    path = '/' + quote(key)
+    message = f'{path}{expires}'.encode()
+    digest = hmac.new(signing_key.encode(), message, hashlib.sha256).digest()
+    signature = base64.urlsafe_b64encode(digest).decode().rstrip('=')
+    return f'{settings.MEDIA_CDN_BASE_URL.rstrip("/")}{path}?expires={expires}&signature={signature}'
+
+
+def _signer():
+    if _delivery_mode() == 'cdn':
+        return sign_cdn_url
+    return presign_get
+
+
+def signed_media_urls(keys, scope):
+    """Возвращает {key: signed_url}, подписывая только отсутствующие в кэше"""
+    scope = scope or '*'
+    cache_keys = {f'{URL_CACHE_PREFIX}:{scope}:{key}': key for key in keys}
+    cached = cache.get_many(list(cache_keys))
+
+    urls = {cache_keys[cache_key]: url for cache_key, url in cached.items()}
+    missing = [cache_key for cache_key in cache_keys if cache_key not in cached]
+    count_cache(hits=len(cached), misses=len(missing))
+
+    if missing:
+        sign = _signer()
+        expires_in = _expires_in()
+        fresh = {cache_key: sign(cache_keys[cache_key], expires_in) for cache_key in missing}
+        cache.set_many(fresh, max(expires_in - _refresh_margin(), 1))
+        urls.update({cache_keys[cache_key]: url for cache_key, url in fresh.items()})
+
+    return urls
+
+
+def sign_media_urls(html, scope):
+    """Заменяет ссылки /s3-media/... в HTML на подписанные прямые URL"""
+    if _delivery_mode() == 'proxy' or not html:
+        return html
+
+    keys = {unquote(key) for key in MEDIA_URL_RE.findall(html)}
+    if not keys:
+        return html
+
+    urls = signed_media_urls(keys, scope)
+    return MEDIA_URL_RE.sub(lambda match: escape(urls[unquote(match.group(1))]), html)
@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import got_request_exception
+from django.db import DatabaseError
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+)
+from prometheus_client import multiprocess
+
+
+# =========================
+# METRICS
+# =========================
+#
+# При нескольких воркерах gunicorn задайте PROMETHEUS_MULTIPROC_DIR:
+# prometheus_client пишет значения в mmap-файлы этого каталога,
+# а /metrics собирает их со всех процессов (см. gunicorn.conf.py).
+
+REQUEST_LATENCY = Histogram(
+    'blog_request_duration_seconds',
+    'Время обработки запроса по имени view',
+    ['view'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+MEDIA_BYTES = Counter(
+    'blog_media_streamed_bytes_total',
+    'Байты, отданные прокси /s3-media/',
+)
+
+MEDIA_ACTIVE_STREAMS = Gauge(
+    'blog_media_active_streams',
+    'Открытые потоки /s3-media/',
+    multiprocess_mode='livesum',
+)
+
+UPLOAD_PRESIGNS = Counter(
+    'blog_upload_presign_total',
+    'Выданные presigned URL для загрузки',
+    ['kind'],
+)
+
+RATE_LIMITED = Counter(
+    'blog_rate_limited_total',
+    'Запросы, отклонённые с 429',
+    ['scope', 'reason'],
+)
+
+DB_ERRORS = Counter(
+    'blog_db_errors_total',
+    'Необработанные ошибки БД',
+)
+
+S3_ERRORS = Counter(
+    'blog_s3_errors_total',
+    'Ошибки вызовов S3',
+    ['operation'],
+)
+
+
+def _s3_after_call(http_response=None, model=None, **kwargs):
+    if http_response is not None and http_response.status_code >= 500:
+        S3_ERRORS.labels(model.name if model else 'unknown').inc()
+
+
+def _s3_after_call_error(model=None, **kwargs):
+    S3_ERRORS.labels(model.name if model else 'unknown').inc()
+
+
+def register_s3_metrics(client):
+    """Считает 5xx и сетевые ошибки S3 через события botocore"""
+    client.meta.events.register('after-call.s3', _s3_after_call)
+    client.meta.events.register('after-call-error.s3', _s3_after_call_error)
+
+
+def _count_db_error(sender, request=None, **kwargs):
+    exc = sys.exc_info()[1]
+    if isinstance(exc, DatabaseError):
+        DB_ERRORS.inc()
+
+
+got_request_exception.connect(_count_db_error, dispatch_uid='blog.metrics.db_errors')
+
+
+def stream_with_metrics(chunks):
+    """Оборачивает генератор ответа: активные потоки и отданные байты"""
+    MEDIA_ACTIVE_STREAMS.inc()
+    sent = 0
+    try:
+        for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        MEDIA_ACTIVE_STREAMS.dec()
+        MEDIA_BYTES.inc(sent)
+
+
+# =========================
+# MIDDLEWARE
+# =========================
+
+class MetricsMiddleware:
+    """Гистограмма времени запросов по имени view (url_name)"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else 'other'
+        REQUEST_LATENCY.labels(view).observe(time.perf_counter() - start)
+        return response
+
+
+# =========================
+# ENDPOINT
+# =========================
+
+def metrics_view(request):
+    """
+    Метрики в формате Prometheus.
+    Доступ: заголовок Authorization: Bearer <METRICS_TOKEN> или сотрудник (is_staff).
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    auth = request.META.get('HTTP_AUTHORIZATION', '')
+    has_token = token and constant_time_compare(auth, f'Bearer {token}')
+    if not has_token and not request.user.is_staff:
+        return HttpResponseForbidden('Forbidden')
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-19 12:02
+
+import hashlib
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_initial_revisions(apps, schema_editor):
+    """Хэш контента и первая ревизия-снимок для уже существующих постов"""
+    Post = apps.get_model('blog', 'Post')
+    PostRevision = apps.get_model('blog', 'PostRevision')
+
+    for post in Post.objects.only('id', 'content').iterator(chunk_size=200):
+        digest = hashlib.sha256(post.content.encode('utf-8')).hexdigest()
+        Post.objects.filter(pk=post.pk).update(content_hash=digest)
+        PostRevision.objects.create(
+            post_id=post.pk,
+            number=1,
+            content_hash=digest,
+            is_snapshot=True,
+            data=zlib.compress(post.content.encode('utf-8'), 6),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_post_title_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='PostRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='Номер')),
+                ('content_hash', models.CharField(max_length=64, verbose_name='Хэш контента')),
+                ('is_snapshot', models.BooleanField(default=False, verbose_name='Полный снимок')),
+                ('data', models.BinaryField(verbose_name='Данные')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='blog.post', verbose_name='Запись')),
+            ],
+            options={
+                'verbose_name': 'Ревизия',
+                'verbose_name_plural': 'Ревизии',
+                'ordering': ('post', '-number'),
+                'unique_together': {('post', 'number')},
+            },
+        ),
+        migrations.RunPython(create_initial_revisions, migrations.RunPython.noop),
+    ]
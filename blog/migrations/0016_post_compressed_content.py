@@ -0,0 +1,72 @@
+# Generated by Django 6.0 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+import blog.fields
+
+MEDIA_KEY_RE = r'/s3-media/(uploads/[^"\'\s?#<>]+)'
+
+
+def copy_content(apps, schema_editor):
+    """Переносим текст в сжатую колонку и заполняем media_keys"""
+    import re
+    from urllib.parse import unquote
+
+    Post = apps.get_model('blog', 'Post')
+    batch = []
+    for post in Post.objects.only('id', 'content').iterator(chunk_size=200):
+        keys = sorted({unquote(key) for key in re.findall(MEDIA_KEY_RE, post.content)})
+        post.content_compressed = post.content
+        post.media_keys = '\n' + '\n'.join(keys) + '\n' if keys else ''
+        batch.append(post)
+        if len(batch) >= 200:
+            Post.objects.bulk_update(batch, ['content_compressed', 'media_keys'])
+            batch = []
+    Post.objects.bulk_update(batch, ['content_compressed', 'media_keys'])
+
+
+def copy_content_back(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    for post in Post.objects.only('id', 'content_compressed').iterator(chunk_size=200):
+        Post.objects.filter(pk=post.pk).update(content=post.content_compressed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_post_revisions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='media_keys',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='content_compressed',
+            field=blog.fields.CompressedTextField(null=True, verbose_name='Контент'),
+        ),
+        # Временно nullable, чтобы откат миграции мог вернуть колонку до копирования данных
+        migrations.AlterField(
+            model_name='post',
+            name='content',
+            field=models.TextField(null=True, verbose_name='Контент'),
+        ),
+        migrations.RunPython(copy_content, copy_content_back),
+        migrations.RemoveField(
+            model_name='post',
+            name='content',
+        ),
+        migrations.RenameField(
+            model_name='post',
+            old_name='content_compressed',
+            new_name='content',
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='content',
+            field=blog.fields.CompressedTextField(verbose_name='Контент'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-19 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_post_compressed_content'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['section', 'id'], name='blog_post_section_id_idx'),
+        ),
+    ]
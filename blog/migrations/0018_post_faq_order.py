@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-19 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0017_post_section_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='faq_order',
+            field=models.PositiveIntegerField(default=0, help_text='FAQ статьи выводятся по возрастанию этого числа', verbose_name='Порядок в FAQ'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['faq_for', 'faq_order', 'id'], name='blog_post_faq_order_idx'),
+        ),
+    ]
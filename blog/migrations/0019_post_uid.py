@@ -0,0 +1,33 @@
+import uuid
+
+from django.db import migrations, models
+
+
+def fill_uids(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    posts = list(Post.objects.only('pk'))
+    for post in posts:
+        post.uid = uuid.uuid4()
+    Post.objects.bulk_update(posts, ['uid'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_post_faq_order'),
+    ]
+
+    operations = [
+        # Уникальный UUID существующим строкам: сначала nullable, потом заполняем
+        migrations.AddField(
+            model_name='post',
+            name='uid',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_uids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='post',
+            name='uid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
@@ -1,6 +1,10 @@
+import uuid
+
 from django.db import models
 from django.urls import reverse
 
+from .fields import CompressedTextField
+
 
 class Category(models.Model):
     """Категории"""
@@ -40,7 +44,18 @@ class Post(models.Model):
     author = models.CharField('Автор', max_length=100)
     date = models.DateField('Дата публикации')
 
-    content = models.TextField('Контент')
+    # TEXT, а при POST_CONTENT_COMPRESSION — сжатый BLOB; в Python — обычная строка
+    content = CompressedTextField('Контент')
+
+    # Постоянный идентификатор для экспорта/импорта: id в другой базе
+    # может принадлежать другому посту
+    uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+
+    # sha256 текущего контента = хэш последней ревизии, ключ кэша рендера
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    # S3-ключи из контента ("\nkey1\nkey2\n") — для поиска без чтения контента
+    media_keys = models.TextField(blank=True, editable=False)
 
     video_url = models.URLField(
         'Видео (Google Drive)',
@@ -67,12 +82,55 @@ class Post(models.Model):
         help_text='Если это FAQ — выбери статью, к которой он относится'
     )
 
+    faq_order = models.PositiveIntegerField(
+        'Порядок в FAQ',
+        default=0,
+        help_text='FAQ статьи выводятся по возрастанию этого числа'
+    )
+
     class Meta:
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
+        indexes = [
+            # Поиск и пагинация автокомплита, сортировка списка в админке
+            models.Index(fields=['title'], name='blog_post_title_idx'),
+            models.Index(fields=['-date'], name='blog_post_date_idx'),
+            # Постраничная подгрузка раздела: WHERE section_id = ? AND id > ? ORDER BY id
+            models.Index(fields=['section', 'id'], name='blog_post_section_id_idx'),
+            # Сайдбар FAQ: WHERE faq_for_id = ? ORDER BY faq_order, id
+            models.Index(fields=['faq_for', 'faq_order', 'id'], name='blog_post_faq_order_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def get_absolute_url(self):
         return reverse('detail', args=[self.id])
+
+
+class PostRevision(models.Model):
+    """
+    Ревизия контента поста.
+    Снимок хранит весь контент, дельта — отличия от предыдущей ревизии
+    (см. blog/revisions.py); оба варианта сжаты zlib.
+    """
+    post = models.ForeignKey(
+        Post,
+        related_name='revisions',
+        on_delete=models.CASCADE,
+        verbose_name='Запись'
+    )
+    number = models.PositiveIntegerField('Номер')
+    content_hash = models.CharField('Хэш контента', max_length=64)
+    is_snapshot = models.BooleanField('Полный снимок', default=False)
+    data = models.BinaryField('Данные')
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Ревизия'
+        verbose_name_plural = 'Ревизии'
+        ordering = ('post', '-number')
+        unique_together = ('post', 'number')
+
+    def __str__(self):
+        return f'{self.post_id} — ревизия {self.number}'
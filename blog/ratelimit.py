@@ -0,0 +1,268 @@
+import ipaddress
+import math
+import time
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+from .metrics import RATE_LIMITED
+
+
+# =========================
+# ОГРАНИЧЕНИЕ ЧАСТОТЫ ЗАПРОСОВ
+# =========================
+#
+# Token bucket в общем кэше: у каждого пользователя и IP свой бюджет
+# на область (RATE_LIMITS[scope] = {'user': (в секунду, запас), 'ip': (...)}).
+# Для /s3-media/ дополнительно ограничено число одновременных потоков
+# пользователя (MEDIA_MAX_STREAMS_PER_USER): слот занимается до начала
+# ответа и освобождается, когда поток закрыт.
+#
+# С Redis все проверки — один Lua-скрипт, то есть один поход в кэш
+# на запрос, атомарно для всех воркеров. С другими бэкендами (locmem
+# в разработке и тестах) то же считается через get_many/set_many без
+# атомарности.
+#
+# Превышение — 429 с Retry-After (секунды до появления токена).
+
+BUCKET_PREFIX = 'ratelimit'
+STREAMS_PREFIX = 'media-streams'
+
+# Слот потока, который не освободили (воркер убит), живёт не дольше этого
+STREAM_SLOT_TIMEOUT = 60 * 60
+
+TAKE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local bucket_count = #KEYS - tonumber(ARGV[1])
+local tokens = {}
+local wait = 0
+
+for i = 1, bucket_count do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', KEYS[i], 't', 'ts')
+    local available = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    available = math.min(burst, available + math.max(now - updated, 0) * rate)
+    tokens[i] = available
+    if available < 1 then
+        wait = math.max(wait, (1 - available) / rate)
+    end
+end
+
+if wait > 0 then
+    return {0, tostring(wait), 'rate'}
+end
+
+if ARGV[1] == '1' then
+    local streams_key = KEYS[#KEYS]
+    local cap = tonumber(ARGV[2 * bucket_count + 2])
+    local streams = redis.call('INCR', streams_key)
+    redis.call('EXPIRE', streams_key, tonumber(ARGV[2 * bucket_count + 3]))
+    if streams > cap then
+        redis.call('DECR', streams_key)
+        return {0, '1', 'streams'}
+    end
+end
+
+for i = 1, bucket_count do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    redis.call('HSET', KEYS[i], 't', tostring(tokens[i] - 1), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[i], math.ceil(burst / rate) + 1)
+end
+return {1, '0', ''}
+"""
+
+
+def _enabled():
+    return getattr(settings, 'RATE_LIMIT_ENABLED', True)
+
+
+@lru_cache(maxsize=None)
+def _trusted_networks(proxies):
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def _from_trusted_proxy(remote_addr):
+    networks = _trusted_networks(tuple(getattr(settings, 'RATE_LIMIT_TRUSTED_PROXIES', ())))
+    try:
+        address = ipaddress.ip_address(remote_addr)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def _client_ip(request):
+    """
+    nginx передаёт адрес клиента в X-Real-IP (см. nginx.conf). Заголовку
+    верим, только если запрос пришёл от RATE_LIMIT_TRUSTED_PROXIES —
+    иначе клиент, обратившийся к gunicorn напрямую, менял бы его
+    и получал новый бюджет на каждый запрос.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    if _from_trusted_proxy(remote_addr):
+        header = getattr(settings, 'RATE_LIMIT_IP_HEADER', 'HTTP_X_REAL_IP')
+        return request.META.get(header) or remote_addr
+    return remote_addr
+
+
+def _buckets(request, scope):
+    """[(ключ кэша, в секунду, запас)] для пользователя и IP"""
+    limits = getattr(settings, 'RATE_LIMITS', {}).get(scope, {})
+    identities = {'ip': _client_ip(request)}
+    if request.user.is_authenticated:
+        identities['user'] = request.user.pk
+    return [
+        (f'{BUCKET_PREFIX}:{scope}:{kind}:{identities[kind]}', rate, burst)
+        for kind, (rate, burst) in limits.items()
+        if kind in identities
+    ]
+
+
+def _redis_client():
+    """Клиент redis-py за кэшем Django или None для других бэкендов"""
+    get_client = getattr(getattr(cache, '_cache', None), 'get_client', None)
+    return get_client(write=True) if get_client else None
+
+
+def _take_redis(client, buckets, streams_key, streams_cap):
+    keys = [cache.make_and_validate_key(key) for key, _, _ in buckets]
+    args = ['1' if streams_key else '0']
+    for _, rate, burst in buckets:
+        args += [rate, burst]
+    if streams_key:
+        keys.append(cache.make_and_validate_key(streams_key))
+        args += [streams_cap, STREAM_SLOT_TIMEOUT]
+    allowed, wait, reason = client.register_script(TAKE_SCRIPT)(keys=keys, args=args)
+    reason = reason.decode() if isinstance(reason, bytes) else reason
+    return bool(allowed), float(wait), reason
+
+
+def _take_local(buckets, streams_key, streams_cap):
+    now = time.time()
+    states = cache.get_many([key for key, _, _ in buckets])
+    tokens = {}
+    wait = 0
+    for key, rate, burst in buckets:
+        available, updated = states.get(key, (burst, now))
+        available = min(burst, available + max(now - updated, 0) * rate)
+        tokens[key] = available
+        if available < 1:
+            wait = max(wait, (1 - available) / rate)
+    if wait > 0:
+        return False, wait, 'rate'
+
+    if streams_key:
+        cache.add(streams_key, 0, STREAM_SLOT_TIMEOUT)
+        if cache.incr(streams_key) > streams_cap:
+            cache.decr(streams_key)
+            return False, 1, 'streams'
+
+    for key, rate, burst in buckets:
+        cache.set(key, (tokens[key] - 1, now), math.ceil(burst / rate) + 1)
+    return True, 0, ''
+
+
+def take(request, scope, streams=False):
+    """
+    Списывает токен из бюджетов пользователя и IP.
+    Возвращает (разрешено, через сколько секунд повторить, причина, ключ слота потока).
+    """
+    buckets = _buckets(request, scope)
+    streams_cap = getattr(settings, 'MEDIA_MAX_STREAMS_PER_USER', 0)
+    streams_key = None
+    if streams and streams_cap and request.user.is_authenticated:
+        streams_key = f'{STREAMS_PREFIX}:{request.user.pk}'
+    if not buckets and not streams_key:
+        return True, 0, '', None
+
+    client = _redis_client()
+    if client is not None:
+        allowed, wait, reason = _take_redis(client, buckets, streams_key, streams_cap)
+    else:
+        allowed, wait, reason = _take_local(buckets, streams_key, streams_cap)
+    return allowed, wait, reason, streams_key if allowed else None
+
+
+def release_stream(streams_key):
+    try:
+        cache.decr(streams_key)
+    except ValueError:
+        # Слот истёк по STREAM_SLOT_TIMEOUT — освобождать нечего
+        pass
+
+
+class _StreamSlot:
+    """
+    Итератор тела ответа, освобождающий слот в close().
+    Не генератор: close() ещё не начатого генератора не выполняет finally,
+    а сервер может закрыть ответ, не прочитав ни одного куска.
+    """
+
+    def __init__(self, chunks, streams_key):
+        self.chunks = iter(chunks)
+        self.streams_key = streams_key
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+    def close(self):
+        if self.streams_key:
+            release_stream(self.streams_key)
+            self.streams_key = None
+        close = getattr(self.chunks, 'close', None)
+        if close:
+            close()
+
+
+def too_many_requests(request, retry_after):
+    retry_after = max(1, math.ceil(retry_after))
+    if request.content_type == 'application/json':
+        response = JsonResponse({
+            'success': False,
+            'error': f'Слишком много запросов, повторите через {retry_after} с',
+        }, status=429)
+    else:
+        response = HttpResponse('Too Many Requests', status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(scope, streams=False):
+    """
+    Декоратор view: бюджет RATE_LIMITS[scope], при streams=True —
+    ещё и лимит одновременных потоков пользователя.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _enabled():
+                return view(request, *args, **kwargs)
+
+            allowed, wait, reason, streams_key = take(request, scope, streams)
+            if not allowed:
+                RATE_LIMITED.labels(scope, reason).inc()
+                return too_many_requests(request, wait)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                if streams_key:
+                    release_stream(streams_key)
+                raise
+
+            if streams_key:
+                if response.streaming:
+                    response.streaming_content = _StreamSlot(response.streaming_content, streams_key)
+                else:
+                    release_stream(streams_key)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,123 @@
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .conditional import nav_version
+from .instrumentation import count_cache
+from .lazy_media import rewrite_media
+from .models import Post
+from .revisions import content_hash
+
+
+# =========================
+# РЕНДЕР КОНТЕНТА СТАТЬИ
+# =========================
+#
+# Разбор HTML (якоря заголовков, оглавление, отложенная загрузка медиа —
+# blog/lazy_media.py) зависит только от контента и размеров картинок,
+# поэтому результат кэшируется по хэшу текущей ревизии: после правки
+# у поста новый хэш и, значит, новый ключ — инвалидация не нужна.
+# Размеры картинок приходят из S3 отдельно (ensure_image_sizes): рендер,
+# в котором каких-то размеров ещё не было, живёт только
+# POST_RENDER_INCOMPLETE_TIMEOUT секунд, чтобы width/height появились.
+
+RENDER_CACHE_PREFIX = 'post-render'
+
+
+FAQ_NAV_CACHE_PREFIX = 'faq-nav'
+
+
+def _render_timeout():
+    return getattr(settings, 'POST_RENDER_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def _incomplete_timeout():
+    return getattr(settings, 'POST_RENDER_INCOMPLETE_TIMEOUT', 60)
+
+
+def build_content(content):
+    """Проставляет id заголовкам h2/h3, собирает оглавление и откладывает загрузку медиа"""
+    html, toc, _ = _build_content(content)
+    return html, toc
+
+
+def _build_content(content):
+    """build_content и ключи картинок, для которых не нашлось размеров"""
+    soup = BeautifulSoup(content, 'html.parser')
+    toc = []
+
+    for i, tag in enumerate(soup.find_all(['h2', 'h3'])):
+        anchor = f'heading-{i}'
+        tag['id'] = anchor
+        toc.append({'id': anchor, 'title': tag.get_text()})
+
+    missing_sizes = rewrite_media(soup)
+    return str(soup), toc, missing_sizes
+
+
+def render_post_content(post):
+    """Возвращает (html, toc) для статьи, из кэша по хэшу ревизии"""
+    cache_key = f'{RENDER_CACHE_PREFIX}:{post.content_hash or content_hash(post.content)}'
+    rendered = cache.get(cache_key)
+    if rendered is None:
+        count_cache(misses=1)
+        html, toc, missing_sizes = _build_content(post.content)
+        rendered = (html, toc)
+        cache.set(cache_key, rendered, _incomplete_timeout() if missing_sizes else _render_timeout())
+    else:
+        count_cache(hits=1)
+    return rendered
+
+
+# =========================
+# FAQ СТАТЬИ
+# =========================
+#
+# Сайдбар FAQ зависит не от контента статьи, а от соседних постов,
+# поэтому кэшируется рядом с рендером по версии навигации (blog/conditional.py):
+# любая правка поста сдвигает версию, и список строится заново.
+
+def faq_navigation(parent_id):
+    """[{'id', 'title'}, ...] — FAQ статьи по faq_order, одним запросом без контента"""
+    cache_key = f'{FAQ_NAV_CACHE_PREFIX}:{nav_version()}:{parent_id}'
+    faqs = cache.get(cache_key)
+    if faqs is None:
+        count_cache(misses=1)
+        faqs = list(
+            Post.objects
+            .filter(faq_for_id=parent_id)
+            .order_by('faq_order', 'pk')
+            .values('id', 'title')
+        )
+        cache.set(cache_key, faqs, _render_timeout())
+    else:
+        count_cache(hits=1)
+    return faqs
+
+
+# =========================
+# СТАТЬИ РАЗДЕЛА
+# =========================
+
+def section_page(section_id, after=0):
+    """
+    Порция списка статей раздела {"html": ..., "next": <id> | None}.
+    Версия навигации в ключе: после правок старые порции просто не находятся.
+    """
+    cache_key = f'section-posts:{nav_version()}:{section_id}:{after}'
+    page = cache.get(cache_key)
+    if page is None:
+        page_size = getattr(settings, 'COURSE_PAGE_SIZE', 50)
+        posts = list(
+            Post.objects
+            .filter(section_id=section_id, pk__gt=after)
+            .order_by('pk')
+            .values('id', 'title', 'author')[:page_size + 1]
+        )
+        page = {
+            'html': render_to_string('blog/section_posts.html', {'posts': posts[:page_size]}),
+            'next': posts[page_size - 1]['id'] if len(posts) > page_size else None,
+        }
+        cache.set(cache_key, page, getattr(settings, 'COURSE_FRAGMENT_CACHE_TIMEOUT', 10 * 60))
+    return page
@@ -0,0 +1,185 @@
+"""
+Ревизии контента постов с хранением дельтами.
+
+Контент режется на токены по границам тегов, дельта — список операций
+над токенами предыдущей ревизии:
+    ["c", i1, i2] — скопировать токены base[i1:i2]
+    ["i", "text"] — вставить текст
+Каждая POST_REVISION_SNAPSHOT_EVERY-я ревизия — полный снимок, поэтому
+восстановление любой версии = снимок + не больше N-1 дельт.
+"""
+import difflib
+import hashlib
+import json
+import re
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import PostRevision
+
+TOKEN_RE = re.compile(r'(?<=>)|(?=<)')
+
+
+def content_hash(content):
+    return hashlib.sha256((content or '').encode('utf-8')).hexdigest()
+
+
+def _snapshot_every():
+    return getattr(settings, 'POST_REVISION_SNAPSHOT_EVERY', 10)
+
+
+def tokenize(content):
+    return [token for token in TOKEN_RE.split(content or '') if token]
+
+
+# =========================
+# DELTA
+# =========================
+
+def make_delta(base, target):
+    base_tokens = tokenize(base)
+    target_tokens = tokenize(target)
+    matcher = difflib.SequenceMatcher(None, base_tokens, target_tokens, autojunk=False)
+    ops = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(['c', i1, i2])
+        elif j2 > j1:
+            ops.append(['i', ''.join(target_tokens[j1:j2])])
+    return ops
+
+
+def apply_delta(base, ops):
+    base_tokens = tokenize(base)
+    parts = []
+    for op in ops:
+        if op[0] == 'c':
+            parts.extend(base_tokens[op[1]:op[2]])
+        else:
+            parts.append(op[1])
+    return ''.join(parts)
+
+
+def _pack(payload):
+    return zlib.compress(payload.encode('utf-8'), 6)
+
+
+def _unpack(data):
+    return zlib.decompress(bytes(data)).decode('utf-8')
+
+
+# =========================
+# REVISIONS
+# =========================
+
+def reconstruct(revision):
+    """Восстанавливает контент ревизии: ближайший снимок + дельты после него"""
+    revisions = PostRevision.objects.filter(post_id=revision.post_id)
+    snapshot_number = (
+        revisions
+        .filter(number__lte=revision.number, is_snapshot=True)
+        .order_by('-number')
+        .values_list('number', flat=True)
+        .first()
+    )
+    chain = (
+        revisions
+        .filter(number__gte=snapshot_number, number__lte=revision.number)
+        .order_by('number')
+        .values_list('data', flat=True)
+    )
+    snapshot, *deltas = chain
+    content = _unpack(snapshot)
+    for data in deltas:
+        content = apply_delta(content, json.loads(_unpack(data)))
+    return content
+
+
+def record_revision(post):
+    """Создаёт ревизию, если контент изменился с прошлой. Возвращает ревизию или None"""
+    with transaction.atomic():
+        last = (
+            PostRevision.objects
+            .select_for_update()
+            .filter(post=post)
+            .order_by('-number')
+            .only('number', 'content_hash', 'is_snapshot', 'data')
+            .first()
+        )
+        if last and last.content_hash == post.content_hash:
+            return None
+
+        number = last.number + 1 if last else 1
+        is_snapshot = last is None or (number - 1) % _snapshot_every() == 0
+        if is_snapshot:
+            data = _pack(post.content)
+        else:
+            data = _pack(json.dumps(make_delta(reconstruct(last), post.content), ensure_ascii=False))
+
+        return PostRevision.objects.create(
+            post=post,
+            number=number,
+            content_hash=post.content_hash,
+            is_snapshot=is_snapshot,
+            data=data,
+        )
+
+
+def record_revisions(posts):
+    """
+    record_revision для пачки постов (импорт, bulk-операции без сигналов).
+    Первые ревизии новых постов — снимки одним bulk_create.
+    """
+    with_history = set(
+        PostRevision.objects.filter(post__in=posts).values_list('post_id', flat=True).distinct()
+    )
+    PostRevision.objects.bulk_create([
+        PostRevision(post=post, number=1, content_hash=post.content_hash, is_snapshot=True, data=_pack(post.content))
+        for post in posts
+        if post.pk not in with_history
+    ])
+    for post in posts:
+        if post.pk in with_history:
+            record_revision(post)
+
+
+def revision_diff(revision):
+    """Unified diff ревизии против предыдущей (по тегам)"""
+    previous = (
+        PostRevision.objects
+        .filter(post_id=revision.post_id, number__lt=revision.number)
+        .order_by('-number')
+        .first()
+    )
+    before = tokenize(reconstruct(previous)) if previous else []
+    after = tokenize(reconstruct(revision))
+    return '\n'.join(difflib.unified_diff(
+        before, after,
+        fromfile=f'ревизия {previous.number}' if previous else 'пусто',
+        tofile=f'ревизия {revision.number}',
+        lineterm='',
+    ))
+
+
+def prune_revisions(post_id, keep):
+    """
+    Оставляет последние keep ревизий. Самая старая из оставшихся
+    превращается в снимок, чтобы цепочка дельт не оборвалась.
+    """
+    keep = max(keep, 1)
+    numbers = list(
+        PostRevision.objects.filter(post_id=post_id).order_by('-number').values_list('number', flat=True)
+    )
+    if len(numbers) <= keep:
+        return 0
+
+    oldest_kept = PostRevision.objects.get(post_id=post_id, number=numbers[keep - 1])
+    with transaction.atomic():
+        if not oldest_kept.is_snapshot:
+            oldest_kept.data = _pack(reconstruct(oldest_kept))
+            oldest_kept.is_snapshot = True
+            oldest_kept.save(update_fields=['data', 'is_snapshot'])
+        deleted, _ = PostRevision.objects.filter(post_id=post_id, number__lt=oldest_kept.number).delete()
+    return deleted
@@ -0,0 +1,37 @@
+from functools import lru_cache
+
+from django.conf import settings
+
+from .instrumentation import register_s3_hooks
+from .metrics import register_s3_metrics
+
+
+# =========================
+# S3 CLIENT
+# =========================
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    """
+    Общий S3 клиент на процесс.
+    boto3 клиенты потокобезопасны, а создание нового на каждый запрос
+    стоит загрузки моделей botocore и нового пула соединений.
+    """
+    import boto3
+    from botocore.config import Config
+
+    client = boto3.client(
+        's3',
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+        region_name=settings.AWS_S3_REGION_NAME,
+        config=Config(signature_version='s3v4'),
+    )
+    register_s3_hooks(client)
+    register_s3_metrics(client)
+    return client
+
+
+def get_bucket_name():
+    return settings.AWS_STORAGE_BUCKET_NAME
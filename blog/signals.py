@@ -0,0 +1,131 @@
+from django.contrib.auth import get_user_model, user_logged_out
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .access import (
+    invalidate_media_index, media_keys_column, parse_media_keys_column, refresh_media_keys,
+)
+from .auth import forget_users
+from .conditional import bump_nav_version
+from .lazy_media import ensure_image_sizes
+from .models import Category, Post, Section
+from .revisions import content_hash, record_revision
+
+
+# =========================
+# РЕВИЗИИ
+# =========================
+
+@receiver(pre_save, sender=Post)
+def update_content_hash(sender, instance, **kwargs):
+    instance.content_hash = content_hash(instance.content)
+
+
+@receiver(post_save, sender=Post)
+def save_revision(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_revision(instance)
+
+
+# =========================
+# ИНДЕКС ДОСТУПА К МЕДИА
+# =========================
+
+@receiver(pre_save, sender=Post)
+def remember_old_media_keys(sender, instance, raw=False, **kwargs):
+    """Запоминает ключи файлов из старой версии контента и обновляет media_keys"""
+    instance._old_media_keys = set()
+    if not raw and instance.pk:
+        old_keys = Post.objects.filter(pk=instance.pk).values_list('media_keys', flat=True).first()
+        instance._old_media_keys = parse_media_keys_column(old_keys)
+    instance.media_keys = media_keys_column(instance.content)
+
+
+@receiver(post_save, sender=Post)
+def refresh_post_media_keys(sender, instance, raw=False, **kwargs):
+    """Обновляет индекс для файлов поста и его FAQ (их категория берётся от родителя)"""
+    if raw:
+        return
+    keys = parse_media_keys_column(instance.media_keys) | getattr(instance, '_old_media_keys', set())
+    for faq_keys in instance.faqs.values_list('media_keys', flat=True):
+        keys |= parse_media_keys_column(faq_keys)
+    refresh_media_keys(keys)
+
+
+@receiver(post_save, sender=Post)
+def read_image_sizes(sender, instance, raw=False, **kwargs):
+    """Размеры новых картинок для width/height при рендере (blog/lazy_media.py)"""
+    if raw:
+        return
+    new_keys = parse_media_keys_column(instance.media_keys) - getattr(instance, '_old_media_keys', set())
+    ensure_image_sizes(new_keys)
+
+
+@receiver(post_delete, sender=Post)
+def forget_post_media_keys(sender, instance, **kwargs):
+    refresh_media_keys(parse_media_keys_column(instance.media_keys))
+
+
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Section)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reset_media_index(sender, **kwargs):
+    """Перенос разделов или смена slug'а категории меняет доступ ко многим файлам"""
+    invalidate_media_index()
+
+
+# =========================
+# ВЕРСИЯ НАВИГАЦИИ
+# =========================
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Section)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reset_nav_version(sender, raw=False, **kwargs):
+    """Любая правка меняет дерево или сайдбар FAQ — ETag страниц блога устаревают"""
+    if not raw:
+        bump_nav_version()
+
+
+# =========================
+# СНИМОК ПОЛЬЗОВАТЕЛЯ
+# =========================
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_saved_user(sender, instance, **kwargs):
+    forget_users([instance.pk])
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, user=None, **kwargs):
+    if user is not None:
+        forget_users([user.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def forget_regrouped_users(sender, instance, action, reverse, pk_set, **kwargs):
+    """Состав групп поменялся — с любой стороны связи"""
+    if action == 'pre_clear' and reverse:
+        # После очистки группы уже не узнать, кто в ней был
+        forget_users(instance.user_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            forget_users([instance.pk])
+        elif pk_set:
+            forget_users(pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def forget_group_users(sender, instance, **kwargs):
+    """Переименование или удаление группы меняет снимки всех её участников"""
+    forget_users(instance.user_set.values_list('pk', flat=True))
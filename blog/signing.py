@@ -0,0 +1,140 @@
+import base64
+import hashlib
+import hmac
+import json
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+
+from .s3 import get_bucket_name
+
+
+# =========================
+# ПОДПИСЬ S3 (SigV4)
+# =========================
+#
+# Presigned GET и presigned POST считаются здесь напрямую, без
+# generate_presigned_url / generate_presigned_post: botocore на каждую подпись
+# собирает AWSRequest, прогоняет цепочку событий и заново выводит ключ
+# подписи (четыре HMAC). Производный ключ зависит только от секрета, даты
+# и региона, поэтому кэшируется и пересчитывается раз в сутки.
+#
+# Адреса сразу собираются на нужном хосте, без замены подстрок:
+#   S3_UPLOAD_PROXY_URL      — куда браузер шлёт POST (nginx /s3-upload/).
+#                              Политика POST хост не подписывает.
+#   MEDIA_PRESIGNED_BASE_URL — база presigned GET (пусто — прямой адрес S3).
+#                              Подписываются хост и путь S3, поэтому прокси
+#                              должен отдавать <база><ключ> с <endpoint>/<бакет>/<ключ>
+#                              и Host S3, как /s3-upload/ в nginx.conf.
+
+ALGORITHM = 'AWS4-HMAC-SHA256'
+SERVICE = 's3'
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+
+
+def _hmac(key, message):
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+@lru_cache(maxsize=16)
+def signing_key(secret_key, datestamp, region, service=SERVICE):
+    """Производный ключ SigV4: секрет → дата → регион → сервис → aws4_request"""
+    key = _hmac(f'AWS4{secret_key}'.encode('utf-8'), datestamp)
+    key = _hmac(key, region)
+    key = _hmac(key, service)
+    return _hmac(key, 'aws4_request')
+
+
+def _credentials(now):
+    """(X-Amz-Date, credential, scope, ключ подписи) на момент now"""
+    datestamp = now.strftime('%Y%m%d')
+    region = settings.AWS_S3_REGION_NAME
+    scope = f'{datestamp}/{region}/{SERVICE}/aws4_request'
+    key = signing_key(settings.AWS_SECRET_ACCESS_KEY, datestamp, region)
+    return now.strftime('%Y%m%dT%H%M%SZ'), f'{settings.AWS_ACCESS_KEY_ID}/{scope}', scope, key
+
+
+def _encode(value):
+    return quote(value, safe='-_.~')
+
+
+def _s3_base_url():
+    return f'{settings.AWS_S3_ENDPOINT_URL.rstrip("/")}/{get_bucket_name()}/'
+
+
+def upload_url():
+    """Адрес формы presigned POST: прокси загрузок или сам бакет"""
+    return getattr(settings, 'S3_UPLOAD_PROXY_URL', '') or _s3_base_url()
+
+
+# =========================
+# PRESIGNED GET
+# =========================
+
+def presign_get(key, expires_in, now=None):
+    """Presigned GET URL объекта (path-style, как у boto3 с endpoint_url)"""
+    now = now or datetime.now(timezone.utc)
+    amz_date, credential, scope, key_bytes = _credentials(now)
+
+    host = urlsplit(settings.AWS_S3_ENDPOINT_URL).netloc
+    quoted_key = quote(key, safe='/-_.~')
+    path = f'/{get_bucket_name()}/{quoted_key}'
+    query = '&'.join(f'{name}={_encode(value)}' for name, value in (
+        ('X-Amz-Algorithm', ALGORITHM),
+        ('X-Amz-Credential', credential),
+        ('X-Amz-Date', amz_date),
+        ('X-Amz-Expires', str(expires_in)),
+        ('X-Amz-SignedHeaders', 'host'),
+    ))
+
+    canonical_request = '\n'.join(('GET', path, query, f'host:{host}', '', 'host', UNSIGNED_PAYLOAD))
+    string_to_sign = '\n'.join((
+        ALGORITHM, amz_date, scope, hashlib.sha256(canonical_request.encode('utf-8')).hexdigest(),
+    ))
+    signature = hmac.new(key_bytes, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    base = getattr(settings, 'MEDIA_PRESIGNED_BASE_URL', '') or _s3_base_url()
+    return f'{base}{quoted_key}?{query}&X-Amz-Signature={signature}'
+
+
+# =========================
+# PRESIGNED POST
+# =========================
+
+def presign_post(key, fields, conditions, expires_in, now=None):
+    """
+    Форма загрузки {'url': ..., 'fields': {...}} — то же, что
+    generate_presigned_post, но с адресом upload_url().
+    """
+    now = now or datetime.now(timezone.utc)
+    amz_date, credential, scope, key_bytes = _credentials(now)
+
+    auth_fields = {
+        'x-amz-algorithm': ALGORITHM,
+        'x-amz-credential': credential,
+        'x-amz-date': amz_date,
+    }
+    policy = {
+        'expiration': (now + timedelta(seconds=expires_in)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'conditions': [
+            *conditions,
+            {'bucket': get_bucket_name()},
+            {'key': key},
+            *({name: value} for name, value in auth_fields.items()),
+        ],
+    }
+    encoded_policy = base64.b64encode(json.dumps(policy).encode('utf-8')).decode('ascii')
+    signature = hmac.new(key_bytes, encoded_policy.encode('ascii'), hashlib.sha256).hexdigest()
+
+    return {
+        'url': upload_url(),
+        'fields': {
+            **fields,
+            'key': key,
+            **auth_fields,
+            'policy': encoded_policy,
+            'x-amz-signature': signature,
+        },
+    }
@@ -1,3 +1,1124 @@
-from django.test import TestCase
+import base64
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import tempfile
+from datetime import date, datetime, timezone
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django import forms
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.exceptions import FieldError, ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from prometheus_client import REGISTRY
+
+from . import access, bench, db_router, fields, health, lazy_media, log, media_urls, ratelimit, revisions, signing
+from .models import Category, Post, PostRevision, Section
+from .rendering import RENDER_CACHE_PREFIX, build_content, render_post_content, section_page
+from .s3 import get_s3_client
+from .transfer import import_lines, iter_export
+from .uploads import DIGEST_CACHE_PREFIX, content_digest, matches_signature
+
+
+class BenchSmokeTests(TestCase):
+    """Бенчмарк должен проходить на маленьком наборе данных"""
+
+    def test_all_scenarios_run(self):
+        with bench.FakeS3Server('bench') as s3, override_settings(
+            AWS_ACCESS_KEY_ID='bench',
+            AWS_SECRET_ACCESS_KEY='bench',
+            AWS_S3_ENDPOINT_URL=s3.endpoint_url,
+            AWS_STORAGE_BUCKET_NAME='bench',
+        ):
+            get_s3_client.cache_clear()
+            try:
+                user = bench.seed(categories=2, sections=1, posts=2, faqs=1, size_kb=4)
+                results = bench.run(user, iterations=2, memory_iterations=0)
+            finally:
+                get_s3_client.cache_clear()
+
+        self.assertEqual(set(results), {'post_list', 'section_page', 'post_detail', 'presign', 'media_range'})
+        self.assertEqual(bench.compare(results, results), [])
+
+
+class PostAdminChangelistTests(TestCase):
+    """Число запросов списка постов в админке не зависит от числа постов"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+
+    def _create_posts(self, count):
+        category = Category.objects.create(name=f'Категория {count}', slug=f'category-{count}')
+        for i in range(count):
+            section = Section.objects.create(name=f'Раздел {i}', slug=f'section-{i}', category=category)
+            article = Post.objects.create(
+                title=f'Статья {count}-{i}', author='author', date=date.today(),
+                section=section, content='<p>' + 'x' * 1000 + '</p>',
+            )
+            Post.objects.create(
+                title=f'FAQ {count}-{i}', author='author', date=date.today(),
+                faq_for=article, content='<p>faq</p>',
+            )
+
+    def _changelist_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/admin/blog/post/')
+        self.assertEqual(response.status_code, 200)
+        return captured
+
+    def test_query_count_is_constant(self):
+        self._create_posts(2)
+        # Первый запрос кладёт в кэш сессию и снимок пользователя
+        self._changelist_queries()
+        small = len(self._changelist_queries())
+
+        self._create_posts(8)
+        self.assertEqual(len(self._changelist_queries()), small)
+
+    def test_content_is_not_loaded(self):
+        self._create_posts(2)
+        queries = self._changelist_queries()
+        post_selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT "blog_post"."id", "blog_post"."title"')]
+        self.assertTrue(post_selects)
+        for sql in post_selects:
+            self.assertNotIn('"blog_post"."content"', sql)
+
+
+class ConditionalGetTests(TestCase):
+    """Страницы блога отдают ETag и 304, пока статья и навигация не менялись"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        category = Category.objects.create(name='Farm', slug='farm')
+        section = Section.objects.create(name='Раздел', slug='section', category=category)
+        self.post = Post.objects.create(
+            title='Статья', author='author', date=date.today(),
+            section=section, content='<h2>Шаг</h2><p>текст</p>',
+        )
+
+    def _revalidate(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_detail_not_modified(self):
+        url = f'/blog/{self.post.pk}/'
+        with CaptureQueriesContext(connection) as captured:
+            response = self._revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.content)
+        self.assertNotIn('"blog_post"."content"', captured[-1]['sql'])
+
+    def test_list_not_modified(self):
+        self.assertEqual(self._revalidate('/blog/').status_code, 304)
+
+    def test_edit_changes_etag(self):
+        url = f'/blog/{self.post.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.post.title = 'Новое название'
+        self.post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class MediaAccessTests(TestCase):
+    """Файл из /s3-media/ доступен, только если он есть в статье категории пользователя или без категории"""
+
+    FARM_KEY = 'uploads/videos/farm.mp4'
+    FREE_KEY = 'uploads/videos/free.mp4'
+
+    def setUp(self):
+        cache.clear()
+        self.farm = Category.objects.create(name='Farm', slug='farm')
+        self.section = Section.objects.create(name='Раздел', slug='section', category=self.farm)
+        self.farm_post = Post.objects.create(
+            title='Ферма', author='author', date=date.today(), section=self.section,
+            content=f'<video src="/s3-media/{self.FARM_KEY}"></video>',
+        )
+        self.free_post = Post.objects.create(
+            title='Для всех', author='author', date=date.today(),
+            content=f'<video src="/s3-media/{self.FREE_KEY}"></video>',
+        )
+        self.buyer = User.objects.create_user('buyer', password='buyer')
+        self.buyer.groups.add(Group.objects.create(name='buyer'))
+        self.farmer = User.objects.create_user('farmer', password='farmer')
+        self.farmer.groups.add(Group.objects.create(name='farm'))
+
+    def test_other_group_gets_403(self):
+        self.client.force_login(self.buyer)
+        response = self.client.get(f'/s3-media/{self.FARM_KEY}')
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(access.user_can_access_media(self.farmer, self.FARM_KEY))
+
+    def test_uncategorized_key_allowed(self):
+        self.assertTrue(access.user_can_access_media(self.buyer, self.FREE_KEY))
+        self.assertTrue(access.user_can_access_media(self.farmer, self.FREE_KEY))
+        # Файла нет ни в одной статье — не отдаём никому, кроме сотрудников
+        self.assertFalse(access.user_can_access_media(self.farmer, 'uploads/videos/unknown.mp4'))
+
+    def test_index_follows_post_save_and_delete(self):
+        self.assertFalse(access.user_can_access_media(self.buyer, self.FARM_KEY))
+
+        # Тот же файл вставили в статью без категории — запись индекса обновилась без сброса кэша
+        self.free_post.content += f'<video src="/s3-media/{self.FARM_KEY}"></video>'
+        self.free_post.save()
+        self.assertTrue(access.user_can_access_media(self.buyer, self.FARM_KEY))
+
+        self.free_post.delete()
+        self.assertFalse(access.user_can_access_media(self.buyer, self.FARM_KEY))
+
+        # Файл убрали из статьи фермы — он больше нигде не встречается
+        self.farm_post.content = '<p>без видео</p>'
+        self.farm_post.save()
+        self.assertFalse(access.user_can_access_media(self.farmer, self.FARM_KEY))
+
+    def test_section_move_bumps_generation(self):
+        buyer_category = Category.objects.create(name='Buyer', slug='buyer')
+        self.assertTrue(access.user_can_access_media(self.farmer, self.FARM_KEY))
+        generation = access._generation()
+
+        self.section.category = buyer_category
+        self.section.save()
+
+        self.assertEqual(access._generation(), generation + 1)
+        self.assertFalse(access.user_can_access_media(self.farmer, self.FARM_KEY))
+        self.assertTrue(access.user_can_access_media(self.buyer, self.FARM_KEY))
+
+
+@override_settings(
+    MEDIA_DELIVERY='cdn',
+    MEDIA_CDN_BASE_URL='https://cdn.example.com/',
+    MEDIA_CDN_SIGNING_KEY='cdn-secret',
+    MEDIA_URL_EXPIRES=600,
+)
+class CdnSignedUrlTests(TestCase):
+    """Ссылки CDN: <base>/<key>?expires=&signature=HMAC-SHA256(path + expires)"""
+
+    def test_url_format_and_signature(self):
+        with mock.patch('blog.media_urls.time.time', return_value=1_700_000_000):
+            url = media_urls.sign_cdn_url('uploads/images/кот 1.png', 600)
+
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        self.assertEqual(f'{parts.scheme}://{parts.netloc}', 'https://cdn.example.com')
+        self.assertEqual(parts.path, '/uploads/images/%D0%BA%D0%BE%D1%82%201.png')
+        self.assertEqual(query['expires'], ['1700000600'])
+
+        expected = hmac.new(b'cdn-secret', f'{parts.path}1700000600'.encode(), hashlib.sha256).digest()
+        self.assertEqual(query['signature'], [base64.urlsafe_b64encode(expected).decode().rstrip('=')])
+
+    def test_article_html_gets_signed_urls(self):
+        cache.clear()
+        html = media_urls.sign_media_urls('<img src="/s3-media/uploads/images/a.png">', 'farm')
+        self.assertIn('https://cdn.example.com/uploads/images/a.png?expires=', html)
+
+    def test_missing_signing_key_is_rejected(self):
+        with self.settings(MEDIA_CDN_SIGNING_KEY=''):
+            with self.assertRaises(ImproperlyConfigured):
+                media_urls.check_delivery_settings()
+            with self.assertRaises(ImproperlyConfigured):
+                media_urls.sign_cdn_url('uploads/images/a.png', 600)
+        media_urls.check_delivery_settings()
+
+
+class TransferTests(TestCase):
+    """Экспорт → импорт JSONL восстанавливает гайды; ошибка в файле не оставляет половины импорта"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Farm', slug='farm')
+        section = Section.objects.create(name='Раздел', slug='section', category=category)
+        self.article = Post.objects.create(
+            title='Статья', author='author', date=date(2026, 1, 1), section=section,
+            content='<p>текст</p><video src="/s3-media/uploads/videos/a.mp4"></video>',
+        )
+        self.faqs = [
+            Post.objects.create(
+                title=f'Вопрос {i}', author='author', date=date(2026, 1, 2),
+                content=f'<p>ответ {i}</p>', faq_for=self.article, faq_order=i,
+            )
+            for i in (2, 1)
+        ]
+
+    def _snapshot(self):
+        return list(Post.objects.order_by('uid').values_list(
+            'uid', 'title', 'date', 'content', 'media_keys', 'section__category__slug', 'section__slug',
+            'faq_for__uid', 'faq_order',
+        ))
+
+    def test_roundtrip(self):
+        before = self._snapshot()
+        lines = list(iter_export())
+        Category.objects.all().delete()
+        self.assertFalse(Post.objects.exists())
+
+        stats = import_lines(lines, batch_size=2)
+        self.assertEqual(stats, {'created': 5, 'updated': 0})
+        self.assertEqual(self._snapshot(), before)
+
+        # Повторный импорт того же файла только обновляет
+        self.assertEqual(import_lines(lines), {'created': 0, 'updated': 5})
+
+    def test_selected_faq_exports_parent(self):
+        lines = list(iter_export(Post.objects.filter(pk=self.faqs[0].pk)))
+        uids = [json.loads(line)['uid'] for line in lines if json.loads(line)['type'] == 'post']
+        self.assertEqual(uids, [str(self.article.uid), str(self.faqs[0].uid)])
+
+        Post.objects.all().delete()
+        import_lines(lines)
+        self.assertEqual(Post.objects.get(uid=self.faqs[0].uid).faq_for.uid, self.article.uid)
+
+    def test_import_keeps_unrelated_posts_with_same_ids(self):
+        lines = list(iter_export())
+        exported = self._snapshot()
+
+        # Другая база: те же id, но другие посты
+        Post.objects.all().delete()
+        others = {
+            post.pk: post.title
+            for post in [
+                Post.objects.create(
+                    pk=pk, title=f'Чужой {pk}', author='other', date=date(2025, 1, 1), content='<p>чужой</p>',
+                )
+                for pk in [self.article.pk] + [faq.pk for faq in self.faqs]
+            ]
+        }
+
+        # Категория и раздел совпадают по slug и обновляются, посты создаются заново
+        self.assertEqual(import_lines(lines), {'created': 3, 'updated': 2})
+        for pk, title in others.items():
+            self.assertEqual(Post.objects.get(pk=pk).title, title)
+        imported = [row for row in self._snapshot() if row[0] in {item[0] for item in exported}]
+        self.assertEqual(imported, exported)
+
+        article = Post.objects.get(uid=self.article.uid)
+        self.assertNotEqual(article.pk, self.article.pk)
+        self.assertEqual(
+            set(Post.objects.filter(faq_for=article).values_list('uid', flat=True)),
+            {faq.uid for faq in self.faqs},
+        )
+
+    def test_broken_reference_rolls_back_everything(self):
+        lines = [
+            json.dumps({
+                'type': 'post', 'uid': '00000000-0000-4000-8000-000000000500', 'title': 'Новая',
+                'author': 'author', 'date': '2026-01-03', 'content': '<p>новая</p>', 'section': None, 'faq_for': None,
+            }),
+            json.dumps({
+                'type': 'post', 'uid': '00000000-0000-4000-8000-000000000501', 'title': 'FAQ',
+                'author': 'author', 'date': '2026-01-03', 'content': '<p>faq</p>', 'section': None,
+                'faq_for': '00000000-0000-4000-8000-000000000999',
+            }),
+        ]
+        before = self._snapshot()
+        with self.assertRaisesMessage(ValueError, 'Строка 2'):
+            import_lines(lines, batch_size=1)
+        self.assertEqual(self._snapshot(), before)
+
+
+@override_settings(POST_REVISION_SNAPSHOT_EVERY=3)
+class RevisionTests(TestCase):
+    """Ревизии: снимок каждые N, между ними дельты; prune оставляет снимок в начале цепочки"""
+
+    def setUp(self):
+        self.versions = [f'<h2>Версия {i}</h2><p>общий текст</p>' + '<p>абзац</p>' * i for i in range(1, 8)]
+        self.post = Post.objects.create(title='Статья', author='author', date=date.today(), content=self.versions[0])
+        for content in self.versions[1:]:
+            self.post.content = content
+            self.post.save()
+
+    def _revisions(self):
+        return list(PostRevision.objects.filter(post=self.post).order_by('number'))
+
+    def test_reconstruct_across_snapshots(self):
+        chain = self._revisions()
+        self.assertEqual([revision.is_snapshot for revision in chain], [True, False, False, True, False, False, True])
+        for revision, content in zip(chain, self.versions):
+            self.assertEqual(revisions.reconstruct(revision), content)
+
+        # Без изменений контента новая ревизия не пишется
+        self.post.save()
+        self.assertEqual(len(self._revisions()), 7)
+
+    def test_prune_keeps_base_snapshot(self):
+        self.assertEqual(revisions.prune_revisions(self.post.pk, keep=2), 5)
+        kept = self._revisions()
+        self.assertEqual([revision.number for revision in kept], [6, 7])
+        self.assertTrue(kept[0].is_snapshot)
+        self.assertEqual(revisions.reconstruct(kept[0]), self.versions[5])
+        self.assertEqual(revisions.reconstruct(kept[1]), self.versions[6])
+        self.assertEqual(revisions.prune_revisions(self.post.pk, keep=2), 0)
+
+    def test_revision_diff(self):
+        first, second = self._revisions()[:2]
+        diff = revisions.revision_diff(second)
+        self.assertIn('--- ревизия 1', diff)
+        self.assertIn('+++ ревизия 2', diff)
+        self.assertIn('-Версия 1', diff)
+        self.assertIn('+Версия 2', diff)
+        self.assertIn('+++ ревизия 1', revisions.revision_diff(first))
+
+    @override_settings(POST_REVISION_SNAPSHOT_EVERY=1)
+    def test_snapshot_every_revision(self):
+        self.post.content = self.versions[0]
+        self.post.save()
+        latest = self._revisions()[-1]
+        self.assertTrue(latest.is_snapshot)
+        self.assertEqual(revisions.reconstruct(latest), self.versions[0])
+
+    def test_import_records_revisions(self):
+        def line(content):
+            return json.dumps({
+                'type': 'post', 'uid': '00000000-0000-4000-8000-000000001000', 'title': 'Импорт', 'author': 'author',
+                'date': '2026-01-01', 'content': content, 'section': None, 'faq_for': None,
+            })
+
+        import_lines([line('<p>первая</p>')])
+        import_lines([line('<p>вторая</p>')])
+        import_lines([line('<p>вторая</p>')])
+
+        chain = list(PostRevision.objects.filter(post__uid='00000000-0000-4000-8000-000000001000').order_by('number'))
+        self.assertEqual([revision.number for revision in chain], [1, 2])
+        self.assertEqual(revisions.reconstruct(chain[0]), '<p>первая</p>')
+        self.assertEqual(revisions.reconstruct(chain[1]), '<p>вторая</p>')
+
+
+class CompressedContentTests(TestCase):
+    """Post.content: без сжатия — обычный текст, со сжатием — байт формата + данные и только isnull"""
+
+    TEXT = '<p>Текст статьи</p>' * 200
+
+    def test_header_roundtrip(self):
+        methods = [(None, fields.FORMAT_RAW), ('zlib', fields.FORMAT_ZLIB)]
+        if fields.zstd is not None:
+            methods.append(('zstd', fields.FORMAT_ZSTD))
+        for method, header in methods:
+            data = fields.compress_text(self.TEXT, method, min_size=1024)
+            self.assertEqual(data[0], header)
+            self.assertEqual(fields.decompress_text(data), self.TEXT)
+
+        # Короче порога — без сжатия при любом методе
+        self.assertEqual(fields.compress_text('коротко', 'zlib', min_size=1024)[0], fields.FORMAT_RAW)
+        with self.assertRaises(ValueError):
+            fields.decompress_text(b'\x09data')
+
+    def test_lookups_follow_compression(self):
+        Post.objects.create(title='Статья', author='author', date=date.today(), content=self.TEXT)
+        self.assertEqual(Post._meta.get_field('content').get_internal_type(), 'TextField')
+        self.assertTrue(Post.objects.filter(content__icontains='статьи').exists())
+
+        with self.settings(POST_CONTENT_COMPRESSION='zlib'):
+            self.assertEqual(Post._meta.get_field('content').get_internal_type(), 'BinaryField')
+            with self.assertRaises(FieldError):
+                Post.objects.filter(content__icontains='статьи')
+            with self.assertRaises(FieldError):
+                Post.objects.filter(content='статьи')
+            self.assertFalse(Post.objects.filter(content__isnull=True).exists())
+
+
+class RecompressContentTests(TransactionTestCase):
+    """recompress_content переводит колонку TEXT ↔ BLOB и пережимает записи"""
+
+    TEXT = CompressedContentTests.TEXT
+
+    def _stored(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT content FROM blog_post WHERE id = %s', [post.pk])
+            return cursor.fetchone()[0]
+
+    def test_switch_column_both_ways(self):
+        post = Post.objects.create(title='Статья', author='author', date=date.today(), content=self.TEXT)
+        self.assertEqual(fields.column_type(Post, 'content'), 'TextField')
+        self.assertEqual(self._stored(post), self.TEXT)
+
+        with self.settings(POST_CONTENT_COMPRESSION='zlib', POST_CONTENT_COMPRESSION_MIN_SIZE=1024):
+            call_command('recompress_content', stdout=io.StringIO())
+            self.assertEqual(fields.column_type(Post, 'content'), 'BinaryField')
+            compressed = bytes(self._stored(post))
+            self.assertEqual(compressed[0], fields.FORMAT_ZLIB)
+            self.assertLess(len(compressed), len(self.TEXT.encode()))
+            self.assertEqual(Post.objects.get(pk=post.pk).content, self.TEXT)
+
+            # Колонка уже BLOB — только перезапись записей
+            self.assertFalse(fields.convert_column(Post, 'content'))
+
+        # Сжатые записи читаются и до обратного перевода
+        self.assertEqual(Post.objects.get(pk=post.pk).content, self.TEXT)
+        call_command('recompress_content', stdout=io.StringIO())
+        self.assertEqual(fields.column_type(Post, 'content'), 'TextField')
+        self.assertEqual(self._stored(post), self.TEXT)
+        self.assertTrue(Post.objects.filter(content__contains='Текст статьи').exists())
+
+
+class CompressedContentMigrationTests(TransactionTestCase):
+    """0016 переносит текст существующих постов в сжатую колонку и заполняет media_keys"""
+
+    migrate_from = [('blog', '0015_post_revisions')]
+    migrate_to = [('blog', '0016_post_compressed_content')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_existing_rows_copied(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        OldPost = executor.loader.project_state(self.migrate_from).apps.get_model('blog', 'Post')
+        content = '<p>Шаг</p><img src="/s3-media/uploads/images/a%20b.png">'
+        pk = OldPost.objects.create(title='Статья', author='author', date=date.today(), content=content).pk
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        NewPost = executor.loader.project_state(self.migrate_to).apps.get_model('blog', 'Post')
+        post = NewPost.objects.get(pk=pk)
+        self.assertEqual(post.content, content)
+        self.assertEqual(post.media_keys, '\nuploads/images/a b.png\n')
+
+
+class InstrumentationOffTests(TestCase):
+    """При PERF_INSTRUMENTATION=False нет ни обёртки шаблонов, ни замеров запроса"""
+
+    def test_disabled_by_default(self):
+        from django.template import engines
+        from .instrumentation import InstrumentedDjangoTemplates, RequestTimings
+
+        self.assertFalse(settings.PERF_INSTRUMENTATION)
+        self.assertNotIsInstance(engines['django'], InstrumentedDjangoTemplates)
+
+        with mock.patch.object(RequestTimings, '__init__', side_effect=AssertionError) as timings:
+            response = self.client.get('/')
+        timings.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+
+class MetricsTests(TestCase):
+    """/metrics только по токену или для сотрудника; счётчики растут по view и по 429"""
+
+    def _sample(self, name, labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_access_control(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'blog_request_duration_seconds', response.content)
+
+        self.client.force_login(User.objects.create_user('viewer', password='viewer'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', password='staff', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_does_not_open_endpoint(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_request_counter_by_view(self):
+        before = self._sample('blog_request_duration_seconds_count', {'view': 'healthz'})
+        self.client.get('/healthz')
+        self.client.get('/healthz')
+        self.assertEqual(self._sample('blog_request_duration_seconds_count', {'view': 'healthz'}), before + 2)
+
+    @override_settings(RATE_LIMITS={'test': {'user': (0.01, 1)}})
+    def test_rate_limited_counter(self):
+        cache.clear()
+        labels = {'scope': 'test', 'reason': 'rate'}
+        before = self._sample('blog_rate_limited_total', labels)
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_user('viewer', password='viewer')
+        view = ratelimit.rate_limit('test')(lambda request: HttpResponse('ok'))
+        view(request)
+        self.assertEqual(view(request).status_code, 429)
+        self.assertEqual(self._sample('blog_rate_limited_total', labels), before + 1)
+
+
+class UploadVerificationTests(TestCase):
+    """Presigned POST несёт лимиты в политике, проверка отбрасывает файлы с чужой сигнатурой"""
+
+    def setUp(self):
+        s3 = self.enterContext(bench.FakeS3Server('bench'))
+        self.enterContext(override_settings(
+            AWS_ACCESS_KEY_ID='bench',
+            AWS_SECRET_ACCESS_KEY='bench',
+            AWS_S3_ENDPOINT_URL=s3.endpoint_url,
+            AWS_STORAGE_BUCKET_NAME='bench',
+        ))
+        get_s3_client.cache_clear()
+        self.addCleanup(get_s3_client.cache_clear)
+        self.client.force_login(User.objects.create_user('editor', password='editor', is_staff=True))
+
+    def _post(self, url, payload):
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def test_signatures(self):
+        self.assertTrue(matches_signature('image/png', b'\x89PNG\r\n\x1a\n' + b'\0' * 8))
+        self.assertTrue(matches_signature('video/mp4', b'\0\0\0\x20ftypisom'))
+        self.assertFalse(matches_signature('image/jpeg', b'\x89PNG\r\n\x1a\n'))
+        self.assertFalse(matches_signature('image/png', b''))
+
+    def test_policy_and_mismatch(self):
+        response = self._post('/get-presigned-url/', {
+            'filename': 'shot.png', 'content_type': 'image/png', 'file_size': 1024,
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['fields']['Content-Type'], 'image/png')
+        self.assertIn('policy', data['fields'])
+
+        # Заглушка S3 отдаёт нули вместо PNG — файл должен быть отклонён
+        response = self._post('/verify-upload/', {'key': data['key']})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+        # Повторная проверка того же ключа невозможна
+        response = self._post('/verify-upload/', {'key': data['key']})
+        self.assertEqual(response.json()['error'], 'Загрузка не найдена')
+
+    def test_known_digest_skips_upload(self):
+        digest = content_digest([b'screenshot'])
+        cache.set(f'{DIGEST_CACHE_PREFIX}:{digest}', 'uploads/images/shot.png')
+        self.addCleanup(cache.delete, f'{DIGEST_CACHE_PREFIX}:{digest}')
+
+        response = self._post('/get-presigned-url/', {
+            'filename': 'copy.png', 'content_type': 'image/png', 'file_size': 10, 'digest': digest,
+        })
+        data = response.json()
+        self.assertTrue(data['exists'])
+        self.assertEqual(data['key'], 'uploads/images/shot.png')
+        self.assertNotIn('upload_url', data)
+
+    def test_uploads_require_staff(self):
+        self.client.force_login(User.objects.create_user('reader', password='reader'))
+        response = self._post('/get-presigned-url/', {
+            'filename': 'shot.png', 'content_type': 'image/png', 'file_size': 1024,
+        })
+        self.assertEqual(response.status_code, 403)
+        response = self._post('/verify-upload/', {'key': 'uploads/images/shot.png'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_content_addressed_key_found_in_s3(self):
+        # Заглушка S3 отдаёт под любым ключом 2 MB нулей
+        digest = content_digest([b'\0' * bench.FakeS3Handler.object_size])
+        self.addCleanup(cache.delete, f'{DIGEST_CACHE_PREFIX}:{digest}')
+        with override_settings(UPLOAD_KEY_SCHEME='content'):
+            response = self._post('/get-presigned-url/', {
+                'filename': 'clip.mp4', 'content_type': 'video/mp4', 'file_size': 5, 'digest': digest,
+            })
+        key = f'uploads/videos/{digest[:2]}/{digest[2:4]}/{digest}.mp4'
+        self.assertTrue(response.json()['exists'])
+        self.assertEqual(response.json()['key'], key)
+        self.assertEqual(cache.get(f'{DIGEST_CACHE_PREFIX}:{digest}'), key)
+
+    def test_content_addressed_key_with_other_content(self):
+        digest = content_digest([b'video'])
+        self.addCleanup(cache.delete, f'{DIGEST_CACHE_PREFIX}:{digest}')
+        with override_settings(UPLOAD_KEY_SCHEME='content'):
+            response = self._post('/get-presigned-url/', {
+                'filename': 'clip.mp4', 'content_type': 'video/mp4', 'file_size': 5, 'digest': digest,
+            })
+        # Под ключом лежит не то, что заявил клиент — дубликатом не считается
+        self.assertNotIn('exists', response.json())
+        self.assertIn('upload_url', response.json())
+        self.assertIsNone(cache.get(f'{DIGEST_CACHE_PREFIX}:{digest}'))
+
+    def _verify_with_digest(self, digest):
+        self.addCleanup(cache.delete, f'{DIGEST_CACHE_PREFIX}:{digest}')
+        response = self._post('/get-presigned-url/', {
+            'filename': 'clip.mp4', 'content_type': 'video/mp4',
+            'file_size': bench.FakeS3Handler.object_size, 'digest': digest,
+        })
+        with mock.patch('blog.uploads.matches_signature', return_value=True):
+            verified = self._post('/verify-upload/', {'key': response.json()['key']})
+        self.assertEqual(verified.status_code, 200)
+        return response.json()['key'], cache.get(f'{DIGEST_CACHE_PREFIX}:{digest}')
+
+    def test_verified_digest_registered(self):
+        key, registered = self._verify_with_digest(content_digest([b'\0' * bench.FakeS3Handler.object_size]))
+        self.assertEqual(registered, key)
+
+    def test_wrong_digest_not_registered(self):
+        _, registered = self._verify_with_digest(content_digest([b'other file']))
+        self.assertIsNone(registered)
+
+    @override_settings(UPLOAD_DIGEST_VERIFY_MAX_SIZE=1024 * 1024)
+    def test_large_upload_skips_dedup(self):
+        # Хэш не пересчитать — даже верный не регистрируется
+        _, registered = self._verify_with_digest(content_digest([b'\0' * bench.FakeS3Handler.object_size]))
+        self.assertIsNone(registered)
+
+        digest = content_digest([b'large'])
+        with override_settings(UPLOAD_KEY_SCHEME='content'):
+            response = self._post('/get-presigned-url/', {
+                'filename': 'clip.mp4', 'content_type': 'video/mp4',
+                'file_size': 2 * 1024 * 1024, 'digest': digest,
+            })
+        self.assertNotIn(digest, response.json()['key'])
+
+
+@override_settings(**bench.SIGNING_SETTINGS, MEDIA_PRESIGNED_BASE_URL='', S3_UPLOAD_PROXY_URL='https://upload.example/s3-upload/')
+class SigningTests(TestCase):
+    """Локальная SigV4 подпись совпадает с botocore"""
+
+    now = datetime(2026, 3, 1, 12, 30, tzinfo=timezone.utc)
+
+    def setUp(self):
+        get_s3_client.cache_clear()
+        self.addCleanup(get_s3_client.cache_clear)
+        self.enterContext(mock.patch('botocore.auth.get_current_datetime', return_value=self.now))
+        self.enterContext(mock.patch('botocore.signers.get_current_datetime', return_value=self.now))
+
+    def test_presigned_get_matches_botocore(self):
+        key = 'uploads/images/Скриншот экрана (1).png'
+        expected = get_s3_client().generate_presigned_url(
+            'get_object', Params={'Bucket': 'bench', 'Key': key}, ExpiresIn=600,
+        )
+        actual = signing.presign_get(key, 600, now=self.now)
+
+        self.assertEqual(urlsplit(actual).path, urlsplit(expected).path)
+        self.assertEqual(parse_qs(urlsplit(actual).query), parse_qs(urlsplit(expected).query))
+
+        with override_settings(MEDIA_PRESIGNED_BASE_URL='https://media.example/'):
+            proxied = signing.presign_get(key, 600, now=self.now)
+        self.assertTrue(proxied.startswith('https://media.example/uploads/images/'))
+        self.assertEqual(urlsplit(proxied).query, urlsplit(actual).query)
+
+    def test_presigned_post_matches_botocore(self):
+        conditions = [['content-length-range', 1, 1024], {'Content-Type': 'image/png'}]
+        expected = get_s3_client().generate_presigned_post(
+            'bench', 'uploads/images/a.png', Fields={'Content-Type': 'image/png'},
+            Conditions=list(conditions), ExpiresIn=600,
+        )
+        actual = signing.presign_post('uploads/images/a.png', {'Content-Type': 'image/png'}, conditions, 600, now=self.now)
+
+        self.assertEqual(actual['url'], 'https://upload.example/s3-upload/')
+        self.assertEqual(actual['fields'], expected['fields'])
+
+
+class EditorBundleTests(TestCase):
+    """Админка подключает собранный бандл редактора через modulepreload"""
+
+    def test_media_uses_bundle_from_manifest(self):
+        from . import assets
+
+        with tempfile.TemporaryDirectory() as static_dir:
+            vendor = os.path.join(static_dir, assets.EDITOR_VENDOR_DIR)
+            os.makedirs(vendor)
+            with open(os.path.join(vendor, 'manifest.json'), 'w') as f:
+                json.dump({'editor-deps.js': 'editor-deps-ABC123.js'}, f)
+
+            assets.editor_bundle.cache_clear()
+            self.addCleanup(assets.editor_bundle.cache_clear)
+            with override_settings(STATIC_DIR=static_dir):
+                media = forms.Media(js=assets.editor_media_js())
+                html = str(media)
+
+        self.assertIn('<link rel="modulepreload" href="/static/editor/vendor/editor-deps-ABC123.js" data-editor-bundle>', html)
+        self.assertLess(html.index('modulepreload'), html.index('editor-init.js'))
+        self.assertNotIn('editor-cdn-fallback', html)
+
+    def test_missing_bundle_without_cdn(self):
+        from . import assets
+
+        with tempfile.TemporaryDirectory() as static_dir:
+            assets.editor_bundle.cache_clear()
+            self.addCleanup(assets.editor_bundle.cache_clear)
+            with override_settings(STATIC_DIR=static_dir):
+                html = str(forms.Media(js=assets.editor_media_js()))
+                self.assertEqual([w.id for w in assets.check_editor_bundle(None)], ['blog.W001'])
+
+                # esm.sh — только явно, для разработки
+                with override_settings(EDITOR_CDN_FALLBACK=True):
+                    dev_html = str(forms.Media(js=assets.editor_media_js()))
+                    self.assertEqual(assets.check_editor_bundle(None), [])
+
+        self.assertNotIn('modulepreload', html)
+        self.assertNotIn('editor-cdn-fallback', html)
+        self.assertIn('<meta name="editor-cdn-fallback" content="1">', dev_html)
+
+
+class LazyMediaTests(TestCase):
+    """Рендер статьи откладывает загрузку медиа"""
+
+    def test_rewrite(self):
+        key = 'uploads/images/shot.png'
+        cache.set(f'{lazy_media.SIZE_CACHE_PREFIX}:{key}', (800, 600))
+        self.addCleanup(cache.delete, f'{lazy_media.SIZE_CACHE_PREFIX}:{key}')
+        png_head = b'\x89PNG\r\n\x1a\n' + b'\0\0\0\rIHDR' + (800).to_bytes(4, 'big') + (600).to_bytes(4, 'big')
+        self.assertEqual(lazy_media.image_size(png_head), (800, 600))
+
+        html, _ = build_content(
+            '<p><img src="/s3-media/uploads/images/first.png"></p>'
+            f'<p><img src="https://traff-lab.ru/s3-media/{key}"></p>'
+            '<video src="/s3-media/uploads/videos/clip.mp4" preload="metadata"></video>'
+            '<div data-youtube-video><iframe src="https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ"></iframe></div>'
+        )
+
+        self.assertNotIn('loading', html.split('</p>')[0])
+        self.assertIn('decoding="async" height="600" loading="lazy"', html)
+        self.assertIn('width="800"', html)
+        self.assertIn('preload="none"', html)
+        self.assertNotIn('<iframe', html)
+        self.assertIn('data-src="https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ"', html)
+
+    @override_settings(POST_RENDER_INCOMPLETE_TIMEOUT=60, POST_RENDER_CACHE_TIMEOUT=86400)
+    def test_render_without_sizes_is_short_lived(self):
+        cache.clear()
+        post = Post(content='<p><img src="/s3-media/uploads/images/late.png"></p>')
+        post.content_hash = 'late'
+
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            html, _ = render_post_content(post)
+        self.assertNotIn('width=', html)
+        self.assertEqual(cache_set.call_args.args[2], 60)
+
+        # Размер узнали (ensure_image_sizes), короткая запись истекла — рендер с width/height на сутки
+        cache.set(f'{lazy_media.SIZE_CACHE_PREFIX}:uploads/images/late.png', (640, 480))
+        cache.delete(f'{RENDER_CACHE_PREFIX}:late')
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            html, _ = render_post_content(post)
+        self.assertIn('width="640"', html)
+        self.assertEqual(cache_set.call_args.args[2], 86400)
+
+
+class CourseListingTests(TestCase):
+    """Список гайдов не грузит статьи, раздел отдаётся порциями по ключу"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('farmer', password='farmer')
+        self.user.groups.add(Group.objects.create(name='farm'))
+        self.client.force_login(self.user)
+        self.section = Section.objects.create(
+            name='Раздел', slug='section', category=Category.objects.create(name='Farm', slug='farm'),
+        )
+        self.buyer_section = Section.objects.create(
+            name='Раздел', slug='section', category=Category.objects.create(name='Buyer', slug='buyer'),
+        )
+        Post.objects.bulk_create([
+            Post(title=f'Статья {i}', author='author', date=date.today(), section=self.section, content='')
+            for i in range(5)
+        ])
+
+    def test_list_has_counts_only(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/blog/')
+        self.assertContains(response, '<span class="section-count">5</span>', html=True)
+        self.assertNotContains(response, 'Статья 0')
+        self.assertFalse([q for q in captured if 'FROM "blog_post"' in q['sql'] and 'COUNT' not in q['sql']])
+
+    @override_settings(COURSE_PAGE_SIZE=2)
+    def test_keyset_pages(self):
+        url = f'/blog/sections/{self.section.pk}/posts/'
+        titles = []
+        after = None
+        for _ in range(3):
+            page = self.client.get(url, {'after': after} if after else {}).json()
+            titles += [line.strip() for line in page['html'].splitlines() if 'Статья' in line]
+            after = page['next']
+        self.assertEqual(titles, [f'Статья {i}' for i in range(5)])
+        self.assertIsNone(after)
+
+    def test_foreign_section_forbidden(self):
+        response = self.client.get(f'/blog/sections/{self.buyer_section.pk}/posts/')
+        self.assertEqual(response.status_code, 403)
+
+
+class FaqSidebarTests(TestCase):
+    """Сайдбар FAQ — один лёгкий запрос, порядок по faq_order, соседи на странице FAQ"""
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        section = Section.objects.create(
+            name='Раздел', slug='section', category=Category.objects.create(name='Farm', slug='farm'),
+        )
+        self.article = Post.objects.create(
+            title='Статья', author='author', date=date.today(), section=section, content='<p>статья</p>',
+        )
+        self.faqs = [
+            Post.objects.create(
+                title=f'Вопрос {order}', author='author', date=date.today(),
+                faq_for=self.article, faq_order=order, content='<p>ответ</p>',
+            )
+            for order in (2, 1)
+        ]
+
+    def test_faq_page_shows_siblings_in_order(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(f'/blog/{self.faqs[0].pk}/')
+        html = response.content.decode().split('id="aside-left"')[1].split('</aside>')[0]
+        self.assertLess(html.index('Вопрос 1'), html.index('Вопрос 2'))
+        self.assertIn(f'href="/blog/{self.article.pk}/"', html)
+
+        faq_queries = [q['sql'] for q in captured if 'WHERE "blog_post"."faq_for_id" =' in q['sql']]
+        self.assertEqual(len(faq_queries), 1)
+        self.assertNotIn('"content"', faq_queries[0])
+
+        # Повторный показ — список FAQ из кэша
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(f'/blog/{self.article.pk}/')
+            self.client.get(f'/blog/{self.faqs[1].pk}/')
+        self.assertEqual(len([q for q in captured if 'WHERE "blog_post"."faq_for_id" =' in q['sql']]), 0)
+
+
+class HealthTests(TestCase):
+    """/readyz проверяет зависимости и прогревает кэши, /healthz — только процесс"""
+
+    def setUp(self):
+        cache.clear()
+        s3 = self.enterContext(bench.FakeS3Server('bench'))
+        self.enterContext(override_settings(
+            AWS_ACCESS_KEY_ID='bench',
+            AWS_SECRET_ACCESS_KEY='bench',
+            AWS_S3_ENDPOINT_URL=s3.endpoint_url,
+            AWS_STORAGE_BUCKET_NAME='bench',
+        ))
+        get_s3_client.cache_clear()
+        self.addCleanup(get_s3_client.cache_clear)
+        health._warmed.clear()
+        self.addCleanup(health._warmed.clear)
+
+    def test_healthz(self):
+        response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_readyz_warms_caches(self):
+        section = Section.objects.create(
+            name='Раздел', slug='section', category=Category.objects.create(name='Farm', slug='farm'),
+        )
+        post = Post.objects.create(title='Статья', author='author', date=date.today(), section=section, content='<h2>A</h2>')
+
+        response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['checks'].values()), {'ok'})
+
+        with self.assertNumQueries(0):
+            section_page(section.pk)
+            render_post_content(post)
+
+    def test_readyz_reports_unavailable_s3(self):
+        with override_settings(AWS_S3_ENDPOINT_URL='http://127.0.0.1:9', HEALTH_CHECK_TIMEOUT=0.5):
+            get_s3_client.cache_clear()
+            response = self.client.get('/readyz')
+        # S3 виден в ответе, но деплой не блокирует
+        self.assertEqual(response.status_code, 200)
+        checks = response.json()['checks']
+        self.assertEqual(checks['database'], 'ok')
+        self.assertNotEqual(checks['s3'], 'ok')
+        self.assertEqual(checks['warm_up'], 'ok')
+
+    def test_readyz_can_require_s3(self):
+        with override_settings(
+            AWS_S3_ENDPOINT_URL='http://127.0.0.1:9', HEALTH_CHECK_TIMEOUT=0.5, READYZ_REQUIRE_S3=True,
+        ):
+            get_s3_client.cache_clear()
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks']['warm_up'], 'pending')
+
+
+@override_settings(
+    RATE_LIMITS={'test': {'user': (0.01, 2), 'ip': (100, 100)}},
+    MEDIA_MAX_STREAMS_PER_USER=1,
+)
+class RateLimitTests(TestCase):
+    """Token bucket отвечает 429 с Retry-After, поток держит слот до закрытия"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user('viewer', password='viewer')
+
+    def _request(self, **extra):
+        request = self.factory.get('/', **extra)
+        request.user = self.user
+        return request
+
+    def test_budget_exhausted(self):
+        view = ratelimit.rate_limit('test')(lambda request: HttpResponse('ok'))
+        self.assertEqual(view(self._request()).status_code, 200)
+        self.assertEqual(view(self._request()).status_code, 200)
+
+        response = view(self._request())
+        self.assertEqual(response.status_code, 429)
+        # Токен копится 100 секунд (0.01 в секунду)
+        self.assertGreater(int(response['Retry-After']), 90)
+
+        # Бюджет у другого пользователя свой
+        other = self._request()
+        other.user = User.objects.create_user('other', password='other')
+        self.assertEqual(view(other).status_code, 200)
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=['172.16.0.0/12'])
+    def test_real_ip_header_only_from_trusted_proxy(self):
+        via_nginx = self.factory.get('/', REMOTE_ADDR='172.18.0.5', HTTP_X_REAL_IP='203.0.113.7')
+        self.assertEqual(ratelimit._client_ip(via_nginx), '203.0.113.7')
+
+        direct = self.factory.get('/', REMOTE_ADDR='198.51.100.2', HTTP_X_REAL_IP='203.0.113.7')
+        self.assertEqual(ratelimit._client_ip(direct), '198.51.100.2')
+
+    def test_stream_slot_released_on_close(self):
+        view = ratelimit.rate_limit('media', streams=True)(
+            lambda request: StreamingHttpResponse(iter([b'chunk']))
+        )
+        first = view(self._request())
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(view(self._request()).status_code, 429)
+
+        first.close()
+        self.assertEqual(view(self._request()).status_code, 200)
+
+
+class AuthSnapshotTests(TestCase):
+    """Авторизованный запрос к статье не читает из БД ни сессию, ни пользователя, ни группы"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('farmer', password='farmer')
+        self.group = Group.objects.create(name='farm')
+        self.user.groups.add(self.group)
+        section = Section.objects.create(
+            name='Раздел', slug='section', category=Category.objects.create(name='Buyer', slug='buyer'),
+        )
+        self.post = Post.objects.create(title='Статья', author='author', date=date.today(), section=section, content='<p>x</p>')
+        self.client.login(username='farmer', password='farmer')
+
+    def _auth_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(f'/blog/{self.post.pk}/')
+        tables = ('"auth_user"', '"auth_group"', '"auth_user_groups"', '"django_session"')
+        return response, [q['sql'] for q in captured if any(table in q['sql'] for table in tables)]
+
+    def test_article_hit_has_no_auth_queries(self):
+        self._auth_queries()
+        response, queries = self._auth_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'blog/forbidden.html')
+        self.assertEqual(queries, [])
+
+    def test_group_change_invalidates_snapshot(self):
+        self._auth_queries()
+        self.group.user_set.remove(self.user)
+
+        response, queries = self._auth_queries()
+        self.assertTemplateNotUsed(response, 'blog/forbidden.html')
+        self.assertNotEqual(queries, [])
+
+    def test_logout_drops_snapshot(self):
+        self._auth_queries()
+        self.client.post('/accounts/logout/')
+        response = self.client.get(f'/blog/{self.post.pk}/')
+        self.assertEqual(response.status_code, 302)
+
+
+class LoggingTests(TestCase):
+    """JSON-логи пишутся из очереди, с request_id; шумные логгеры прореживаются"""
+
+    def test_json_record_with_request_id(self):
+        stream = io.StringIO()
+        handler = log.QueueingStreamHandler(stream=stream)
+        handler.addFilter(log.RequestIdFilter())
+        logger = logging.getLogger('blog.tests.json')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        def view(request):
+            logger.warning('ключ %s', 'uploads/a.png', extra={'kind': 'image'})
+            return HttpResponse()
+
+        response = log.RequestIdMiddleware(view)(RequestFactory().get('/', HTTP_X_REQUEST_ID='abc123'))
+        handler.close()
+
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(response['X-Request-ID'], 'abc123')
+        self.assertEqual(entry['request_id'], 'abc123')
+        self.assertEqual(entry['msg'], 'ключ uploads/a.png')
+        self.assertEqual(entry['kind'], 'image')
+
+    def test_settings_logging_config_applies(self):
+        import logging.config
+
+        root = logging.getLogger()
+        self.addCleanup(logging.config.dictConfig, settings.LOGGING)
+        logging.config.dictConfig(settings.LOGGING)
+        handler = root.handlers[0]
+        self.assertIsInstance(handler, log.QueueingStreamHandler)
+        self.assertTrue(handler._writer._thread.is_alive())
+
+        # Через 'class' dictConfig передаёт очередь первым аргументом
+        logging.config.dictConfig({
+            'version': 1,
+            'disable_existing_loggers': False,
+            'handlers': {'console': {'class': 'blog.log.QueueingStreamHandler', 'json_format': False}},
+            'root': {'handlers': ['console']},
+        })
+        handler = root.handlers[0]
+        self.assertIs(handler._writer.queue, handler.queue)
+        self.assertTrue(handler._writer._thread.is_alive())
+
+    def test_sampling_limits_noisy_logger(self):
+        sampling = log.SamplingFilter({'botocore': (1.0, 3)})
+
+        def record(name, level=logging.INFO):
+            return logging.LogRecord(name, level, __file__, 0, 'msg', (), None)
+
+        passed = [sampling.filter(record('botocore.endpoint')) for _ in range(10)]
+        self.assertEqual(sum(passed), 3)
+        self.assertTrue(sampling.filter(record('botocore.endpoint', logging.ERROR)))
+        self.assertTrue(sampling.filter(record('blog.views')))
+
+
+@override_settings(READ_REPLICA_ALIAS='replica')
+class ReplicaRoutingTests(TestCase):
+    """Чтения блога — из реплики (здесь отдельная SQLite без репликации), после своей правки — из default"""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser('admin', password='admin')
+        category = Category.objects.create(name='Farm', slug='farm')
+        section = Section.objects.create(name='Раздел', slug='section', category=category)
+        self.post = Post.objects.create(title='Статья', author='author', date=date.today(), section=section, content='<p>x</p>')
+        self.client.force_login(self.user)
+
+    def test_blog_reads_from_replica(self):
+        # В реплику статья ещё «не доехала»
+        self.assertEqual(self.client.get(f'/blog/{self.post.pk}/').status_code, 404)
+
+        for obj in (self.post.section.category, self.post.section, self.post):
+            obj.save(using='replica')
+        self.assertEqual(self.client.get(f'/blog/{self.post.pk}/').status_code, 200)
+
+    def test_own_write_pins_to_primary(self):
+        def edit(request):
+            Post.objects.filter(pk=self.post.pk).update(title='Правка')
+            return HttpResponse()
+
+        session = self.client.session
+        request = RequestFactory().post('/')
+        request.session = session
+        db_router.ReplicaPinMiddleware(edit)(request)
+        session.save()
+
+        self.assertGreater(session[db_router.PIN_SESSION_KEY], 0)
+        response = self.client.get(f'/blog/{self.post.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Правка')
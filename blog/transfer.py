@@ -0,0 +1,255 @@
+"""
+Экспорт и импорт гайдов в JSON Lines.
+
+Одна строка — один объект, поле "type" задаёт вид:
+    {"type": "category", "slug": ..., "name": ...}
+    {"type": "section", "category": <slug>, "slug": ..., "name": ...}
+    {"type": "post", "uid": ..., "title": ..., "author": ..., "date": "YYYY-MM-DD",
+     "content": ..., "video_url": ..., "section": [<category slug>, <section slug>] | null,
+     "faq_for": <uid статьи> | null, "faq_order": <порядок среди FAQ статьи>}
+
+Как категории и разделы (по slug), посты сопоставляются по естественному
+ключу — Post.uid, а не по id: в другой базе тот же id может быть у чужого
+поста. Новые посты получают свои id, ссылки FAQ → статья разрешаются
+через uid, повторный импорт обновляет те же записи. В выгрузку выбранных
+FAQ добавляются их статьи — иначе файл не импортировать.
+Экспорт идёт итератором, импорт — пачками bulk_create/bulk_update;
+память не растёт с размером файла. Весь импорт — одна транзакция:
+при ошибке в любой строке (или ссылке FAQ на отсутствующую статью)
+не применяется ничего.
+"""
+import json
+import uuid
+from datetime import date
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+
+from .access import invalidate_media_index, media_keys_column
+from .conditional import bump_nav_version
+from .models import Category, Post, Section
+from .revisions import content_hash, record_revisions
+
+DEFAULT_BATCH_SIZE = 500
+
+POST_FIELDS = (
+    'title', 'author', 'date', 'content', 'content_hash', 'media_keys',
+    'video_url', 'section_id', 'faq_for_id', 'faq_order',
+)
+
+
+# =========================
+# EXPORT
+# =========================
+
+def iter_export(posts=None, chunk_size=DEFAULT_BATCH_SIZE):
+    """
+    Генератор строк JSONL. posts — queryset постов (по умолчанию все);
+    категории и разделы выгружаются только те, что нужны этим постам.
+    Статьи идут раньше FAQ, чтобы при импорте родитель уже существовал.
+    """
+    if posts is None:
+        posts = Post.objects.all()
+    else:
+        posts = Post.objects.filter(Q(pk__in=posts.values('pk')) | Q(pk__in=posts.values('faq_for_id')))
+
+    sections = Section.objects.filter(posts__in=posts).distinct()
+    categories = Category.objects.filter(sections__in=sections).distinct()
+
+    for slug, name in categories.order_by('pk').values_list('slug', 'name').iterator(chunk_size):
+        yield _dump({'type': 'category', 'slug': slug, 'name': name})
+
+    rows = sections.order_by('pk').values_list('category__slug', 'slug', 'name')
+    for category, slug, name in rows.iterator(chunk_size):
+        yield _dump({'type': 'section', 'category': category, 'slug': slug, 'name': name})
+
+    columns = (
+        'uid', 'title', 'author', 'date', 'content', 'video_url',
+        'section__category__slug', 'section__slug', 'faq_for__uid', 'faq_order',
+    )
+    for only_faqs in (False, True):
+        rows = posts.filter(faq_for__isnull=not only_faqs).order_by('pk').values_list(*columns)
+        for uid, title, author, day, content, video_url, category, section, faq_for, faq_order in rows.iterator(chunk_size):
+            yield _dump({
+                'type': 'post',
+                'uid': str(uid),
+                'title': title,
+                'author': author,
+                'date': day.isoformat(),
+                'content': content,
+                'video_url': video_url,
+                'section': [category, section] if section else None,
+                'faq_for': str(faq_for) if faq_for else None,
+                'faq_order': faq_order,
+            })
+
+
+def _dump(obj):
+    return json.dumps(obj, ensure_ascii=False) + '\n'
+
+
+# =========================
+# IMPORT
+# =========================
+
+class Importer:
+    """Принимает записи по одной и пишет их пачками"""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.pending = {'category': [], 'section': [], 'post': []}
+        self.category_ids = {}
+        self.section_ids = {}
+        self.post_ids = {}
+        self.stats = {'created': 0, 'updated': 0}
+
+    def add(self, record):
+        kind = record.get('type')
+        if kind not in self.pending:
+            raise ValueError(f'Неизвестный тип записи: {kind!r}')
+        # Порядок в файле: категории → разделы → посты; смена типа сбрасывает буферы
+        for earlier in self.pending:
+            if earlier == kind:
+                break
+            self._flush(earlier)
+        self.pending[kind].append(record)
+        if len(self.pending[kind]) >= self.batch_size:
+            self._flush(kind)
+
+    def finish(self):
+        for kind in self.pending:
+            self._flush(kind)
+        # Внешние ключи проверяются при COMMIT — проверяем сразу, как loaddata
+        connection.check_constraints(table_names=[model._meta.db_table for model in (Category, Section, Post)])
+        # bulk-операции не шлют сигналы — индекс доступа к медиа строим заново
+        transaction.on_commit(invalidate_media_index)
+        transaction.on_commit(bump_nav_version)
+        return self.stats
+
+    def _flush(self, kind):
+        records = self.pending[kind]
+        if not records:
+            return
+        self.pending[kind] = []
+        getattr(self, f'_write_{kind}')(records)
+
+    def _upsert(self, model, new, old, fields):
+        model.objects.bulk_create(new, batch_size=self.batch_size)
+        model.objects.bulk_update(old, fields, batch_size=self.batch_size)
+        self.stats['created'] += len(new)
+        self.stats['updated'] += len(old)
+
+    def _write_category(self, records):
+        slugs = [record['slug'] for record in records]
+        existing = dict(Category.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+        new, old = [], []
+        for record in records:
+            category = Category(pk=existing.get(record['slug']), slug=record['slug'], name=record['name'])
+            (old if category.pk else new).append(category)
+        self._upsert(Category, new, old, ['name'])
+        self.category_ids.update(Category.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+
+    def _category_id(self, slug):
+        if slug not in self.category_ids:
+            self.category_ids[slug] = Category.objects.values_list('pk', flat=True).get(slug=slug)
+        return self.category_ids[slug]
+
+    def _write_section(self, records):
+        keyed = {(self._category_id(record['category']), record['slug']): record for record in records}
+        lookup = Section.objects.filter(
+            category_id__in={key[0] for key in keyed},
+            slug__in={key[1] for key in keyed},
+        )
+        existing = {(category_id, slug): pk for pk, category_id, slug in lookup.values_list('pk', 'category_id', 'slug')}
+
+        new, old = [], []
+        for key, record in keyed.items():
+            section = Section(pk=existing.get(key), category_id=key[0], slug=key[1], name=record['name'])
+            (old if section.pk else new).append(section)
+        self._upsert(Section, new, old, ['name'])
+
+        self.section_ids.update({
+            (category_slug, slug): pk
+            for pk, category_slug, slug in lookup.values_list('pk', 'category__slug', 'slug')
+        })
+
+    def _section_id(self, natural_key):
+        if not natural_key:
+            return None
+        natural_key = tuple(natural_key)
+        if natural_key not in self.section_ids:
+            category_slug, slug = natural_key
+            self.section_ids[natural_key] = Section.objects.values_list('pk', flat=True).get(
+                category__slug=category_slug, slug=slug,
+            )
+        return self.section_ids[natural_key]
+
+    def _post_id(self, uid):
+        if not uid:
+            return None
+        uid = str(uid)
+        if uid not in self.post_ids:
+            self.post_ids[uid] = Post.objects.values_list('pk', flat=True).get(uid=uid)
+        return self.post_ids[uid]
+
+    def _write_post(self, records):
+        # Статьи пишутся раньше своих FAQ из той же пачки
+        for only_faqs in (False, True):
+            part = [record for record in records if bool(record.get('faq_for')) == only_faqs]
+            if part:
+                self._write_posts(part)
+
+    def _write_posts(self, records):
+        uids = [str(uuid.UUID(record['uid'])) for record in records]
+        existing = {str(uid): pk for uid, pk in Post.objects.filter(uid__in=uids).values_list('uid', 'pk')}
+        new, old = [], []
+        for uid, record in zip(uids, records):
+            post = Post(
+                pk=existing.get(uid),
+                uid=uid,
+                title=record['title'],
+                author=record['author'],
+                date=date.fromisoformat(record['date']),
+                content=record['content'],
+                content_hash=content_hash(record['content']),
+                media_keys=media_keys_column(record['content']),
+                video_url=record.get('video_url') or '',
+                section_id=self._section_id(record.get('section')),
+                faq_for_id=self._post_id(record.get('faq_for')),
+                faq_order=record.get('faq_order', 0),
+            )
+            (old if post.pk else new).append(post)
+        self._upsert(Post, new, old, POST_FIELDS)
+
+        # bulk_create не везде возвращает id — берём их по uid
+        self.post_ids.update({str(uid): pk for uid, pk in Post.objects.filter(uid__in=uids).values_list('uid', 'pk')})
+        for post in new:
+            post.pk = self.post_ids[str(post.uid)]
+        # bulk-операции не шлют post_save — ревизии пишем сами
+        record_revisions(new + old)
+
+
+def import_lines(lines, batch_size=DEFAULT_BATCH_SIZE):
+    """Импортирует итерируемые строки JSONL, возвращает {'created': n, 'updated': n}"""
+    importer = Importer(batch_size)
+    try:
+        with transaction.atomic():
+            for number, line in enumerate(lines, 1):
+                if isinstance(line, bytes):
+                    line = line.decode('utf-8')
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    importer.add(json.loads(line))
+                except (ValueError, KeyError, ObjectDoesNotExist, IntegrityError) as e:
+                    raise ValueError(f'Строка {number}: {e}') from e
+            try:
+                return importer.finish()
+            except (ValueError, KeyError, ObjectDoesNotExist) as e:
+                # Последние пачки пишутся здесь — номер строки уже не известен
+                raise ValueError(f'Конец файла: {e}') from e
+    except IntegrityError as e:
+        raise ValueError(f'Нарушена целостность данных, импорт отменён: {e}') from e
+
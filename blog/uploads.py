@@ -0,0 +1,258 @@
+import hashlib
+import re
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.cache import cache
+
+from .lazy_media import remember_image_size
+from .s3 import get_bucket_name, get_s3_client
+from .signing import presign_post
+
+
+# =========================
+# ПРАВИЛА ЗАГРУЗКИ
+# =========================
+#
+# Браузер грузит файл в S3 сам, по presigned POST. Лимиты зашиты в подписанную
+# политику (content-length-range и Content-Type), поэтому их проверяет S3,
+# а не заявленные клиентом file_size/content_type.
+# После загрузки verify_upload читает первые SNIFF_BYTES объекта (Range GET)
+# и сверяет сигнатуру формата; несовпадение — объект удаляется.
+#
+# Дедупликация: редактор присылает хэш содержимого (content_digest).
+# Хэшу клиента не верим: в кэш "хэш → ключ" попадает только хэш,
+# пересчитанный сервером по объекту в S3 (потоком, кусками). Пересчёт
+# ограничен UPLOAD_DIGEST_VERIFY_MAX_SIZE — файлы крупнее в дедупликации
+# не участвуют. Повторная загрузка того же файла получает готовый адрес
+# вместо presigned POST.
+#
+# UPLOAD_KEY_SCHEME = 'content' — ключи по хэшу содержимого:
+#   uploads/images/ab/cd/abcd…ef.png
+# Первые байты хэша дают шардированные префиксы (равномерные листинги S3),
+# одинаковые файлы получают один ключ. Такой ключ выдаётся только файлам
+# до UPLOAD_DIGEST_VERIFY_MAX_SIZE (лимит зашит в политику), и объект
+# под ним перед регистрацией всё равно пересчитывается.
+
+MB = 1024 * 1024
+
+UPLOAD_RULES = {
+    'image/jpeg': ('image', 'uploads/images', 50 * MB),
+    'image/jpg': ('image', 'uploads/images', 50 * MB),
+    'image/png': ('image', 'uploads/images', 50 * MB),
+    'image/gif': ('image', 'uploads/images', 50 * MB),
+    'image/webp': ('image', 'uploads/images', 50 * MB),
+    'video/mp4': ('video', 'uploads/videos', 2000 * MB),
+    'video/webm': ('video', 'uploads/videos', 2000 * MB),
+    'video/ogg': ('video', 'uploads/videos', 2000 * MB),
+    'video/quicktime': ('video', 'uploads/videos', 2000 * MB),
+    'video/x-msvideo': ('video', 'uploads/videos', 2000 * MB),
+}
+
+EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'video/mp4': '.mp4',
+    'video/webm': '.webm',
+    'video/ogg': '.ogv',
+    'video/quicktime': '.mov',
+    'video/x-msvideo': '.avi',
+}
+
+UPLOAD_EXPIRES = 60 * 60
+SNIFF_BYTES = 4096
+
+PENDING_CACHE_PREFIX = 'upload-pending'
+DIGEST_CACHE_PREFIX = 'upload-digest'
+
+# Совпадает с DIGEST_CHUNK_SIZE в static/editor/upload-worker.js
+DIGEST_CHUNK_SIZE = 4 * MB
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def dedup_max_size():
+    """Файлы крупнее не пересчитываются сервером и не дедуплицируются"""
+    return getattr(settings, 'UPLOAD_DIGEST_VERIFY_MAX_SIZE', 64 * MB)
+
+
+def content_addressed():
+    return getattr(settings, 'UPLOAD_KEY_SCHEME', 'timestamp') == 'content'
+
+
+# =========================
+# ХЭШ СОДЕРЖИМОГО
+# =========================
+
+def content_digest(chunks):
+    """
+    SHA-256 от склеенных SHA-256 кусков по DIGEST_CHUNK_SIZE байт.
+    Браузер не умеет считать SHA-256 потоком, а так хэш считается
+    кусками и в редакторе, и здесь, не держа файл в памяти.
+    """
+    digests = []
+    buffer = b''
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= DIGEST_CHUNK_SIZE:
+            digests.append(hashlib.sha256(buffer[:DIGEST_CHUNK_SIZE]).digest())
+            buffer = buffer[DIGEST_CHUNK_SIZE:]
+    if buffer or not digests:
+        digests.append(hashlib.sha256(buffer).digest())
+    return hashlib.sha256(b''.join(digests)).hexdigest()
+
+
+def is_valid_digest(digest):
+    return isinstance(digest, str) and bool(DIGEST_RE.match(digest))
+
+
+def content_key(digest, content_type):
+    """uploads/<папка>/ab/cd/<хэш><расширение>"""
+    folder = UPLOAD_RULES[content_type][1]
+    return f'{folder}/{digest[:2]}/{digest[2:4]}/{digest}{EXTENSIONS[content_type]}'
+
+
+def _iter_body(body):
+    for chunk in iter(lambda: body.read(DIGEST_CHUNK_SIZE), b''):
+        yield chunk
+    body.close()
+
+
+def server_digest(key):
+    """
+    content_digest объекта в S3, прочитанного потоком.
+    None — объекта нет или он больше dedup_max_size().
+    """
+    s3_client = get_s3_client()
+    try:
+        s3_response = s3_client.get_object(Bucket=get_bucket_name(), Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    if s3_response['ContentLength'] > dedup_max_size():
+        s3_response['Body'].close()
+        return None
+    return content_digest(_iter_body(s3_response['Body']))
+
+
+def register_digest(digest, key):
+    cache.set(f'{DIGEST_CACHE_PREFIX}:{digest}', key, None)
+
+
+def find_uploaded(digest, content_type):
+    """Ключ ранее загруженного файла с таким хэшем (в папке для этого типа) или None"""
+    if not is_valid_digest(digest):
+        return None
+    folder = UPLOAD_RULES[content_type][1]
+
+    key = cache.get(f'{DIGEST_CACHE_PREFIX}:{digest}')
+    if key and key.startswith(f'{folder}/'):
+        return key
+
+    if content_addressed():
+        key = content_key(digest, content_type)
+        actual = server_digest(key)
+        if actual == digest:
+            register_digest(digest, key)
+            return key
+        if actual is not None:
+            # Под ключом чужое содержимое (загрузили без проверки) — убираем
+            get_s3_client().delete_object(Bucket=get_bucket_name(), Key=key)
+    return None
+
+
+# =========================
+# СИГНАТУРЫ ФОРМАТОВ
+# =========================
+
+def _is_isobmff(head):
+    # MP4/MOV: размер бокса (4 байта) + тип первого бокса
+    return head[4:8] in (b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip')
+
+
+SIGNATURES = {
+    'image/jpeg': lambda head: head.startswith(b'\xff\xd8\xff'),
+    'image/png': lambda head: head.startswith(b'\x89PNG\r\n\x1a\n'),
+    'image/gif': lambda head: head[:6] in (b'GIF87a', b'GIF89a'),
+    'image/webp': lambda head: head[:4] == b'RIFF' and head[8:12] == b'WEBP',
+    'video/mp4': _is_isobmff,
+    'video/quicktime': _is_isobmff,
+    'video/webm': lambda head: head.startswith(b'\x1a\x45\xdf\xa3'),
+    'video/ogg': lambda head: head.startswith(b'OggS'),
+    'video/x-msvideo': lambda head: head[:4] == b'RIFF' and head[8:12] == b'AVI ',
+}
+SIGNATURES['image/jpg'] = SIGNATURES['image/jpeg']
+
+
+def matches_signature(content_type, head):
+    check = SIGNATURES.get(content_type)
+    return bool(check and head and check(head))
+
+
+# =========================
+# PRESIGNED POST
+# =========================
+
+def presigned_upload(key, content_type, max_size, user, digest=None):
+    """
+    Подписанная форма загрузки: {'url': ..., 'fields': {...}},
+    url — прокси загрузок S3_UPLOAD_PROXY_URL (см. blog/signing.py).
+    Ключ запоминается за пользователем — проверить его сможет только он.
+    """
+    post = presign_post(
+        key,
+        fields={'Content-Type': content_type},
+        conditions=[
+            ['content-length-range', 1, max_size],
+            {'Content-Type': content_type},
+        ],
+        expires_in=UPLOAD_EXPIRES,
+    )
+    digest = digest if is_valid_digest(digest) else None
+    cache.set(f'{PENDING_CACHE_PREFIX}:{key}', (user.pk, content_type, digest), UPLOAD_EXPIRES * 2)
+    return post
+
+
+def verify_upload(key, user):
+    """
+    Проверяет загруженный объект по первым байтам.
+    Возвращает текст ошибки или None, если файл соответствует заявленному типу.
+    Файл до dedup_max_size() с хэшем регистрируется для дедупликации,
+    если хэш, пересчитанный по объекту в S3, совпал с присланным.
+    """
+    pending_key = f'{PENDING_CACHE_PREFIX}:{key}'
+    pending = cache.get(pending_key)
+    if pending is None or pending[0] != user.pk:
+        return 'Загрузка не найдена'
+    _, content_type, digest = pending
+
+    s3_client = get_s3_client()
+    bucket_name = get_bucket_name()
+    try:
+        s3_response = s3_client.get_object(Bucket=bucket_name, Key=key, Range=f'bytes=0-{SNIFF_BYTES - 1}')
+        head = s3_response['Body'].read(SNIFF_BYTES)
+        s3_response['Body'].close()
+    except s3_client.exceptions.NoSuchKey:
+        return 'Файл не загружен'
+
+    cache.delete(pending_key)
+    if not matches_signature(content_type, head):
+        s3_client.delete_object(Bucket=bucket_name, Key=key)
+        return f'Содержимое файла не соответствует типу {content_type}'
+    if content_type.startswith('image/'):
+        remember_image_size(key, head)
+
+    if digest:
+        size = int(s3_response.get('ContentRange', '/0').rsplit('/', 1)[-1] or 0)
+        actual = server_digest(key) if size <= dedup_max_size() else None
+        if actual == digest:
+            register_digest(digest, key)
+        elif key == content_key(digest, content_type):
+            # Под чужим хэшем файл подменил бы будущие дубликаты
+            s3_client.delete_object(Bucket=bucket_name, Key=key)
+            return 'Хэш файла не совпадает с содержимым'
+        # Иначе файл валиден, но в дедупликации не участвует
+    return None
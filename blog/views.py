@@ -1,18 +1,33 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import render, get_object_or_404
+from django.utils.decorators import method_decorator
 from django.views import View
-from bs4 import BeautifulSoup
 from django.http import JsonResponse
+from django.db.models import Count, Prefetch
 from django.views.decorators.http import require_POST
-from django.conf import settings
 import logging
 import os
 import re
 import json
+import secrets
 from datetime import datetime
-
-from .models import Post, Category
+from functools import wraps
+
+from .access import allowed_category_slugs, user_can_access_media, user_group_names
+from .conditional import conditional_response, make_etag, nav_version, set_validators
+from .db_router import replica_reads
+from .instrumentation import timed
+from .media_urls import proxy_media_url, sign_media_urls
+from .metrics import UPLOAD_PRESIGNS, stream_with_metrics
+from .models import Post, Category, Section
+from .ratelimit import rate_limit
+from .rendering import faq_navigation, render_post_content, section_page
+from .s3 import get_bucket_name, get_s3_client
+from .uploads import (
+    UPLOAD_RULES, content_addressed, content_key, dedup_max_size, find_uploaded,
+    is_valid_digest, presigned_upload, verify_upload,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +36,19 @@ logger = logging.getLogger(__name__)
 # HELPERS
 # =========================
 
+def staff_required(view):
+    """Загрузки в S3 — только для сотрудников, как и редактор в админке"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_staff:
+            return JsonResponse({
+                'success': False,
+                'error': 'Загрузка файлов доступна только редакторам'
+            }, status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
 def resolve_category(post):
     if post.section:
         return post.section.category
@@ -29,6 +57,16 @@ def resolve_category(post):
     return None
 
 
+def visible_categories(user):
+    """Категории с разделами (и числом статей в них), доступные пользователю"""
+    sections = Section.objects.annotate(post_count=Count('posts')).order_by('pk')
+    categories = Category.objects.prefetch_related(Prefetch('sections', queryset=sections))
+    allowed_slugs = allowed_category_slugs(user)
+    if allowed_slugs is None:
+        return categories.all()
+    return categories.filter(slug__in=allowed_slugs)
+
+
 def generate_unique_filename(original_filename):
     """Генерирует уникальное имя файла с timestamp и транслитерацией"""
     
@@ -41,7 +79,8 @@ def generate_unique_filename(original_filename):
         ' ': '_', '-': '_'
     }
     
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    # Случайный суффикс: две загрузки одного файла в одну секунду не совпадут
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S') + '_' + secrets.token_hex(3)
     name, ext = os.path.splitext(original_filename)
     name = name.lower()
     
@@ -78,22 +117,46 @@ def home(request):
 class PostView(LoginRequiredMixin, View):
     login_url = 'login'
 
+    @method_decorator(replica_reads)
     def get(self, request):
         user = request.user
 
-        if user.is_superuser:
-            categories = Category.objects.prefetch_related('sections__posts').all()
-        else:
-            allowed_slugs = []
-            for group in user.groups.all():
-                if group.name.lower() == 'farm':
-                    allowed_slugs.append('farm')
-                elif group.name.lower() == 'buyer':
-                    allowed_slugs.append('buyer')
+        last_modified = nav_version()
+        etag = make_etag(user, 'list', last_modified)
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified:
+            return not_modified
+
+        categories = visible_categories(user)
+
+        response = render(request, 'blog/blog.html', {'categories': categories})
+        return set_validators(response, etag, last_modified)
+
+
+# =========================
+# SECTION POSTS (подгрузка списка)
+# =========================
+
+@login_required(login_url='login')
+@replica_reads
+def section_posts(request, pk):
+    """
+    Статьи раздела порциями по COURSE_PAGE_SIZE: {"html": ..., "next": <id> | null}.
+    Пагинация по ключу (?after=<id последней статьи>), а не OFFSET —
+    любая страница стоит одного прохода по индексу (section, id).
+    """
+    section = get_object_or_404(Section.objects.select_related('category'), pk=pk)
+    allowed_slugs = allowed_category_slugs(request.user)
+    if allowed_slugs is not None and section.category.slug not in allowed_slugs:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
 
-            categories = Category.objects.prefetch_related('sections__posts').filter(slug__in=allowed_slugs)
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        after = 0
 
-        return render(request, 'blog/blog.html', {'categories': categories})
+    page = section_page(pk, after)
+    return JsonResponse(page)
 
 
 # =========================
@@ -103,43 +166,48 @@ class PostView(LoginRequiredMixin, View):
 class PostDetail(LoginRequiredMixin, View):
     login_url = 'login'
 
+    @method_decorator(replica_reads)
     def get(self, request, pk):
-        post = get_object_or_404(Post, pk=pk)
+        # Контент нужен только при промахе кэша рендера — грузим его лениво
+        post = get_object_or_404(
+            Post.objects
+            .select_related('section__category', 'faq_for__section__category')
+            .defer('content', 'faq_for__content'),
+            pk=pk,
+        )
         user = request.user
         category = resolve_category(post)
 
         if not user.is_superuser and category:
-            if user.groups.filter(name='farm').exists() and category.slug != 'farm':
+            group_names = user_group_names(user)
+            if 'farm' in group_names and category.slug != 'farm':
                 return render(request, 'blog/forbidden.html')
-            if user.groups.filter(name='buyer').exists() and category.slug != 'buyer':
+            if 'buyer' in group_names and category.slug != 'buyer':
                 return render(request, 'blog/forbidden.html')
 
-        if user.is_superuser:
-            categories = Category.objects.prefetch_related('sections__posts').all()
-        else:
-            allowed_slugs = []
-            for group in user.groups.all():
-                if group.name.lower() == 'farm':
-                    allowed_slugs.append('farm')
-                elif group.name.lower() == 'buyer':
-                    allowed_slugs.append('buyer')
-            categories = Category.objects.prefetch_related('sections__posts').filter(slug__in=allowed_slugs)
+        last_modified = nav_version()
+        etag = make_etag(user, 'post', post.pk, post.content_hash, last_modified)
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified:
+            return not_modified
 
-        soup = BeautifulSoup(post.content, 'html.parser')
-        toc = []
+        # Для FAQ в сайдбаре — соседние FAQ той же статьи
+        faq_parent = post.faq_for or post
+        faqs = faq_navigation(faq_parent.pk)
 
-        for i, tag in enumerate(soup.find_all(['h2', 'h3'])):
-            anchor = f'heading-{i}'
-            tag['id'] = anchor
-            toc.append({'id': anchor, 'title': tag.get_text()})
+        with timed('toc'):
+            content, toc = render_post_content(post)
 
-        post.content = str(soup)
+        with timed('sign'):
+            post.content = sign_media_urls(content, category.slug if category else None)
 
-        return render(request, 'blog/blog_detail.html', {
+        response = render(request, 'blog/blog_detail.html', {
             'post': post,
-            'categories': categories,
+            'faq_parent': faq_parent,
+            'faqs': faqs,
             'toc': toc,
         })
+        return set_validators(response, etag, last_modified)
 
 
 # =========================
@@ -157,25 +225,26 @@ def profile_view(request):
 
 @require_POST
 @login_required
+@staff_required
+@rate_limit('presign')
 def get_presigned_upload_url(request):
     """
     Генерирует presigned URL для загрузки на S3 через nginx прокси.
     Это обходит CORS и Cloudflare.
     
     Схема:
-    1. Django генерирует presigned URL для S3
-    2. URL переписывается на nginx прокси: /s3-upload/...
-    3. Браузер отправляет PUT на nginx
+    1. Django генерирует presigned POST для S3 (лимиты размера и типа в политике)
+    2. Адрес формы — nginx прокси /s3-upload/ (S3_UPLOAD_PROXY_URL)
+    3. Браузер отправляет multipart POST на nginx
     4. Nginx проксирует на S3 с оригинальной подписью
+    5. Браузер вызывает /verify-upload/ — проверка сигнатуры файла
     """
-    import boto3
-    from botocore.config import Config
-    
     try:
         data = json.loads(request.body)
         filename = data.get('filename')
         content_type = data.get('content_type')
         file_size = data.get('file_size', 0)
+        digest = data.get('digest')
         
         if not filename or not content_type:
             return JsonResponse({
@@ -184,75 +253,59 @@ def get_presigned_upload_url(request):
             }, status=400)
         
         # Проверка типа файла
-        allowed_image_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']
-        allowed_video_types = ['video/mp4', 'video/webm', 'video/ogg', 'video/quicktime', 'video/x-msvideo']
-        
-        if content_type in allowed_image_types:
-            folder = 'uploads/images'
-            max_size = 50 * 1024 * 1024  # 50 MB
-        elif content_type in allowed_video_types:
-            folder = 'uploads/videos'
-            max_size = 2000 * 1024 * 1024  # 2 GB
-        else:
+        rule = UPLOAD_RULES.get(content_type)
+        if rule is None:
             return JsonResponse({
                 'success': False,
                 'error': f'Неподдерживаемый тип файла: {content_type}'
             }, status=400)
+        kind, folder, max_size = rule
         
-        # Проверка размера
+        # Ранний отказ по заявленному размеру; реальный лимит проверит S3 по политике
         if file_size > max_size:
             return JsonResponse({
                 'success': False,
                 'error': f'Файл слишком большой. Максимум: {max_size // (1024*1024)} MB'
             }, status=400)
         
-        # Генерируем уникальное имя файла
-        unique_filename = generate_unique_filename(filename)
-        s3_key = f'{folder}/{unique_filename}'
-        
-        logger.info(f"Генерация presigned URL: {filename} -> {s3_key}, размер: {file_size}, пользователь: {request.user.username}")
-        
-        # Создаём S3 клиент
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            endpoint_url=os.getenv('AWS_S3_ENDPOINT_URL'),
-            region_name=os.getenv('AWS_S3_REGION_NAME', 'ru1'),
-            config=Config(signature_version='s3v4')
-        )
-        
-        bucket_name = os.getenv('AWS_STORAGE_BUCKET_NAME')
-        
-        # Генерируем presigned URL для PUT
-        presigned_url = s3_client.generate_presigned_url(
-            'put_object',
-            Params={
-                'Bucket': bucket_name,
-                'Key': s3_key,
-                'ContentType': content_type,
-            },
-            ExpiresIn=3600  # 1 час
-        )
-        
-        # КЛЮЧЕВОЕ: Заменяем прямой S3 URL на upload поддомен (без Cloudflare)
-        # Это обходит лимит 100MB Cloudflare!
-        # Было: https://s3.ru1.storage.beget.cloud/bucket/path?signature...
-        # Стало: https://upload.traff-lab.ru/s3-upload/path?signature...
+        # Тот же файл уже загружали — отдаём его адрес без новой загрузки
+        existing_key = find_uploaded(digest, content_type)
+        if existing_key:
+            logger.info('Дубликат загрузки: %s -> %s, пользователь: %s', filename, existing_key, request.user.username)
+            return JsonResponse({
+                'success': True,
+                'exists': True,
+                'file_url': proxy_media_url(existing_key),
+                'key': existing_key
+            })
+        
+        # Ключ по хэшу содержимого или уникальное имя файла.
+        # Хэш крупных файлов сервер не пересчитывает — им ключ по хэшу не выдаём
+        if content_addressed() and is_valid_digest(digest) and file_size <= dedup_max_size():
+            s3_key = content_key(digest, content_type)
+            max_size = min(max_size, dedup_max_size())
+        else:
+            unique_filename = generate_unique_filename(filename)
+            s3_key = f'{folder}/{unique_filename}'
         
-        s3_base = f"https://s3.ru1.storage.beget.cloud/{bucket_name}/"
-        proxy_base = "https://upload.traff-lab.ru/s3-upload/"
+        logger.info('Генерация presigned URL: %s -> %s, размер: %s, пользователь: %s', filename, s3_key, file_size, request.user.username)
         
-        proxy_upload_url = presigned_url.replace(s3_base, proxy_base)
+        # Presigned POST: размер и Content-Type зашиты в подписанную политику.
+        # URL формы — upload поддомен без Cloudflare (S3_UPLOAD_PROXY_URL),
+        # это обходит лимит 100MB Cloudflare
+        upload = presigned_upload(s3_key, content_type, max_size, request.user, digest)
+        proxy_upload_url = upload['url']
         
         # URL для чтения файла через Django прокси (с авторизацией)
-        file_url = f"https://traff-lab.ru/s3-media/{s3_key}"
+        file_url = proxy_media_url(s3_key)
         
-        logger.info(f"Presigned URL создан, прокси: {proxy_upload_url[:100]}...")
+        logger.debug('Presigned POST создан: %s', s3_key)
+        UPLOAD_PRESIGNS.labels(kind).inc()
         
         return JsonResponse({
             'success': True,
             'upload_url': proxy_upload_url,
+            'fields': upload['fields'],
             'file_url': file_url,
             'key': s3_key
         })
@@ -263,7 +316,46 @@ def get_presigned_upload_url(request):
             'error': 'Неверный формат JSON'
         }, status=400)
     except Exception as e:
-        logger.error(f"Ошибка генерации presigned URL: {str(e)}", exc_info=True)
+        logger.error('Ошибка генерации presigned URL: %s', e, exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'error': f'Ошибка сервера: {str(e)}'
+        }, status=500)
+
+
+@require_POST
+@login_required
+@staff_required
+def verify_uploaded_file(request):
+    """
+    Проверка файла после загрузки: читает первые байты объекта из S3
+    и сверяет сигнатуру с типом, под который выдавался presigned POST.
+    Файл с чужим содержимым удаляется.
+    """
+    try:
+        data = json.loads(request.body)
+        s3_key = data.get('key') or ''
+        
+        if not s3_key.startswith('uploads/'):
+            return JsonResponse({
+                'success': False,
+                'error': 'Недопустимый путь файла'
+            }, status=400)
+        
+        error = verify_upload(s3_key, request.user)
+        if error:
+            logger.warning('Загрузка отклонена: %s: %s, пользователь: %s', s3_key, error, request.user.username)
+            return JsonResponse({'success': False, 'error': error}, status=400)
+        
+        return JsonResponse({'success': True})
+        
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Неверный формат JSON'
+        }, status=400)
+    except Exception as e:
+        logger.error('Ошибка проверки загрузки: %s', e, exc_info=True)
         return JsonResponse({
             'success': False,
             'error': f'Ошибка сервера: {str(e)}'
@@ -275,31 +367,27 @@ def get_presigned_upload_url(request):
 # =========================
 
 @login_required(login_url='login')
+@rate_limit('media', streams=True)
+@replica_reads
 def serve_s3_media(request, path):
     """
     Проксирует файлы из S3 для авторизованных пользователей.
     URL: /s3-media/<path>
     """
-    import boto3
-    from botocore.config import Config
     from django.http import StreamingHttpResponse, HttpResponse
     
     # Проверяем что путь начинается с uploads/ (безопасность)
     if not path.startswith('uploads/'):
         return HttpResponse('Forbidden', status=403)
+
+    # Файл должен встречаться в статьях доступной пользователю категории
+    if not user_can_access_media(request.user, path):
+        return HttpResponse('Forbidden', status=403)
     
     try:
         # Создаём S3 клиент
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            endpoint_url=os.getenv('AWS_S3_ENDPOINT_URL'),
-            region_name=os.getenv('AWS_S3_REGION_NAME', 'ru1'),
-            config=Config(signature_version='s3v4')
-        )
-        
-        bucket_name = os.getenv('AWS_STORAGE_BUCKET_NAME')
+        s3_client = get_s3_client()
+        bucket_name = get_bucket_name()
         
         # Получаем файл из S3
         try:
@@ -338,7 +426,7 @@ def serve_s3_media(request, path):
                 yield chunk
         
         response = StreamingHttpResponse(
-            stream_file(),
+            stream_with_metrics(stream_file()),
             content_type=content_type,
             status=status_code
         )
@@ -359,7 +447,7 @@ def serve_s3_media(request, path):
         return response
         
     except Exception as e:
-        logger.error(f"Ошибка проксирования S3: {str(e)}", exc_info=True)
+        logger.error('Ошибка проксирования S3: %s', e, exc_info=True)
         return HttpResponse(f'Error: {str(e)}', status=500)
 
 
@@ -370,9 +458,6 @@ def make_file_public(request):
     Устанавливает public-read ACL для файла после загрузки.
     Вызывается после успешной загрузки на S3.
     """
-    import boto3
-    from botocore.config import Config
-    
     try:
         data = json.loads(request.body)
         s3_key = data.get('key')
@@ -390,19 +475,11 @@ def make_file_public(request):
                 'error': 'Недопустимый путь файла'
             }, status=400)
         
-        logger.info(f"Установка public-read ACL для: {s3_key}")
+        logger.info('Установка public-read ACL для: %s', s3_key)
         
         # Создаём S3 клиент
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            endpoint_url=os.getenv('AWS_S3_ENDPOINT_URL'),
-            region_name=os.getenv('AWS_S3_REGION_NAME', 'ru1'),
-            config=Config(signature_version='s3v4')
-        )
-        
-        bucket_name = os.getenv('AWS_STORAGE_BUCKET_NAME')
+        s3_client = get_s3_client()
+        bucket_name = get_bucket_name()
         
         # Устанавливаем ACL
         s3_client.put_object_acl(
@@ -415,7 +492,7 @@ def make_file_public(request):
         endpoint_url = os.getenv('AWS_S3_ENDPOINT_URL')
         file_url = f"{endpoint_url}/{bucket_name}/{s3_key}"
         
-        logger.info(f"ACL установлен, публичный URL: {file_url}")
+        logger.info('ACL установлен: %s', s3_key)
         
         return JsonResponse({
             'success': True,
@@ -428,7 +505,7 @@ def make_file_public(request):
             'error': 'Неверный формат JSON'
         }, status=400)
     except Exception as e:
-        logger.error(f"Ошибка установки ACL: {str(e)}", exc_info=True)
+        logger.error('Ошибка установки ACL: %s', e, exc_info=True)
         return JsonResponse({
             'success': False,
             'error': f'Ошибка сервера: {str(e)}'
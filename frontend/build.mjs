@@ -0,0 +1,48 @@
+/**
+ * Сборка зависимостей редактора в один ES-модуль:
+ *   static/editor/vendor/editor-deps-<hash>.js
+ *   static/editor/vendor/manifest.json  {"editor-deps.js": "editor-deps-<hash>.js"}
+ *
+ * Хэш в имени меняется вместе с содержимым, поэтому файл можно кэшировать
+ * навсегда (см. /static/editor/vendor/ в nginx.conf). Манифест читает
+ * blog/assets.py и подставляет актуальное имя в Media админки.
+ *
+ * Результат коммитится вместе с package-lock.json: образ Docker и Passenger
+ * берут бандл из репозитория, реестр npm при развёртывании не нужен.
+ *   cd frontend && npm ci && npm run build
+ */
+import { mkdir, readdir, rm, writeFile } from 'node:fs/promises';
+import path from 'node:path';
+import { fileURLToPath } from 'node:url';
+import * as esbuild from 'esbuild';
+
+const root = path.dirname(fileURLToPath(import.meta.url));
+const outdir = path.resolve(root, '../static/editor/vendor');
+
+await mkdir(outdir, { recursive: true });
+for (const name of await readdir(outdir)) {
+  await rm(path.join(outdir, name));
+}
+
+const result = await esbuild.build({
+  entryPoints: [path.join(root, 'editor-deps.js')],
+  outdir,
+  entryNames: '[name]-[hash]',
+  bundle: true,
+  format: 'esm',
+  target: 'es2020',
+  minify: true,
+  treeShaking: true,
+  legalComments: 'eof',
+  metafile: true,
+});
+
+const manifest = {};
+for (const [output, meta] of Object.entries(result.metafile.outputs)) {
+  if (meta.entryPoint) {
+    manifest[path.basename(meta.entryPoint)] = path.basename(output);
+  }
+}
+await writeFile(path.join(outdir, 'manifest.json'), JSON.stringify(manifest, null, 2) + '\n');
+
+console.log(manifest);
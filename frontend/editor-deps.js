@@ -0,0 +1,8 @@
+// Точка входа бандла редактора: только то, что использует static/editor/editor-init.js.
+// Сборка: npm install && npm run build (см. build.mjs)
+export { Editor, Node } from '@tiptap/core';
+export { default as StarterKit } from '@tiptap/starter-kit';
+export { default as Image } from '@tiptap/extension-image';
+export { default as Link } from '@tiptap/extension-link';
+export { default as Placeholder } from '@tiptap/extension-placeholder';
+export { default as Youtube } from '@tiptap/extension-youtube';
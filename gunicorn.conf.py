@@ -0,0 +1,53 @@
+import multiprocessing
+import os
+import shutil
+
+# gthread держит keep-alive соединения от nginx (sync-воркер закрывает каждое)
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Дольше, чем keepalive_timeout upstream в nginx.conf, чтобы соединение
+# закрывал nginx, а не gunicorn посреди запроса
+keepalive = 75
+
+# Общий каталог метрик prometheus_client для всех воркеров
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus')
+
+
+def check_shared_cache(server):
+    """
+    nav_version, поколение медиа-доступа, снимки пользователей и лимиты
+    живут в кэше: с LocMem у каждого воркера своя копия, и сброс в одном
+    (пользователя убрали из группы) не виден остальным. Без REDIS_URL —
+    только один воркер.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PolinClub.settings')
+    from django.conf import settings
+
+    backend = settings.CACHES['default']['BACKEND']
+    if server.cfg.workers > 1 and backend.endswith('LocMemCache'):
+        raise RuntimeError(
+            f'{server.cfg.workers} воркеров с LocMemCache: задайте REDIS_URL '
+            'или GUNICORN_WORKERS=1'
+        )
+
+
+def on_starting(server):
+    """Проверяем общий кэш и чистим метрики прошлого запуска мастера"""
+    check_shared_cache(server)
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def post_worker_init(worker):
+    """Прогрев до приёма запросов: кэши навигации и статей, пул S3 (blog/health.py)"""
+    from blog.health import warm_up
+
+    warm_up()
+
+
+def child_exit(server, worker):
+    """Убираем live-gauge умершего воркера (активные потоки медиа)"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
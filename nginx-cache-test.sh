@@ -0,0 +1,60 @@
+#!/bin/sh
+# Проверка продового nginx.conf на локальном docker compose:
+# микрокэш анонимных страниц (MISS → HIT), обход кэша с сессией и gzip.
+set -eu
+cd "$(dirname "$0")"
+
+NGINX_TEST_CERTS=$(mktemp -d)
+export NGINX_TEST_CERTS
+
+compose() {
+    docker compose -f docker-compose.yml -f docker-compose.nginx-test.yml "$@"
+}
+
+cleanup() {
+    compose down >/dev/null 2>&1 || true
+    rm -rf "$NGINX_TEST_CERTS"
+}
+trap cleanup EXIT
+
+openssl req -x509 -nodes -newkey rsa:2048 -days 1 -subj '/CN=traff-lab.ru' \
+    -keyout "$NGINX_TEST_CERTS/privkey.pem" -out "$NGINX_TEST_CERTS/fullchain.pem" 2>/dev/null
+chmod 644 "$NGINX_TEST_CERTS"/*.pem
+
+compose up -d --build web nginx
+
+probe() {
+    compose run --rm -T probe -sk "$@"
+}
+
+# Заголовок ответа (без учёта регистра) для GET https://traff-lab.ru$1
+header() {
+    url=$1
+    name=$2
+    shift 2
+    probe -o /dev/null -D - "$@" "https://traff-lab.ru$url" \
+        | tr -d '\r' | awk -v name="$name" 'tolower($1) == tolower(name) ":" { print $2 }'
+}
+
+expect() {
+    if [ "$2" != "$3" ]; then
+        echo "FAIL: $1: ожидалось '$3', получено '$2'"
+        exit 1
+    fi
+    echo "ok: $1"
+}
+
+# Ждём Django; /blog/ не кэшируется, поэтому не прогревает микрокэш
+for _ in $(seq 1 60); do
+    status=$(probe -o /dev/null -w '%{http_code}' https://traff-lab.ru/blog/ || true)
+    [ "$status" = 302 ] && break
+    sleep 1
+done
+expect 'Django отвечает' "$status" 302
+
+expect 'первый запрос главной' "$(header / X-Cache-Status)" MISS
+expect 'повторный запрос главной' "$(header / X-Cache-Status)" HIT
+expect 'запрос с сессией' "$(header / X-Cache-Status -H 'Cookie: sessionid=test')" BYPASS
+expect 'gzip главной' "$(header / Content-Encoding -H 'Accept-Encoding: gzip')" gzip
+
+echo 'nginx: все проверки пройдены'
@@ -1,21 +1,49 @@
-document.addEventListener("DOMContentLoaded", async () => {
-  const [
-    { Editor },
-    { default: StarterKit },
-    { default: Image },
-    { default: Link },
-    { default: Placeholder },
-    { default: Youtube },
-    { Node }
-  ] = await Promise.all([
-    import("https://esm.sh/@tiptap/core"),
-    import("https://esm.sh/@tiptap/starter-kit"),
-    import("https://esm.sh/@tiptap/extension-image"),
-    import("https://esm.sh/@tiptap/extension-link"),
-    import("https://esm.sh/@tiptap/extension-placeholder"),
-    import("https://esm.sh/@tiptap/extension-youtube"),
-    import("https://esm.sh/@tiptap/core")
+/**
+ * Зависимости редактора берутся из локального бандла static/editor/vendor/
+ * (frontend/build.mjs, хранится в репозитории), ссылку на него ставит Media
+ * админки через <link rel="modulepreload" data-editor-bundle>.
+ * Загрузка с esm.sh — только при EDITOR_CDN_FALLBACK (локальная разработка),
+ * тогда Media добавляет <meta name="editor-cdn-fallback">.
+ */
+async function loadEditorDeps() {
+  const bundle = document.querySelector("link[data-editor-bundle]");
+  if (bundle) {
+    return import(bundle.href);
+  }
+  if (!document.querySelector('meta[name="editor-cdn-fallback"]')) {
+    throw new Error("Бандл редактора не собран (static/editor/vendor/)");
+  }
+
+  console.warn("EDITOR_CDN_FALLBACK: модули редактора грузятся с esm.sh");
+  const [core, starterKit, image, link, placeholder, youtube] = await Promise.all([
+    import("https://esm.sh/@tiptap/core@2.11.5"),
+    import("https://esm.sh/@tiptap/starter-kit@2.11.5"),
+    import("https://esm.sh/@tiptap/extension-image@2.11.5"),
+    import("https://esm.sh/@tiptap/extension-link@2.11.5"),
+    import("https://esm.sh/@tiptap/extension-placeholder@2.11.5"),
+    import("https://esm.sh/@tiptap/extension-youtube@2.11.5")
   ]);
+  return {
+    Editor: core.Editor,
+    Node: core.Node,
+    StarterKit: starterKit.default,
+    Image: image.default,
+    Link: link.default,
+    Placeholder: placeholder.default,
+    Youtube: youtube.default
+  };
+}
+
+document.addEventListener("DOMContentLoaded", async () => {
+  let deps;
+  try {
+    deps = await loadEditorDeps();
+  } catch (error) {
+    // Поля остаются обычными textarea с HTML — сохранять статьи можно
+    console.error("Редактор не загружен:", error);
+    return;
+  }
+  const { Editor, Node, StarterKit, Image, Link, Placeholder, Youtube } = deps;
 
   // Кастомное расширение для видео
   const Video = Node.create({
@@ -26,6 +54,7 @@ document.addEventListener("DOMContentLoaded", async () => {
     addAttributes() {
       return {
         src: { default: null },
+        poster: { default: null },
         controls: { default: true },
         preload: { default: 'metadata' },
         playsinline: { default: true },
@@ -71,10 +100,56 @@ document.addEventListener("DOMContentLoaded", async () => {
     return cookieValue;
   }
 
+  // Подготовка файлов перед загрузкой (static/editor/upload-worker.js)
+  const UPLOAD_OPTIONS = {
+    downscaleImages: true,          // уменьшать большие изображения в браузере
+    maxDimension: 2560,             // максимальная сторона, px
+    quality: 0.85,                  // качество JPEG/WebP
+    minSize: 1.5 * 1024 * 1024      // файлы меньше и не крупнее maxDimension не трогаем
+  };
+
   /**
-   * Получает presigned URL для загрузки через nginx прокси (с retry)
+   * Уменьшает изображение и считает хэш содержимого в Web Worker.
+   * Если воркер недоступен или упал — загружаем файл как есть, без хэша.
    */
-  async function getPresignedUrl(filename, contentType, fileSize, retryCount = 0) {
+  function prepareFile(file, onProgress) {
+    if (typeof Worker === 'undefined' || !window.crypto?.subtle) {
+      return Promise.resolve({ file: file, digest: null });
+    }
+
+    return new Promise((resolve) => {
+      const worker = new Worker('/static/editor/upload-worker.js');
+      const finish = (result) => {
+        worker.terminate();
+        resolve(result);
+      };
+
+      worker.addEventListener('message', (e) => {
+        if (e.data.type === 'progress') {
+          onProgress(e.data.percent, 'processing');
+        } else if (e.data.type === 'done') {
+          finish({ file: e.data.file, digest: e.data.digest });
+        } else {
+          console.log(`prepareFile failed: ${e.data.message}`);
+          finish({ file: file, digest: null });
+        }
+      });
+      worker.addEventListener('error', () => finish({ file: file, digest: null }));
+
+      worker.postMessage({
+        file: file,
+        maxDimension: UPLOAD_OPTIONS.downscaleImages ? UPLOAD_OPTIONS.maxDimension : Infinity,
+        quality: UPLOAD_OPTIONS.quality,
+        minSize: UPLOAD_OPTIONS.downscaleImages ? UPLOAD_OPTIONS.minSize : Infinity
+      });
+    });
+  }
+
+  /**
+   * Получает presigned URL для загрузки через nginx прокси (с retry).
+   * Если файл с таким хэшем уже загружен, сервер вернёт exists: true и его адрес.
+   */
+  async function getPresignedUrl(filename, contentType, fileSize, digest, retryCount = 0) {
     const MAX_RETRIES = 2;
     
     try {
@@ -87,7 +162,8 @@ document.addEventListener("DOMContentLoaded", async () => {
         body: JSON.stringify({
           filename: filename,
           content_type: contentType,
-          file_size: fileSize
+          file_size: fileSize,
+          digest: digest
         })
       });
 
@@ -103,7 +179,7 @@ document.addEventListener("DOMContentLoaded", async () => {
       if (retryCount < MAX_RETRIES) {
         console.log(`getPresignedUrl failed, retrying... (${retryCount + 1}/${MAX_RETRIES})`);
         await new Promise(resolve => setTimeout(resolve, 500)); // Пауза 500ms
-        return getPresignedUrl(filename, contentType, fileSize, retryCount + 1);
+        return getPresignedUrl(filename, contentType, fileSize, digest, retryCount + 1);
       }
       throw error;
     }
@@ -112,17 +188,24 @@ document.addEventListener("DOMContentLoaded", async () => {
   /**
    * Загружает файл на S3 через nginx прокси с retry для Safari
    */
-  async function uploadToS3ViaProxy(file, onProgress, abortController, retryCount = 0) {
+  async function uploadToS3ViaProxy(file, digest, onProgress, abortController, retryCount = 0) {
     const MAX_RETRIES = 2;
     
     onProgress(0, 'preparing');
     
-    const { upload_url, file_url, key } = await getPresignedUrl(
+    const { exists, upload_url, fields, file_url, key } = await getPresignedUrl(
       file.name, 
       file.type, 
-      file.size
+      file.size,
+      digest
     );
 
+    // Такой же файл уже лежит в S3 — повторно не грузим
+    if (exists) {
+      onProgress(100, 'complete');
+      return { success: true, url: file_url };
+    }
+
     return new Promise((resolve, reject) => {
       const xhr = new XMLHttpRequest();
       
@@ -138,8 +221,14 @@ document.addEventListener("DOMContentLoaded", async () => {
         }
       });
 
-      xhr.addEventListener('load', () => {
+      xhr.addEventListener('load', async () => {
         if (xhr.status >= 200 && xhr.status < 300) {
+          try {
+            await verifyUpload(key);
+          } catch (verifyError) {
+            reject(verifyError);
+            return;
+          }
           onProgress(100, 'complete');
           resolve({ success: true, url: file_url });
         } else {
@@ -152,7 +241,7 @@ document.addEventListener("DOMContentLoaded", async () => {
         if (retryCount < MAX_RETRIES && !abortController?.aborted) {
           console.log(`Upload failed, retrying... (${retryCount + 1}/${MAX_RETRIES})`);
           try {
-            const result = await uploadToS3ViaProxy(file, onProgress, abortController, retryCount + 1);
+            const result = await uploadToS3ViaProxy(file, digest, onProgress, abortController, retryCount + 1);
             resolve(result);
           } catch (retryError) {
             reject(retryError);
@@ -172,7 +261,7 @@ document.addEventListener("DOMContentLoaded", async () => {
         if (retryCount < MAX_RETRIES && !abortController?.aborted) {
           console.log(`Upload timeout, retrying... (${retryCount + 1}/${MAX_RETRIES})`);
           try {
-            const result = await uploadToS3ViaProxy(file, onProgress, abortController, retryCount + 1);
+            const result = await uploadToS3ViaProxy(file, digest, onProgress, abortController, retryCount + 1);
             resolve(result);
           } catch (retryError) {
             reject(retryError);
@@ -182,12 +271,84 @@ document.addEventListener("DOMContentLoaded", async () => {
         }
       });
 
-      xhr.open('PUT', upload_url);
-      xhr.setRequestHeader('Content-Type', file.type);
-      xhr.send(file);
+      // Presigned POST: поля политики, файл — последним полем формы
+      const form = new FormData();
+      Object.entries(fields).forEach(([name, value]) => form.append(name, value));
+      form.append('file', file);
+
+      xhr.open('POST', upload_url);
+      xhr.send(form);
     });
   }
 
+  /**
+   * Просит сервер проверить сигнатуру загруженного файла (первые байты в S3)
+   */
+  async function verifyUpload(key) {
+    const response = await fetch('/verify-upload/', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-CSRFToken': getCookie('csrftoken')
+      },
+      body: JSON.stringify({ key: key })
+    });
+
+    const data = await response.json();
+
+    if (!response.ok || !data.success) {
+      throw new Error(data.error || 'Файл не прошёл проверку');
+    }
+  }
+
+  /**
+   * Кадр из начала видео в JPEG — постер для <video preload="none">.
+   * Не получилось (кодек, таймаут) — видео вставляется без постера.
+   */
+  function capturePoster(file) {
+    return new Promise((resolve) => {
+      const url = URL.createObjectURL(file);
+      const video = document.createElement('video');
+      const done = (blob) => {
+        clearTimeout(timer);
+        URL.revokeObjectURL(url);
+        resolve(blob);
+      };
+      const timer = setTimeout(() => done(null), 10000);
+
+      video.muted = true;
+      video.playsInline = true;
+      video.preload = 'auto';
+      video.addEventListener('loadeddata', () => {
+        video.currentTime = Math.min(1, video.duration / 2 || 0);
+      });
+      video.addEventListener('seeked', () => {
+        const scale = Math.min(1, 1280 / video.videoWidth);
+        const canvas = document.createElement('canvas');
+        canvas.width = Math.round(video.videoWidth * scale);
+        canvas.height = Math.round(video.videoHeight * scale);
+        canvas.getContext('2d').drawImage(video, 0, 0, canvas.width, canvas.height);
+        canvas.toBlob(done, 'image/jpeg', 0.8);
+      });
+      video.addEventListener('error', () => done(null));
+      video.src = url;
+    });
+  }
+
+  async function uploadPoster(file) {
+    const blob = await capturePoster(file);
+    if (!blob) return null;
+    const posterFile = new File([blob], file.name.replace(/\.[^.]+$/, '') + '_poster.jpg', { type: 'image/jpeg' });
+    try {
+      const prepared = await prepareFile(posterFile, () => {});
+      const data = await uploadToS3ViaProxy(prepared.file, prepared.digest, () => {}, { xhr: null, aborted: false });
+      return data.url;
+    } catch (error) {
+      console.log(`Poster upload failed: ${error.message}`);
+      return null;
+    }
+  }
+
   // Создание кнопки
   function createButton(icon, tooltip, command, name) {
     const button = document.createElement("button");
@@ -296,12 +457,19 @@ document.addEventListener("DOMContentLoaded", async () => {
       document.body.appendChild(progressModal.element);
 
       try {
-        const data = await uploadToS3ViaProxy(file, (percent, stage) => {
+        const onProgress = (percent, stage) => {
           progressModal.updateProgress(percent, stage);
-        }, abortController);
+        };
+        const prepared = await prepareFile(file, onProgress);
+        if (abortController.aborted) return;
+
+        const data = await uploadToS3ViaProxy(prepared.file, prepared.digest, onProgress, abortController);
 
         if (abortController.aborted) return;
 
+        // Постер для видео — пока модалка ещё открыта
+        const poster = data.success && file.type.startsWith("video/") ? await uploadPoster(file) : null;
+
         await new Promise(resolve => setTimeout(resolve, 400));
         progressModal.remove();
 
@@ -309,7 +477,7 @@ document.addEventListener("DOMContentLoaded", async () => {
           if (file.type.startsWith("image/")) {
             editor.chain().focus().setImage({ src: data.url }).run();
           } else {
-            editor.commands.setVideo({ src: data.url });
+            editor.commands.setVideo({ src: data.url, poster: poster });
           }
         }
       } catch (error) {
@@ -552,7 +720,9 @@ document.addEventListener("DOMContentLoaded", async () => {
           progressBarFill.style.width = `${percent}%`;
           percentText.textContent = `${percent}%`;
 
-          if (stage === 'preparing') {
+          if (stage === 'processing') {
+            statusText.textContent = 'Обработка файла...';
+          } else if (stage === 'preparing') {
             statusText.textContent = 'Подготовка...';
           } else if (stage === 'uploading') {
             statusText.textContent = 'Загрузка...';
@@ -0,0 +1,78 @@
+/**
+ * Web Worker подготовки файла к загрузке (вне основного потока редактора):
+ *   1. Уменьшает и пережимает большие изображения (OffscreenCanvas)
+ *   2. Считает хэш содержимого по частям, не читая файл в память целиком
+ *
+ * Хэш — SHA-256 от склеенных SHA-256 кусков по DIGEST_CHUNK_SIZE байт
+ * (blog/uploads.py: content_digest считает так же).
+ *
+ * Вход:  { file, maxDimension, quality, minSize }
+ * Выход: { type: 'progress', percent } ... { type: 'done', file, digest } | { type: 'error', message }
+ */
+
+const DIGEST_CHUNK_SIZE = 4 * 1024 * 1024;
+
+// GIF не трогаем — пережатие убьёт анимацию
+const RESIZABLE_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/webp'];
+
+function replaceExtension(name, type) {
+  const ext = type === 'image/webp' ? '.webp' : '.jpg';
+  return name.replace(/\.[^.]+$/, '') + ext;
+}
+
+async function downscaleImage(file, maxDimension, quality, minSize) {
+  if (!RESIZABLE_TYPES.includes(file.type) || typeof OffscreenCanvas === 'undefined') {
+    return file;
+  }
+
+  const bitmap = await createImageBitmap(file);
+  const longest = Math.max(bitmap.width, bitmap.height);
+  if (longest <= maxDimension && file.size <= minSize) {
+    bitmap.close();
+    return file;
+  }
+
+  const scale = Math.min(1, maxDimension / longest);
+  const width = Math.round(bitmap.width * scale);
+  const height = Math.round(bitmap.height * scale);
+  const canvas = new OffscreenCanvas(width, height);
+  canvas.getContext('2d').drawImage(bitmap, 0, 0, width, height);
+  bitmap.close();
+
+  // JPEG остаётся JPEG, скриншоты (PNG/WebP, возможна прозрачность) — в WebP
+  const targetType = file.type === 'image/jpeg' || file.type === 'image/jpg' ? 'image/jpeg' : 'image/webp';
+  const blob = await canvas.convertToBlob({ type: targetType, quality: quality });
+
+  // Браузер мог не поддержать формат или результат вышел не меньше исходника
+  if (blob.type !== targetType || blob.size >= file.size) {
+    return file;
+  }
+  return new File([blob], replaceExtension(file.name, blob.type), { type: blob.type });
+}
+
+async function contentDigest(file) {
+  const chunkCount = Math.max(1, Math.ceil(file.size / DIGEST_CHUNK_SIZE));
+  const digests = new Uint8Array(chunkCount * 32);
+
+  for (let i = 0; i < chunkCount; i++) {
+    const chunk = await file.slice(i * DIGEST_CHUNK_SIZE, (i + 1) * DIGEST_CHUNK_SIZE).arrayBuffer();
+    digests.set(new Uint8Array(await crypto.subtle.digest('SHA-256', chunk)), i * 32);
+    self.postMessage({ type: 'progress', percent: Math.round(((i + 1) / chunkCount) * 100) });
+  }
+
+  const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', digests));
+  return Array.from(digest, (byte) => byte.toString(16).padStart(2, '0')).join('');
+}
+
+self.addEventListener('message', async (event) => {
+  const { file, maxDimension, quality, minSize } = event.data;
+  try {
+    const prepared = file.type.startsWith('image/')
+      ? await downscaleImage(file, maxDimension, quality, minSize)
+      : file;
+    const digest = await contentDigest(prepared);
+    self.postMessage({ type: 'done', file: prepared, digest: digest });
+  } catch (error) {
+    self.postMessage({ type: 'error', message: error.message });
+  }
+});